@@ -0,0 +1,65 @@
+"""
+Benchmark: per-row `iterrows` compounding vs the NumPy `compound` engine.
+
+Run from the repository root:
+    python benchmarks/bench_compounding.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from simulation.utils import compound, compound_return  # noqa: E402
+
+
+def legacy_compound_return(etf, starting_amount=1.0, base_col='Close'):
+    """ The original row-by-row implementation, kept here as the reference """
+    total_val = starting_amount
+    df = pd.DataFrame(index=etf.index, columns=['Investment'], dtype=float)
+
+    row_idx = 0
+    for index, _ in df.iterrows():
+        if row_idx != 0:
+            total_val = total_val + total_val * etf.loc[index, base_col]
+
+        df.loc[index, 'Investment'] = total_val
+        row_idx += 1
+
+    return df
+
+
+def load_returns(name, column):
+    df = pd.read_csv(os.path.join(ROOT, 'dataset', name), index_col=0, na_values='.')
+    df.index = pd.to_datetime(df.index)
+    return pd.DataFrame({'Close': df[column].dropna().pct_change(1)[1:]})
+
+
+def bench(label, etf, repeat=3):
+    expected = legacy_compound_return(etf, starting_amount=1.5)
+    actual = compound_return(etf, starting_amount=1.5)
+    actual_log = compound_return(etf, starting_amount=1.5, log_space=True)
+    np.testing.assert_allclose(actual['Investment'], expected['Investment'], rtol=1e-10)
+    np.testing.assert_allclose(actual_log['Investment'], expected['Investment'], rtol=1e-9)
+
+    values = etf['Close'].to_numpy()
+    t_legacy = min(timeit.repeat(lambda: legacy_compound_return(etf, 1.5), number=1, repeat=repeat))
+    t_frame = min(timeit.repeat(lambda: compound_return(etf, 1.5), number=10, repeat=repeat)) / 10
+    t_array = min(timeit.repeat(lambda: compound(values, 1.5), number=100, repeat=repeat)) / 100
+    t_log = min(timeit.repeat(lambda: compound(values, 1.5, log_space=True), number=100, repeat=repeat)) / 100
+
+    print(f'{label} ({len(etf)} rows)')
+    print(f'  iterrows (legacy):      {t_legacy * 1e3:10.2f} ms')
+    print(f'  compound_return:        {t_frame * 1e3:10.3f} ms  ({t_legacy / t_frame:,.0f}x)')
+    print(f'  compound (ndarray):     {t_array * 1e3:10.3f} ms  ({t_legacy / t_array:,.0f}x)')
+    print(f'  compound (log space):   {t_log * 1e3:10.3f} ms  ({t_legacy / t_log:,.0f}x)')
+
+
+if __name__ == '__main__':
+    bench('NASDAQ_COMPOSITE', load_returns('NASDAQ_COMPOSITE.csv', 'NASDAQCOM'))
+    bench('XIUSA000ML', load_returns('XIUSA000ML.csv', 'Close'))
+    bench('USD1MTD156N', load_returns('USD1MTD156N.csv', 'USD1MTD156N'))
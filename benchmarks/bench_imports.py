@@ -0,0 +1,57 @@
+"""
+Benchmark: import time of the simulation modules, each in a fresh interpreter like a scheduled job pays it.
+
+Run from the repository root:
+    python benchmarks/bench_imports.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['simulation', 'simulation.core', 'simulation.utils', 'simulation.cli', 'simulation.leveraged_etf',
+           'simulation.sweep', 'simulation.batch', 'simulation.analytics', 'simulation.calibration',
+           'simulation.report', 'simulation.price_cache']
+
+# heavy dependencies that only the modules needing them should pull in
+HEAVY = ['pandas', 'scipy', 'matplotlib', 'plotly', 'pandas_datareader', 'ibapi']
+
+# modules that must stay on NumPy alone
+NUMPY_ONLY = ['simulation', 'simulation.core', 'simulation.utils', 'simulation.cli']
+
+PROBE = '''
+import sys, time
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+print(elapsed, ','.join(m for m in {heavy!r} if m in sys.modules))
+'''
+
+
+def measure(module: str, runs: int):
+    """ Median import time (seconds) over `runs` fresh interpreters, and the heavy modules it loaded """
+    times, loaded = [], ''
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)], cwd=ROOT,
+                             check=True, capture_output=True, text=True).stdout.split()
+        times.append(float(out[0]))
+        loaded = out[1] if len(out) > 1 else ''
+    return statistics.median(times), loaded
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    baseline, _ = measure('numpy', runs)
+    print(f'{"numpy":28s} {baseline * 1e3:8.1f} ms')
+
+    failures = []
+    for module in MODULES:
+        elapsed, loaded = measure(module, runs)
+        print(f'{module:28s} {elapsed * 1e3:8.1f} ms  {loaded}')
+        if module in NUMPY_ONLY and loaded:
+            failures.append(f'{module} imports {loaded}')
+
+    if failures:
+        sys.exit('\n'.join(failures))
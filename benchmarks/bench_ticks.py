@@ -0,0 +1,87 @@
+"""
+Benchmark: IBAPIApp tick pipeline against the local fake gateway, from the gateway's socket write to the tick sink.
+
+Run from the repository root:
+    python benchmarks/bench_ticks.py [ticks] [speed]
+
+`speed` 0 (default) replays as fast as possible. Exits non-zero if ticks are dropped, lost or altered, so it can
+gate CI without a broker.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ibapi.contract import Contract  # noqa: E402
+
+from exchange.fake_gateway import FakeGateway, synthetic_ticks  # noqa: E402
+from exchange.ib_api_connection import IBAPIApp  # noqa: E402
+from exchange.ticks import TickBatch  # noqa: E402
+
+
+class Sink:
+    """ Keeps the batches with the time each reached the sink """
+
+    def __init__(self):
+        self.batches, self.drained_ns = [], []
+
+    def __call__(self, batch):
+        self.drained_ns.append(np.full(len(batch), time.monotonic_ns()))
+        self.batches.append(batch)
+
+
+def percentiles(ns):
+    return ' '.join(f'p{q}={v / 1e6:.2f}' for q, v in zip((50, 99, 100), np.percentile(ns, [50, 99, 100])))
+
+
+if __name__ == '__main__':
+    n = int(float(sys.argv[1])) if len(sys.argv) > 1 else 1_000_000
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    ticks = synthetic_ticks(n)
+
+    contract = Contract()
+    contract.symbol = 'BENCH'
+    contract.secType = 'STK'
+    contract.exchange = 'SMART'
+    contract.currency = 'USD'
+
+    sink = Sink()
+    with FakeGateway({'BENCH': ticks}, speed=speed or None) as gateway:
+        app = IBAPIApp(*gateway.address, 1, tick_sink=sink, tick_capacity=1 << 20)
+        start = time.perf_counter()
+        app.request_market_data(contract)
+
+        # the recording's own duration at the given speed, plus the time to get through it
+        deadline = start + (ticks.timestamp[-1] / 1e9 / speed if speed else 0) + max(60, n / 20_000)
+        while app.tick_consumer.consumed < len(ticks) and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+
+        app.disconnect()
+        app._thread.join()
+        app.tick_consumer.stop()
+        stream = gateway.streams[0]
+        sent = stream.sent_ticks_ns()
+
+    received = TickBatch.concatenate(sink.batches)
+    stats = app.tick_consumer.stats()
+    print(f'{len(received):,} of {len(ticks):,} ticks in {elapsed:.2f} s: {len(received) / elapsed:,.0f} ticks/s')
+    print(f'ring: dropped={stats["dropped"]} high_water={stats["high_water"]} batches={stats["batches"]}')
+
+    failures = []
+    if stats['dropped']:
+        failures.append(f'{stats["dropped"]} ticks dropped')
+    if len(received) != len(ticks):
+        failures.append(f'{len(ticks) - len(received)} ticks missing')
+    elif not (np.array_equal(received.value, ticks.value) and np.array_equal(received.tick_type, ticks.tick_type)):
+        failures.append('ticks altered')
+    else:
+        print(f'latency ms, gateway -> tick ring: {percentiles(received.timestamp - sent)}')
+        print(f'latency ms, gateway -> sink:      {percentiles(np.concatenate(sink.drained_ns) - sent)}')
+
+    if failures:
+        sys.exit('\n'.join(failures))
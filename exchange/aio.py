@@ -0,0 +1,365 @@
+import asyncio
+import threading
+
+import numpy as np
+from ibapi.client import EClient
+from ibapi.contract import Contract
+
+from exchange.ib_api_connection import IBAPIClient, IBAPIWrapper
+from exchange.ticks import PRICE, SIZE, TickBatch, TickConsumer, TickRing
+
+# Tick type of the record marking the end of a snapshot in the tick ring
+SNAPSHOT_END = -1
+
+
+def _resolve(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _fail(future, exception):
+    if not future.done():
+        future.set_exception(exception)
+
+
+class TickStream:
+    """
+    Asynchronous iterator over the market data of one
+    subscription, yielding a `TickBatch` per drain of the
+    tick ring. Closing it cancels the subscription.
+
+    Parameters
+    ----------
+    app : `AsyncIBApp`
+        The application the subscription belongs to
+    req_id : `int`
+        The request ID of the subscription
+    """
+
+    def __init__(self, app, req_id):
+        self.app = app
+        self.req_id = req_id
+        self._queue = asyncio.Queue()
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self._queue.get()
+        if item is None:
+            raise StopAsyncIteration
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        """
+        Cancels the subscription and ends the iteration.
+        """
+        if not self._closed:
+            self._closed = True
+            self.app._streams.pop(self.req_id, None)
+            self.app.requests.cancel(self.req_id)
+            if self.app.isConnected():
+                self.app.cancelMktData(self.req_id)
+            self._queue.put_nowait(None)
+
+
+class AsyncIBApp(IBAPIWrapper, IBAPIClient):
+    """
+    asyncio facade over the IB API: the EClient message loop
+    runs on its own thread and every response is handed to
+    the event loop, so any number of requests can be awaited
+    concurrently from one loop.
+
+    Requests are registered in the `RequestManager` of the
+    wrapper and resolve a future when the end-of-response
+    message arrives; an IB error for that request ID fails
+    the future with `IBError`. Outgoing requests are paced by
+    awaiting the manager's token bucket instead of blocking
+    the loop. Market data goes through a `TickRing`, so the
+    message thread never waits on the event loop.
+
+    Parameters
+    ----------
+    tick_capacity : `int`
+        Ticks buffered between the message thread and the
+        event loop; further ticks are dropped and counted
+    pacer : `TokenBucket`, optional
+        Pacing of the requests, default IB's message rate limit
+    """
+
+    def __init__(self, tick_capacity=1 << 16, pacer=None):
+        IBAPIWrapper.__init__(self)
+        IBAPIClient.__init__(self, wrapper=self)
+        self.init_error()
+        self.init_requests(pacer)
+
+        self.loop = None
+        self.next_order_id = None
+        self._ready = None
+        self._thread = None
+        self._streams = {}
+
+        self.tick_ring = TickRing(tick_capacity)
+        self.tick_consumer = TickConsumer(self.tick_ring, self._ticks_to_loop)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Connection
+
+    async def start(self, host, port, client_id, timeout=10):
+        """
+        Connects to TWS/IB Gateway and starts the message and
+        tick threads.
+
+        Parameters
+        ----------
+        host : `str`
+            The IP address of the TWS client/IB Gateway
+        port : `int`
+            The port to connect to TWS/IB Gateway with
+        client_id : `int`
+            A client ID unique among the open connections
+        timeout : `float`
+            Seconds to wait for the handshake
+
+        Returns
+        -------
+        `AsyncIBApp`
+            The connected application
+        """
+        self.loop = asyncio.get_running_loop()
+        self._ready = self.loop.create_future()
+
+        # the handshake is a blocking exchange on the socket
+        await self.loop.run_in_executor(None, IBAPIClient.connect, self, host, port, client_id)
+        if not self.isConnected():
+            raise ConnectionError('Could not connect to IB at %s:%d' % (host, port))
+
+        self._thread = threading.Thread(target=self.run, name='ib-messages', daemon=True)
+        self._thread.start()
+        self.tick_consumer.start()
+
+        # the session is usable once IB sends the next valid order ID
+        self.next_order_id = await asyncio.wait_for(self._ready, timeout)
+        return self
+
+    async def close(self):
+        """
+        Disconnects, stops the threads and fails the requests
+        still in flight; market data streams end normally.
+        """
+        for stream in list(self._streams.values()):
+            await stream.aclose()
+        if self.isConnected():
+            await self.loop.run_in_executor(None, self.disconnect)
+        if self._thread is not None:
+            await self.loop.run_in_executor(None, self._thread.join)
+        self.tick_consumer.stop()
+        self.requests.fail_all(ConnectionError('Disconnected from IB'))
+
+    def sendMsg(self, msg):
+        # requests are paced on the event loop before they are sent
+        EClient.sendMsg(self, msg)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Requests
+
+    def _open(self, kind, future, by_kind=False):
+        # the request table has no deadline here, asyncio.wait_for times out instead
+        def done(request):
+            if request.error is not None:
+                self.loop.call_soon_threadsafe(_fail, future, request.error)
+            else:
+                self.loop.call_soon_threadsafe(_resolve, future, request.items)
+
+        return self.requests.open(kind, timeout=None, on_done=done, by_kind=by_kind)
+
+    async def _request(self, kind, send, timeout, by_kind=False):
+        future = self.loop.create_future()
+        request = self._open(kind, future, by_kind)
+        try:
+            await asyncio.sleep(self.requests.pacer.reserve())
+            send(request.req_id)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.requests.cancel(request.req_id)
+
+    async def server_time(self, timeout=10):
+        """
+        Requests the current server time.
+
+        Returns
+        -------
+        `int`
+            The server unix timestamp.
+        """
+        server_time, = await self._request('server_time', lambda req_id: self.reqCurrentTime(), timeout,
+                                           by_kind=True)
+        return server_time
+
+    async def contract_details(self, contract, timeout=10):
+        """
+        Requests the details of every contract matching
+        `contract`.
+
+        Returns
+        -------
+        `list` of `ContractDetails`
+        """
+        return await self._request('contract_details', lambda req_id: self.reqContractDetails(req_id, contract),
+                                   timeout)
+
+    async def historical_bars(self, contract, end='', duration='1 Y', bar_size='1 day', what_to_show='TRADES',
+                              use_rth=True, format_date=1, timeout=60):
+        """
+        Requests historical bars, see `EClient.reqHistoricalData`.
+
+        Parameters
+        ----------
+        contract : `Contract`
+            The contract to request
+        end : `str`
+            End of the period as 'yyyymmdd hh:mm:ss', '' for now
+        duration : `str`
+            Length of the period, such as '1 Y' or '30 D'
+        bar_size : `str`
+            Such as '1 day' or '1 min'
+        what_to_show : `str`
+            Such as 'TRADES', 'MIDPOINT' or 'ADJUSTED_LAST'
+        use_rth : `boolean`
+            Only regular trading hours
+        format_date : `int`
+            1 for 'yyyymmdd[  hh:mm:ss]' dates, 2 for unix
+            timestamps (intraday bars)
+        timeout : `float`
+            Seconds to wait for the last bar
+
+        Returns
+        -------
+        `list` of `BarData`
+        """
+        return await self._request('historical_data', lambda req_id: self.reqHistoricalData(
+            req_id, contract, end, duration, bar_size, what_to_show, int(use_rth), format_date, False, []), timeout)
+
+    async def market_data(self, contract, generic_ticks='', snapshot=False):
+        """
+        Subscribes to market data.
+
+        Parameters
+        ----------
+        contract : `Contract`
+            The contract to subscribe to
+        generic_ticks : `str`
+            Comma-separated generic tick types
+        snapshot : `boolean`
+            Only one snapshot; the stream ends after it
+
+        Returns
+        -------
+        `TickStream`
+            Asynchronous iterator of `TickBatch`
+        """
+        # registered without deadline, only to route its errors
+        request = self.requests.open('market_data', timeout=None, on_done=lambda r: self.loop.call_soon_threadsafe(
+            self._stream_failed, r.req_id, r.error))
+        stream = TickStream(self, request.req_id)
+        self._streams[request.req_id] = stream
+        await asyncio.sleep(self.requests.pacer.reserve())
+        self.reqMktData(request.req_id, contract, generic_ticks, snapshot, False, [])
+        return stream
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # EWrapper callbacks, called on the message thread; the
+    # other responses are routed by IBAPIWrapper
+
+    def nextValidId(self, orderId):
+        self.loop.call_soon_threadsafe(_resolve, self._ready, orderId)
+
+    def _stream_failed(self, req_id, exception):
+        stream = self._streams.pop(req_id, None)
+        if stream is not None:
+            stream._closed = True
+            stream._queue.put_nowait(exception)
+
+    def tickPrice(self, reqId, tickType, price, attrib):
+        self.tick_ring.push(reqId, tickType, price, PRICE)
+
+    def tickSize(self, reqId, tickType, size):
+        self.tick_ring.push(reqId, tickType, float(size), SIZE)
+
+    def tickSnapshotEnd(self, reqId):
+        # through the ring, so the end arrives after the snapshot's ticks
+        self.tick_ring.push(reqId, SNAPSHOT_END, 0.0)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Tick dispatch
+
+    def _ticks_to_loop(self, batch):
+        # tick consumer thread: one event loop callback per batch
+        self.loop.call_soon_threadsafe(self._dispatch_ticks, batch)
+
+    def _dispatch_ticks(self, batch):
+        if not len(batch):
+            return
+        order = np.argsort(batch.req_id, kind='stable')
+        sorted_ids = batch.req_id[order]
+        req_ids, starts = np.unique(sorted_ids, return_index=True)
+        for req_id, rows in zip(req_ids, np.split(order, starts[1:])):
+            stream = self._streams.get(int(req_id))
+            if stream is None:
+                continue
+            ticks = TickBatch(*(column[rows] for column in batch))
+            end = ticks.tick_type == SNAPSHOT_END
+            if end.any():
+                ticks = TickBatch(*(column[~end] for column in ticks))
+            if len(ticks):
+                stream._queue.put_nowait(ticks)
+            if end.any():
+                self._streams.pop(stream.req_id, None)
+                self.requests.cancel(stream.req_id)
+                stream._closed = True
+                stream._queue.put_nowait(None)
+
+
+async def main():
+    contract = Contract()
+    contract.symbol = 'TQQQ'
+    contract.secType = 'STK'  # ETF falls under STK
+    contract.exchange = 'SMART'
+    contract.currency = 'USD'
+
+    async with AsyncIBApp() as app:
+        await app.start('127.0.0.1', 4001, 1234)
+
+        # pipelined on one connection
+        server_time, details, bars = await asyncio.gather(
+            app.server_time(),
+            app.contract_details(contract),
+            app.historical_bars(contract, duration='1 M'),
+        )
+        print('Server time: %d, %d contract(s), %d daily bars' % (server_time, len(details), len(bars)))
+
+        app.reqMarketDataType(4)  # switch to delayed-frozen data if live is not available
+        async with await app.market_data(contract) as ticks:
+            async for batch in ticks:
+                print('%d ticks, last price %s' % (len(batch), batch.value[batch.kind == PRICE][-1:]))
+                if app.tick_consumer.consumed >= 100:
+                    break
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
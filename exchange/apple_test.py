@@ -3,19 +3,30 @@ from ibapi.wrapper import EWrapper
 from ibapi.contract import Contract
 from ibapi.ticktype import TickTypeEnum
 
+from exchange.ticks import PRICE, SIZE, TickConsumer, TickRing
+
+
+def print_ticks(batch):
+    # runs on the tick consumer thread, so printing never stalls the message thread
+    for req_id, tick_type, kind, value in zip(batch.req_id, batch.tick_type, batch.kind, batch.value):
+        label = "Price" if kind == PRICE else "Size"
+        print("Tick", label, "Ticker Id:", req_id, "tickType:", TickTypeEnum.to_str(int(tick_type)), label + ":", value)
+
 
 class TestApp(EWrapper, EClient):
     def __init__(self):
         EClient.__init__(self, self)
+        self.tick_ring = TickRing()
+        self.tick_consumer = TickConsumer(self.tick_ring, print_ticks).start()
 
     def error(self, reqId, errorCode, errorString):
         print("Error: ", reqId, " ", errorCode, " ", errorString)
 
     def tickPrice(self, reqId, tickType, price, attrib):
-        print("Tick Price. Ticker Id:", reqId, "tickType:", TickTypeEnum.to_str(tickType), "Price:", price, end=' ')
+        self.tick_ring.push(reqId, tickType, price, PRICE)
 
     def tickSize(self, reqId, tickType, size):
-        print("Tick Size. Ticker Id:", reqId, "tickType:", TickTypeEnum.to_str(tickType), "Size:", size)
+        self.tick_ring.push(reqId, tickType, float(size), SIZE)
 
 
 def main():
@@ -35,6 +46,8 @@ def main():
     app.reqMktData(1, contract, "", False, False, [])
 
     app.run()
+    app.tick_consumer.stop()
+    print("Ticks:", app.tick_consumer.stats())
 
 
 if __name__ == "__main__":
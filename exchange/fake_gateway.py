@@ -0,0 +1,641 @@
+import argparse
+import collections
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+from ibapi.message import IN, OUT
+from ibapi.server_versions import (MAX_CLIENT_VER, MIN_SERVER_VER_MARKET_RULES, MIN_SERVER_VER_REAL_EXPIRATION_DATE,
+                                   MIN_SERVER_VER_STOCK_TYPE, MIN_SERVER_VER_SYNT_REALTIME_BARS)
+from ibapi.ticktype import TickTypeEnum
+
+from exchange.ticks import PRICE, SIZE, TickBatch, load_ticks
+
+# Price tick types whose TICK_PRICE message also carries a size,
+# which the EClient decoder reports as a separate tickSize
+PRICE_SIZE_TYPES = {
+    TickTypeEnum.BID: TickTypeEnum.BID_SIZE,
+    TickTypeEnum.ASK: TickTypeEnum.ASK_SIZE,
+    TickTypeEnum.LAST: TickTypeEnum.LAST_SIZE,
+    TickTypeEnum.DELAYED_BID: TickTypeEnum.DELAYED_BID_SIZE,
+    TickTypeEnum.DELAYED_ASK: TickTypeEnum.DELAYED_ASK_SIZE,
+    TickTypeEnum.DELAYED_LAST: TickTypeEnum.DELAYED_LAST_SIZE,
+}
+
+# IB error codes answered by the gateway
+NO_SECURITY = 200
+NO_DATA = 162
+NO_DATA_MESSAGE = 'Historical Market Data Service error message:HMDS query returned no data'
+PACING_MESSAGE = 'Historical Market Data Service error message:Historical data request pacing violation'
+
+# Messages per socket write when replaying
+BLOCK = 4096
+
+
+def _frame(*fields):
+    """ One length-prefixed message of NULL-terminated fields, as the IB API frames them """
+    body = ''.join('%s\0' % field for field in fields).encode()
+    return struct.pack('!I', len(body)) + body
+
+
+def synthetic_ticks(n, price=100.0, interval=1e-6, seed=0):
+    """
+    Deterministic random-walk trades to replay: `LAST` price
+    ticks each followed by their `LAST_SIZE`, as IBAPIApp
+    records them.
+
+    Parameters
+    ----------
+    n : `int`
+        Number of ticks, rounded up to an even number
+    price : `float`
+        First price
+    interval : `float`
+        Seconds between trades
+    seed : `int`
+        Random seed
+
+    Returns
+    -------
+    `TickBatch`
+    """
+    trades = (n + 1) // 2
+    rng = np.random.default_rng(seed)
+    prices = np.round(price * np.exp(np.cumsum(rng.normal(0, 1e-4, trades))), 2)
+    sizes = rng.integers(1, 10, trades) * 100
+
+    batch = TickBatch(np.zeros(2 * trades, np.int32), np.empty(2 * trades, np.int16), np.empty(2 * trades, np.int8),
+                      np.empty(2 * trades, np.float64), np.empty(2 * trades, np.int64))
+    batch.tick_type[0::2], batch.tick_type[1::2] = TickTypeEnum.LAST, TickTypeEnum.LAST_SIZE
+    batch.kind[0::2], batch.kind[1::2] = PRICE, SIZE
+    batch.value[0::2], batch.value[1::2] = prices, sizes
+    batch.timestamp[:] = np.repeat(np.arange(trades, dtype=np.int64) * int(interval * 1e9), 2)
+    return batch
+
+
+class TickReplay:
+    """
+    Recorded ticks prepared as IB messages: a price tick of
+    a sized type (bid, ask, last) directly followed by its size
+    tick becomes one TICK_PRICE message, every other tick its
+    own TICK_PRICE or TICK_SIZE message. A recording made
+    through IBAPIApp is thus replayed into the same callbacks;
+    a sized price tick without its size also produces a size
+    tick of 0 on the client.
+
+    Parameters
+    ----------
+    ticks : `TickBatch`
+        The recording; the request IDs are ignored and
+        negative tick types (markers) dropped
+
+    Attributes
+    ----------
+    due_ns : `np.ndarray` of int64
+        Nanoseconds from the first message to each message
+    ticks_per_message : `np.ndarray` of int8
+        1, or 2 for a price sent with its size
+    """
+
+    def __init__(self, ticks: TickBatch):
+        keep = ticks.tick_type >= 0
+        tick_type, kind, value, timestamp = (column[keep] for column in ticks[1:])
+
+        size_type = np.full(len(tick_type), -1)
+        for price_type, paired in PRICE_SIZE_TYPES.items():
+            size_type[(kind == PRICE) & (tick_type == price_type)] = paired
+        merged = np.zeros(len(tick_type), bool)
+        merged[:-1] = (size_type[:-1] >= 0) & (kind[1:] == SIZE) & (tick_type[1:] == size_type[:-1])
+        first = np.flatnonzero(~np.r_[False, merged[:-1]])
+
+        self.n_ticks = len(tick_type)
+        self.tick_type = tick_type[first]
+        self.kind = kind[first]
+        self.value = value[first]
+        self.size = np.where(merged[first], value[np.minimum(first + 1, len(value) - 1)], 0.0)
+        self.ticks_per_message = 1 + merged[first].astype(np.int8)
+        self.due_ns = timestamp[first] - timestamp[first[0]] if len(first) else np.zeros(0, np.int64)
+
+    def __len__(self):
+        return len(self.value)
+
+    def encode(self, req_id, start=0, stop=None, messages=None):
+        """
+        The messages `start:stop` (or those indexed by
+        `messages`) for request `req_id`, framed.
+
+        Returns
+        -------
+        `bytes`
+        """
+        rows = slice(start, stop) if messages is None else messages
+        out = []
+        for kind, tick_type, value, size in zip(self.kind[rows].tolist(), self.tick_type[rows].tolist(),
+                                                self.value[rows].tolist(), self.size[rows].tolist()):
+            if kind == PRICE:
+                body = '%d\x006\x00%d\x00%d\x00%r\x00%d\x000\x00' % (IN.TICK_PRICE, req_id, tick_type, value, size)
+            else:
+                body = '%d\x006\x00%d\x00%d\x00%d\x00' % (IN.TICK_SIZE, req_id, tick_type, value)
+            out.append(struct.pack('!I', len(body)))
+            out.append(body.encode())
+        return b''.join(out)
+
+    def snapshot(self, req_id):
+        """
+        The last message of every tick type, framed.
+        """
+        types = self.tick_type[::-1]
+        _, last = np.unique(types, return_index=True)
+        return self.encode(req_id, messages=np.sort(len(types) - 1 - last))
+
+
+class _Stream:
+    """ Replay of a recording to one market data subscription, on its own thread """
+
+    def __init__(self, session, req_id, symbol, replay, speed):
+        self.session = session
+        self.req_id = req_id
+        self.symbol = symbol
+        self.replay = replay
+        self.speed = speed
+        self.sent_ns = np.full(len(replay), -1, np.int64)  # monotonic_ns before each message was written
+        self.sent = 0
+        self.stopped = threading.Event()
+        self.done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='fake-ib-replay-%d' % req_id, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def sent_ticks_ns(self):
+        """
+        Send time of every replayed tick, -1 for ticks not
+        sent, aligned with the recording.
+        """
+        return np.repeat(self.sent_ns, self.replay.ticks_per_message)
+
+    def _run(self):
+        replay, n = self.replay, len(self.replay)
+        due = (replay.due_ns / self.speed).astype(np.int64) if self.speed else None
+        start = time.monotonic_ns()
+        i = 0
+        while i < n and not self.stopped.is_set():
+            if due is None:
+                j = min(i + BLOCK, n)
+            else:
+                elapsed = time.monotonic_ns() - start
+                j = min(int(np.searchsorted(due, elapsed, 'right')), i + BLOCK)
+                if j == i:
+                    self.stopped.wait((due[i] - elapsed) / 1e9)
+                    continue
+            data = replay.encode(self.req_id, i, j)
+            sent = time.monotonic_ns()
+            if not self.session.send(data):
+                break
+            self.sent_ns[i:j] = sent
+            self.sent = j
+            i = j
+        self.done.set()
+
+
+class _Session:
+    """ One client connection, handled on its own thread """
+
+    def __init__(self, gateway, sock):
+        self.gateway = gateway
+        self.sock = sock
+        self.server_version = None
+        self.streams = {}
+        self._lock = threading.Lock()
+        self._buffer = b''
+        self._thread = threading.Thread(target=self._run, name='fake-ib-session', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def send(self, data):
+        with self._lock:
+            try:
+                self.sock.sendall(data)
+                return True
+            except OSError:
+                return False
+
+    def error(self, req_id, code, message):
+        self.send(_frame(IN.ERR_MSG, 2, req_id, code, message))
+
+    def close(self):
+        for stream in self.streams.values():
+            stream.stop()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def _read(self, n):
+        while len(self._buffer) < n:
+            data = self.sock.recv(1 << 16)
+            if not data:
+                raise ConnectionError('Client disconnected')
+            self._buffer += data
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+    def _message(self):
+        size, = struct.unpack('!I', self._read(4))
+        return self._read(size).split(b'\0')[:-1]
+
+    def _handshake(self):
+        # "API\0" then the supported client versions as "v<min>..<max>[ options]"
+        if self._read(4) != b'API\0':
+            raise ConnectionError('Not an IB API client')
+        size, = struct.unpack('!I', self._read(4))
+        versions = self._read(size).decode().split()[0]
+        lowest, highest = (int(v) for v in versions[1:].split('..'))
+        self.server_version = min(highest, self.gateway.server_version)
+        if self.server_version < max(lowest, MIN_SERVER_VER_SYNT_REALTIME_BARS):
+            raise ConnectionError('Unsupported client versions %s' % versions)
+        self.send(_frame(self.server_version, time.strftime('%Y%m%d %H:%M:%S EST')))
+
+    def _run(self):
+        try:
+            self._handshake()
+            while True:
+                self._dispatch(self._message())
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.close()
+            self.gateway._closed(self)
+
+    def _dispatch(self, fields):
+        gateway = self.gateway
+        msg_id = int(fields[0])
+        gateway.received[msg_id] += 1
+        if msg_id == OUT.START_API:
+            self.send(_frame(IN.NEXT_VALID_ID, 1, gateway.next_order_id) + _frame(IN.MANAGED_ACCTS, 1, gateway.account))
+        elif msg_id == OUT.REQ_CURRENT_TIME:
+            self.send(_frame(IN.CURRENT_TIME, 1, int(gateway.clock())))
+        elif msg_id == OUT.REQ_MKT_DATA:
+            self._market_data(fields)
+        elif msg_id == OUT.CANCEL_MKT_DATA:
+            stream = self.streams.pop(int(fields[2]), None)
+            if stream is not None:
+                stream.stop()
+        elif msg_id == OUT.REQ_HISTORICAL_DATA:
+            self._historical_data(fields)
+        elif msg_id == OUT.REQ_CONTRACT_DATA:
+            self._contract_details(fields)
+        # other requests are accepted and left unanswered
+
+    def _market_data(self, fields):
+        # version, reqId, conId, symbol, secType ... tradingClass (14), combo legs,
+        # delta neutral contract, generic ticks, snapshot
+        req_id, symbol, sec_type = int(fields[2]), fields[4].decode(), fields[5]
+        i = 15
+        if sec_type == b'BAG':
+            i += 1 + 4 * int(fields[i])
+        i += 4 if fields[i] == b'1' else 1
+        snapshot = fields[i + 1] == b'1'
+
+        replay = self.gateway.replay(symbol)
+        if replay is None:
+            self.error(req_id, NO_SECURITY, 'No security definition has been found for the request')
+        elif snapshot:
+            self.send(replay.snapshot(req_id) + _frame(IN.TICK_SNAPSHOT_END, 1, req_id))
+        else:
+            stream = _Stream(self, req_id, symbol, replay, self.gateway.speed)
+            self.streams[req_id] = stream
+            self.gateway.streams.append(stream)
+            stream.start()
+
+    def _contract_details(self, fields):
+        # version, reqId, conId, symbol, secType, lastTradeDate, strike, right, multiplier,
+        # exchange, primaryExchange, currency
+        req_id, symbol, sec_type = int(fields[2]), fields[4].decode(), fields[5].decode()
+        exchange, currency = fields[9].decode() or 'SMART', fields[11].decode() or 'USD'
+        con_id = self.gateway.contract_id(symbol)
+        if con_id is None:
+            self.error(req_id, NO_SECURITY, 'No security definition has been found for the request')
+            return
+
+        # CONTRACT_DATA version 8: symbol, secType, lastTradeDate, strike, right, exchange, currency,
+        # localSymbol, marketName, tradingClass, conId, minTick, mdSizeMultiplier, multiplier, orderTypes,
+        # validExchanges, priceMagnifier, underConId, longName, primaryExchange, contractMonth, industry,
+        # category, subcategory, timeZoneId, tradingHours, liquidHours, evRule, evMultiplier, secIds, aggGroup,
+        # underSymbol, underSecType
+        fields = [IN.CONTRACT_DATA, 8, req_id, symbol, sec_type or 'STK', '', 0.0, '', exchange, currency, symbol,
+                  symbol, symbol, con_id, 0.01, 1, '', 'LMT,MKT', exchange, 1, 0, symbol, 'ARCA', '', '', '', '',
+                  'US/Eastern', '', '', '', 0, 0, 1, '', '']
+        if self.server_version >= MIN_SERVER_VER_MARKET_RULES:
+            fields.append('26')
+        if self.server_version >= MIN_SERVER_VER_REAL_EXPIRATION_DATE:
+            fields.append('')
+        if self.server_version >= MIN_SERVER_VER_STOCK_TYPE:
+            fields.append('ETF')
+        self.send(_frame(*fields) + _frame(IN.CONTRACT_DATA_END, 1, req_id))
+
+    def _historical_data(self, fields):
+        # reqId, conId, symbol ... tradingClass (13), includeExpired, end, bar size,
+        # duration, useRTH, whatToShow, formatDate
+        req_id, symbol = int(fields[1]), fields[3].decode()
+        end, bar_size, duration = (field.decode() for field in fields[15:18])
+        format_date = int(fields[20])
+
+        if not self.gateway._pace_historical():
+            self.error(req_id, NO_DATA, PACING_MESSAGE)
+            return
+        message = self.gateway.bars_message(req_id, symbol, end, duration, bar_size, format_date)
+        if message is None:
+            self.error(req_id, NO_DATA, NO_DATA_MESSAGE)
+        else:
+            self.send(message)
+
+
+class FakeGateway:
+    """
+    Local stand-in for TWS/IB Gateway, speaking enough of the
+    IB socket protocol for the `exchange` clients: the
+    handshake, server time, market data replayed from
+    recorded ticks and historical bars from data frames.
+    Other requests are accepted and never answered.
+
+    Each market data subscription replays the recording of
+    its symbol on its own thread, timed by the recorded
+    timestamps divided by `speed`, or as fast as the socket
+    takes it. Send times are kept per message, so the
+    latency up to the client's tick ring or sink can be
+    measured without a broker.
+
+    Parameters
+    ----------
+    ticks : `dict`, optional
+        Recorded ticks by symbol, `TickBatch` or a file read
+        by `load_ticks`
+    history : `dict`, optional
+        Bars by symbol, `pd.DataFrame` indexed by date with
+        Open, High, Low, Close and optionally Volume, Average
+        and Count columns (a frame without Close uses its first
+        column), or the path of such a CSV file. Bars are
+        served at the frame's own frequency
+    speed : `float` or None
+        Replay speed relative to the recording, None for as
+        fast as possible
+    host : `str`
+        Interface to listen on
+    port : `int`
+        Port to listen on, 0 for any free port
+    pacing : `tuple`, optional
+        (requests, seconds): historical requests beyond this
+        many in any window fail with a pacing violation
+    server_version : `int`
+        Highest API version announced
+    clock : `callable`
+        Server time in unix seconds
+    """
+
+    def __init__(self, ticks=None, history=None, speed=1.0, host='127.0.0.1', port=0, pacing=None,
+                 server_version=MAX_CLIENT_VER, clock=time.time):
+        self.ticks = dict(ticks or {})
+        self.history = dict(history or {})
+        self.speed = speed
+        self.host = host
+        self.port = port
+        self.pacing = pacing
+        self.server_version = server_version
+        self.clock = clock
+        self.next_order_id = 1
+        self.account = 'DU0000000'
+
+        self.streams = []
+        self.received = collections.Counter()  # messages by outgoing message ID
+        self._replays = {}
+        self._frames = {}
+        self._historical_times = collections.deque()
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self._listener = None
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def address(self):
+        """
+        (host, port) the gateway listens on.
+        """
+        return self.host, self.port
+
+    def start(self):
+        """
+        Starts listening; with port 0, `port` is set to the
+        port picked by the system.
+        """
+        self._listener = socket.create_server((self.host, self.port))
+        self.port = self._listener.getsockname()[1]
+        self._thread = threading.Thread(target=self._accept, name='fake-ib-gateway', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Closes the listening socket and every connection.
+        """
+        if self._listener is not None:
+            # closing alone does not wake the thread blocked in accept()
+            try:
+                self._listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._listener.close()
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            session.close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            session = _Session(self, sock)
+            with self._lock:
+                self._sessions.add(session)
+            session.start()
+
+    def _closed(self, session):
+        with self._lock:
+            self._sessions.discard(session)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Data
+
+    def contract_id(self, symbol):
+        """
+        Contract ID of a symbol with ticks or bars, or None.
+        """
+        symbols = sorted(set(self.ticks) | set(self.history))
+        return symbols.index(symbol) + 1 if symbol in symbols else None
+
+    def replay(self, symbol):
+        """
+        The prepared recording of `symbol`, or None.
+        """
+        with self._lock:
+            if symbol not in self._replays:
+                ticks = self.ticks.get(symbol)
+                if ticks is None:
+                    return None
+                self._replays[symbol] = TickReplay(load_ticks(ticks) if isinstance(ticks, str) else ticks)
+            return self._replays[symbol]
+
+    def _pace_historical(self):
+        if self.pacing is None:
+            return True
+        limit, period = self.pacing
+        now = time.monotonic()
+        with self._lock:
+            times = self._historical_times
+            while times and times[0] <= now - period:
+                times.popleft()
+            if len(times) >= limit:
+                return False
+            times.append(now)
+        return True
+
+    def _history_frame(self, symbol):
+        # pandas only loads once bars are requested
+        import pandas as pd
+
+        with self._lock:
+            if symbol not in self._frames:
+                frame = self.history.get(symbol)
+                if isinstance(frame, str):
+                    frame = pd.read_csv(frame, index_col=0, parse_dates=True)
+                self._frames[symbol] = frame.sort_index() if frame is not None else None
+            return self._frames[symbol]
+
+    def bars_message(self, req_id, symbol, end, duration, bar_size, format_date=1):
+        """
+        The HISTORICAL_DATA answer to a request, None if there
+        are no bars in the requested period.
+
+        Parameters
+        ----------
+        req_id : `int`
+            The request ID
+        symbol : `str`
+            Symbol of the contract
+        end : `str`
+            End of the period as 'yyyymmdd hh:mm:ss', '' for the
+            last bar
+        duration : `str`
+            Length of the period, such as '1 Y' or '30 D'
+        bar_size : `str`
+            Decides the date format, see `format_date`
+        format_date : `int`
+            Intraday bars as 'yyyymmdd  hh:mm:ss' with 1, as unix
+            timestamps with 2; daily bars are 'yyyymmdd'
+
+        Returns
+        -------
+        `bytes` or None
+        """
+        import pandas as pd
+
+        from exchange.history import is_intraday
+
+        frame = self._history_frame(symbol)
+        if frame is None or frame.empty:
+            return None
+        stop = pd.Timestamp(end[:17]) if end else frame.index[-1]
+        count, unit = duration.split()
+        offset = {'S': pd.Timedelta(seconds=int(count)), 'D': pd.Timedelta(days=int(count)),
+                  'W': pd.Timedelta(weeks=int(count)), 'M': pd.DateOffset(months=int(count)),
+                  'Y': pd.DateOffset(years=int(count))}[unit]
+        start = stop - offset
+        bars = frame[(frame.index > start) & (frame.index <= stop)]
+        if bars.empty:
+            return None
+
+        close = bars['Close'] if 'Close' in bars else bars.iloc[:, 0]
+        columns = [bars.get(name, close) for name in ('Open', 'High', 'Low')] + [close]
+        volume = bars.get('Volume', pd.Series(0, bars.index)).fillna(0).astype('int64')
+        average = bars.get('Average', close)
+        count = bars.get('Count', pd.Series(0, bars.index)).fillna(0).astype('int64')
+        if not is_intraday(bar_size):
+            dates = bars.index.strftime('%Y%m%d')
+        elif format_date == 2:
+            # whatever the resolution of the index
+            dates = ((bars.index - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).astype(str)
+        else:
+            dates = bars.index.strftime('%Y%m%d  %H:%M:%S')
+
+        fields = [IN.HISTORICAL_DATA, req_id, start.strftime('%Y%m%d  %H:%M:%S'), stop.strftime('%Y%m%d  %H:%M:%S'),
+                  len(bars)]
+        for row in zip(dates, *(column.tolist() for column in columns), volume.tolist(), average.tolist(),
+                       count.tolist()):
+            fields.extend(row)
+        return _frame(*fields)
+
+    def stats(self):
+        """
+        Connections, subscriptions and ticks sent.
+
+        Returns
+        -------
+        `dict`
+        """
+        return {
+            'connections': len(self._sessions),
+            'subscriptions': len(self.streams),
+            'messages_sent': sum(stream.sent for stream in self.streams),
+            'ticks_sent': sum(int(stream.replay.ticks_per_message[:stream.sent].sum()) for stream in self.streams),
+            'historical_requests': self.received[OUT.REQ_HISTORICAL_DATA],
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m exchange.fake_gateway',
+                                     description='Local fake IB gateway replaying recorded ticks and bars.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4001)
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed, 0 for as fast as possible')
+    parser.add_argument('--ticks', action='append', default=[], metavar='SYMBOL=PATH',
+                        help='recorded ticks (.npz or .csv) of a symbol')
+    parser.add_argument('--synthetic', action='append', default=[], metavar='SYMBOL=N',
+                        help='serve N synthetic ticks for a symbol')
+    parser.add_argument('--history', action='append', default=[], metavar='SYMBOL=CSV', help='bars of a symbol')
+    args = parser.parse_args(argv)
+
+    ticks = dict(spec.split('=', 1) for spec in args.ticks)
+    ticks.update({symbol: synthetic_ticks(int(n)) for symbol, n in (spec.split('=', 1) for spec in args.synthetic)})
+    history = dict(spec.split('=', 1) for spec in args.history)
+
+    with FakeGateway(ticks, history, args.speed or None, args.host, args.port) as gateway:
+        print('Fake IB gateway listening on %s:%d' % gateway.address)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
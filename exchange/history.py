@@ -0,0 +1,366 @@
+import queue
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from exchange.request_manager import IBError, RateWindow
+from simulation.columnar import read_meta, read_table, write_table
+from simulation.price_cache import DEFAULT_CACHE_DIR, PriceCache
+
+# Longest request duration IB accepts for each bar size
+CHUNK_DURATIONS = {
+    '1 min': '1 D', '2 mins': '2 D', '3 mins': '1 W', '5 mins': '1 W', '10 mins': '1 W', '15 mins': '1 W',
+    '20 mins': '1 W', '30 mins': '1 M', '1 hour': '1 M', '2 hours': '1 M', '3 hours': '1 M', '4 hours': '1 M',
+    '8 hours': '1 M', '1 day': '1 Y', '1 week': '1 Y', '1 month': '1 Y',
+}
+
+# Calendar days a duration covers at least, the step between chunk ends
+DURATION_DAYS = {'1 D': 1, '2 D': 2, '1 W': 7, '1 M': 28, '1 Y': 365}
+
+# IB historical data pacing: 60 requests per 10 minutes, and
+# fewer than 6 requests for the same contract within 2 seconds
+REQUESTS_PER_WINDOW = 60
+WINDOW_SECONDS = 600
+SAME_CONTRACT_REQUESTS = 5
+SAME_CONTRACT_SECONDS = 2
+
+# IB error code of historical data requests without data,
+# also used for pacing violations
+NO_DATA = 162
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Average', 'Count']
+
+
+def is_intraday(bar_size):
+    return bar_size not in ('1 day', '1 week', '1 month')
+
+
+def chunk_ends(start, end, bar_size='1 day'):
+    """
+    Splits a date range into requests IB accepts for the
+    bar size, newest first; consecutive chunks may overlap.
+
+    Parameters
+    ----------
+    start : `datetime`-like
+        First day of the range
+    end : `datetime`-like
+        Last day of the range (inclusive)
+    bar_size : `str`
+        One of `CHUNK_DURATIONS`
+
+    Returns
+    -------
+    `list` of (`str`, `str`)
+        End date time and duration of each request.
+    """
+    if bar_size not in CHUNK_DURATIONS:
+        raise ValueError('Unknown bar size %r, expected one of %s' % (bar_size, list(CHUNK_DURATIONS)))
+    duration = CHUNK_DURATIONS[bar_size]
+    step = DURATION_DAYS[duration]
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+
+    chunks = []
+    day = end
+    while day >= start:
+        # sessions of one or two days: weekends have no bars
+        if step > 2 or day.dayofweek < 5:
+            chunks.append((day.strftime('%Y%m%d 23:59:59'), duration))
+        day -= timedelta(days=step)
+    return chunks
+
+
+def bars_frame(bars, bar_size='1 day'):
+    """
+    Converts `BarData` responses into a frame indexed by bar
+    time, sorted and without duplicates.
+
+    Parameters
+    ----------
+    bars : `list` of `BarData`
+        Daily bars dated 'yyyymmdd', intraday bars dated in
+        unix seconds (formatDate 2)
+    bar_size : `str`
+        The requested bar size
+
+    Returns
+    -------
+    `pd.DataFrame`
+        Columns `COLUMNS`.
+    """
+    if not bars:
+        return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], name='Date'), dtype=np.float64)
+
+    dates = [bar.date for bar in bars]
+    if is_intraday(bar_size):
+        index = pd.to_datetime(np.array(dates, dtype=np.int64), unit='s')
+    else:
+        index = pd.to_datetime(dates, format='%Y%m%d')
+    frame = pd.DataFrame({
+        'Open': [bar.open for bar in bars], 'High': [bar.high for bar in bars], 'Low': [bar.low for bar in bars],
+        'Close': [bar.close for bar in bars], 'Volume': [bar.volume for bar in bars],
+        'Average': [bar.average for bar in bars], 'Count': [bar.barCount for bar in bars],
+    }, index=pd.DatetimeIndex(index, name='Date'), dtype=np.float64)
+    return _stitch([frame])
+
+
+def _stitch(frames):
+    frame = pd.concat(frames).sort_index(kind='mergesort')
+    return frame[~frame.index.duplicated(keep='last')]
+
+
+def store_source(bar_size):
+    """
+    Price store source of IB bars: 'ib' for daily bars, such
+    as 'ib_1min' for others.
+    """
+    return 'ib' if bar_size == '1 day' else 'ib_' + bar_size.replace(' ', '')
+
+
+class HistoricalDownloader:
+    """
+    Bulk historical bar downloads from IB. Long ranges are
+    split into the largest chunks IB accepts for the bar size,
+    and the chunks of every symbol are spread over worker
+    threads on one or more connections (one per client ID),
+    each paced to IB's historical data limits. The chunks
+    are stitched and de-duplicated per symbol, and can be
+    written to the local price store, where
+    `PriceCache(cache_dir).get(symbol, start, end, source='ib')`
+    reads the daily bars (see `store_source`).
+
+    Parameters
+    ----------
+    apps : `list` of `IBAPIApp`
+        Connected applications, each with its own client ID
+    in_flight : `int`
+        Concurrent requests per connection
+    what_to_show : `str`
+        Such as 'TRADES', 'MIDPOINT' or 'ADJUSTED_LAST'
+    use_rth : `boolean`
+        Only regular trading hours
+    timeout : `float`
+        Seconds before a chunk request is retried
+    retries : `int`
+        Attempts per chunk after a timeout or pacing violation
+    retry_delay : `float`
+        Seconds before a retry; IB rejects identical requests
+        within 15 seconds
+    requests_per_window : `int`
+        Requests per connection in `window` seconds
+    window : `float`
+        Pacing window in seconds
+    cache_dir : `str`
+        Root directory of the price store
+    """
+
+    def __init__(self, apps, in_flight=2, what_to_show='TRADES', use_rth=True, timeout=60, retries=3,
+                 retry_delay=15, requests_per_window=REQUESTS_PER_WINDOW, window=WINDOW_SECONDS,
+                 cache_dir=DEFAULT_CACHE_DIR):
+        self.apps = list(apps)
+        self.in_flight = in_flight
+        self.what_to_show = what_to_show
+        self.use_rth = use_rth
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.cache_dir = cache_dir
+        self.pacers = [RateWindow(requests_per_window, window) for _ in self.apps]
+        self._contract_pacers = {}
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'empty': 0, 'bars': 0}
+
+    def _contract_pacer(self, symbol):
+        with self._lock:
+            if symbol not in self._contract_pacers:
+                self._contract_pacers[symbol] = RateWindow(SAME_CONTRACT_REQUESTS, SAME_CONTRACT_SECONDS)
+            return self._contract_pacers[symbol]
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _fetch(self, app, pacer, symbol, contract, end, duration, bar_size):
+        for attempt in range(self.retries + 1):
+            pacer.acquire()
+            self._contract_pacer(symbol).acquire()
+            self._count('requests')
+            request = app.request_historical_data(contract, end=end, duration=duration, bar_size=bar_size,
+                                                  what_to_show=self.what_to_show, use_rth=self.use_rth,
+                                                  format_date=2 if is_intraday(bar_size) else 1,
+                                                  timeout=self.timeout)
+            try:
+                return request.wait()
+            except IBError as e:
+                if e.code != NO_DATA:
+                    raise
+                if 'pacing' not in e.message.lower():
+                    # before the listing, or a day without trading
+                    self._count('empty')
+                    return []
+            except TimeoutError:
+                pass
+            if attempt < self.retries:
+                self._count('retries')
+                time.sleep(self.retry_delay)
+        raise TimeoutError('%s chunk ending %s failed after %d attempts' % (symbol, end, self.retries + 1))
+
+    def download_many(self, contracts, start, end, bar_size='1 day'):
+        """
+        Downloads the bars of several contracts at once.
+
+        Parameters
+        ----------
+        contracts : `dict`
+            `Contract` by symbol
+        start : `datetime`-like
+            First day
+        end : `datetime`-like
+            Last day (inclusive)
+        bar_size : `str`
+            One of `CHUNK_DURATIONS`
+
+        Returns
+        -------
+        `dict`
+            Bars as `pd.DataFrame` (see `bars_frame`) by symbol.
+        """
+        chunks = chunk_ends(start, end, bar_size)
+        jobs = queue.Queue()
+        for symbol, contract in contracts.items():
+            for chunk_end, duration in chunks:
+                jobs.put((symbol, contract, chunk_end, duration))
+
+        results = {symbol: [] for symbol in contracts}
+        errors = []
+
+        def work(app, pacer):
+            while not errors:
+                try:
+                    symbol, contract, chunk_end, duration = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    bars = self._fetch(app, pacer, symbol, contract, chunk_end, duration, bar_size)
+                except Exception as e:
+                    errors.append(e)
+                    return
+                self._count('bars', len(bars))
+                results[symbol].append(bars_frame(bars, bar_size))
+
+        # `in_flight` workers per connection, sharing its pacer
+        threads = [threading.Thread(target=work, args=(app, pacer), daemon=True)
+                   for app, pacer in zip(self.apps, self.pacers) for _ in range(self.in_flight)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+        first = pd.Timestamp(start).normalize()
+        last = pd.Timestamp(end).normalize() + timedelta(days=1)
+        frames = {}
+        for symbol, parts in results.items():
+            frame = _stitch(parts) if parts else bars_frame([], bar_size)
+            frames[symbol] = frame[(frame.index >= first) & (frame.index < last)]
+        return frames
+
+    def download(self, contract, start, end, bar_size='1 day'):
+        """
+        Downloads the bars of one contract, see `download_many`.
+
+        Returns
+        -------
+        `pd.DataFrame`
+        """
+        return self.download_many({contract.symbol: contract}, start, end, bar_size)[contract.symbol]
+
+    def backfill(self, contracts, start, end, bar_size='1 day'):
+        """
+        Brings the price store up to date: only the part of the
+        range not stored yet is downloaded for each contract,
+        then merged into the stored table. Contracts whose
+        stored table already covers the range are not
+        requested.
+
+        Parameters
+        ----------
+        contracts : `dict`
+            `Contract` by symbol
+        start : `datetime`-like
+            First day
+        end : `datetime`-like
+            Last day (inclusive)
+        bar_size : `str`
+            One of `CHUNK_DURATIONS`
+
+        Returns
+        -------
+        `dict`
+            Path of the stored table of every symbol of
+            `contracts`, whether downloaded or already up to
+            date.
+        """
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        store = PriceCache(self.cache_dir, offline=True)
+        source = store_source(bar_size)
+
+        # missing head and tail of each symbol, grouped by range so they download together
+        ranges = {}
+        for symbol, contract in contracts.items():
+            meta = read_meta(store.path(symbol, source))
+            if meta is None:
+                ranges.setdefault((start, end), {})[symbol] = contract
+                continue
+            covered = pd.Timestamp(meta['covered_start']), pd.Timestamp(meta['covered_end'])
+            if start < covered[0]:
+                ranges.setdefault((start, covered[0] - timedelta(days=1)), {})[symbol] = contract
+            if end > covered[1]:
+                ranges.setdefault((covered[1] + timedelta(days=1), end), {})[symbol] = contract
+
+        paths = {symbol: store.path(symbol, source) for symbol in contracts}
+        for (first, last), group in ranges.items():
+            for symbol, frame in self.download_many(group, first, last, bar_size).items():
+                paths[symbol] = store_bars(frame, symbol, bar_size, first, last, self.cache_dir)
+        return paths
+
+
+def store_bars(frame, symbol, bar_size, start, end, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Merges downloaded bars into the price store, with the
+    layout and coverage metadata of `PriceCache`.
+
+    Parameters
+    ----------
+    frame : `pd.DataFrame`
+        Bars, see `bars_frame`
+    symbol : `str`
+        Symbol to store them under
+    bar_size : `str`
+        The bar size, which selects the source (`store_source`)
+    start, end : `datetime`-like
+        Range the bars were requested for
+
+    Returns
+    -------
+    `str`
+        Path of the stored table.
+    """
+    path = PriceCache(cache_dir, offline=True).path(symbol, store_source(bar_size))
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    meta = read_meta(path)
+    if meta is not None:
+        frame = _stitch([read_table(path, mmap=False), frame])
+        start = min(start, pd.Timestamp(meta['covered_start']))
+        end = max(end, pd.Timestamp(meta['covered_end']))
+    # the current day is never marked as covered, so it gets refreshed on the next run
+    end = min(end, pd.Timestamp(date.today() - timedelta(days=1)))
+
+    write_table(path, frame, unit='s' if is_intraday(bar_size) else 'D',
+                meta={'symbol': symbol, 'source': store_source(bar_size), 'bar_size': bar_size,
+                      'covered_start': start.date(), 'covered_end': end.date()})
+    return path
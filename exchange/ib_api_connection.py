@@ -1,11 +1,14 @@
 import datetime
 import queue
 import threading
+import time
 
 from ibapi.client import EClient
 from ibapi.wrapper import EWrapper
 from ibapi.contract import Contract
-from ibapi.ticktype import TickTypeEnum
+
+from exchange.request_manager import WARNING_CODES, IBError, RequestManager
+from exchange.ticks import PRICE, SIZE, TickConsumer, TickRing
 
 # https://www.quantstart.com/articles/connecting-to-the-interactive-brokers-native-python-api/
 class IBAPIWrapper(EWrapper):
@@ -57,43 +60,69 @@ class IBAPIWrapper(EWrapper):
                 return None
         return None
 
-    def error(self, id, errorCode, errorString):
+    def error(self, id, errorCode, errorString, *args):
         """
-        Format the error message with appropriate codes and
-        place the error string onto the error queue.
+        Fail the request the error refers to; errors of no
+        request in flight are placed onto the error queue.
+        Notices such as data farm status are dropped.
         """
-        error_message = (
-            "IB Error ID (%d), Error Code (%d) with "
-            "response '%s'" % (id, errorCode, errorString)
-        )
-        #self._errors.put(error_message)
+        if errorCode in WARNING_CODES:
+            return
+        error = IBError(id, errorCode, errorString)
+        if not self.requests.fail(id, error):
+            self._errors.put(str(error))
 
-    def init_time(self):
+    def init_requests(self, pacer=None):
         """
-        Instantiates a new queue to store the server
-        time, assigning it to a 'private' instance
-        variable and also returning it.
+        Instantiates the table of in-flight requests, which
+        allocates request IDs, routes every response to its
+        request and paces the outgoing messages.
+
+        Parameters
+        ----------
+        pacer : `TokenBucket`, optional
+            Pacing of the outgoing messages, default IB's
+            message rate limit
 
         Returns
         -------
-        `Queue`
-            The time queue instance.
+        `RequestManager`
+            The request manager instance.
         """
-        time_queue = queue.Queue()
-        self._time_queue = time_queue
-        return time_queue
+        self.requests = RequestManager(pacer=pacer)
+        return self.requests
 
     def currentTime(self, server_time):
         """
-        Takes the time received by the server and
-        appends it to the class instance time queue.
+        Completes the oldest pending server time request.
 
         Parameters
         ----------
-        server_time : `str`
-            The server time message.
+        server_time : `int`
+            The server unix timestamp.
         """
-        self._time_queue.put(server_time)
+        request = self.requests.oldest('server_time')
+        if request is not None:
+            self.requests.add(request.req_id, server_time)
+            self.requests.finish(request.req_id)
+
+    def contractDetails(self, reqId, contractDetails):
+        self.requests.add(reqId, contractDetails)
+
+    def contractDetailsEnd(self, reqId):
+        self.requests.finish(reqId)
+
+    def historicalData(self, reqId, bar):
+        self.requests.add(reqId, bar)
+
+    def historicalDataEnd(self, reqId, start, end):
+        self.requests.finish(reqId)
+
+    def tickSnapshotEnd(self, reqId):
+        self.requests.finish(reqId)
+
+    def connectionClosed(self):
+        self.requests.fail_all(ConnectionError('Connection to IB closed'))
 
 class IBAPIClient(EClient):
     """
@@ -113,6 +142,14 @@ class IBAPIClient(EClient):
     def __init__(self, wrapper):
         EClient.__init__(self, wrapper)
 
+    def sendMsg(self, msg):
+        """
+        Sends a message once the pacer allows it, so bursts of
+        requests stay within IB's message rate limit.
+        """
+        self.wrapper.requests.pacer.acquire()
+        EClient.sendMsg(self, msg)
+
     def obtain_server_time(self):
         """
         Requests the current server time from IB then
@@ -123,21 +160,21 @@ class IBAPIClient(EClient):
         `int`
             The server unix timestamp.
         """
-        # Instantiate a queue to store the server time
-        time_queue = self.wrapper.init_time()
+        # Register the request, answered in order of the
+        # requests since the response carries no request ID
+        request = self.wrapper.requests.open(
+            'server_time', timeout=IBAPIClient.MAX_WAIT_TIME_SECONDS, by_kind=True
+        )
 
         # Ask IB for the server time using the EClient method
         self.reqCurrentTime()
 
-        # Try to obtain the latest server time if it exists
-        # in the queue, otherwise issue a warning
+        # Try to obtain the server time, otherwise issue a warning
         try:
-            server_time = time_queue.get(
-                timeout=IBAPIClient.MAX_WAIT_TIME_SECONDS
-            )
-        except queue.Empty:
+            server_time, = request.wait()
+        except (TimeoutError, ConnectionError):
             print(
-                "Time queue was empty or exceeded maximum timeout of "
+                "No server time received within the maximum timeout of "
                 "%d seconds" % IBAPIClient.MAX_WAIT_TIME_SECONDS
             )
             server_time = None
@@ -148,6 +185,92 @@ class IBAPIClient(EClient):
 
         return server_time
 
+    def request_contract_details(self, contract, timeout=MAX_WAIT_TIME_SECONDS):
+        """
+        Requests the details of every contract matching
+        `contract` and waits for them.
+
+        Returns
+        -------
+        `list` of `ContractDetails`
+        """
+        request = self.wrapper.requests.open('contract_details', timeout=timeout)
+        self.reqContractDetails(request.req_id, contract)
+        return request.wait()
+
+    def request_historical_data(self, contract, end='', duration='1 Y', bar_size='1 day', what_to_show='TRADES',
+                                use_rth=True, format_date=1, timeout=60, on_done=None):
+        """
+        Requests historical bars, see `EClient.reqHistoricalData`.
+
+        Parameters
+        ----------
+        contract : `Contract`
+            The contract to request
+        end : `str`
+            End of the period as 'yyyymmdd hh:mm:ss', '' for now
+        duration : `str`
+            Length of the period, such as '1 Y' or '30 D'
+        bar_size : `str`
+            Such as '1 day' or '1 min'
+        what_to_show : `str`
+            Such as 'TRADES', 'MIDPOINT' or 'ADJUSTED_LAST'
+        use_rth : `boolean`
+            Only regular trading hours
+        format_date : `int`
+            1 for 'yyyymmdd[  hh:mm:ss]' dates, 2 for unix
+            timestamps (intraday bars)
+        timeout : `float`
+            Seconds before the request expires
+        on_done : `callable`, optional
+            Called with the `Request` once complete
+
+        Returns
+        -------
+        `Request`
+            The in-flight request; `wait()` returns the bars
+            as `BarData`.
+        """
+        request = self.wrapper.requests.open('historical_data', timeout=timeout, on_done=on_done)
+        self.reqHistoricalData(request.req_id, contract, end, duration, bar_size, what_to_show, int(use_rth),
+                               format_date, False, [])
+        return request
+
+    def request_market_data(self, contract, generic_ticks='', snapshot=False, on_done=None):
+        """
+        Subscribes to market data; the ticks arrive through
+        tickPrice and tickSize.
+
+        The subscription is registered without deadline, so an
+        error for it (no security definition, no market data
+        permissions) fails the request instead of reaching the
+        error queue. A snapshot completes on tickSnapshotEnd.
+
+        Parameters
+        ----------
+        on_done : `callable`, optional
+            Called with the `Request` when the subscription
+            fails or the snapshot ends
+
+        Returns
+        -------
+        `Request`
+            The subscription, to cancel with
+            `cancel_market_data(request.req_id)`.
+        """
+        request = self.wrapper.requests.open('market_data', timeout=None, on_done=on_done)
+        self.reqMktData(request.req_id, contract, generic_ticks, snapshot, False, [])
+        return request
+
+    def cancel_market_data(self, req_id):
+        """
+        Cancels a market data subscription and forgets its
+        request; a subscription that already failed is only
+        forgotten.
+        """
+        if self.wrapper.requests.cancel(req_id):
+            self.cancelMktData(req_id)
+
 class IBAPIApp(IBAPIWrapper, IBAPIClient):
     """
     The IB API application class creates the instances
@@ -166,12 +289,29 @@ class IBAPIApp(IBAPIWrapper, IBAPIClient):
         The port to connect to TWS/IB Gateway with
     clientid : `int`
         An (arbitrary) client ID, that must be a positive integer
+    tick_sink : `callable`, optional
+        Called with every `TickBatch` of market data ticks on the
+        tick consumer thread; by default the ticks are kept until
+        `tick_consumer.take()` collects them
+    tick_capacity : `int`
+        Ticks buffered between the message thread and the tick
+        consumer; further ticks are dropped and counted
     """
 
-    def __init__(self, ipaddress, portid, clientid):
+    def __init__(self, ipaddress, portid, clientid, tick_sink=None, tick_capacity=1 << 16):
         IBAPIWrapper.__init__(self)
         IBAPIClient.__init__(self, wrapper=self)
 
+        # Listen for the IB responses
+        self.init_error()
+        self.init_requests()
+
+        # Market data callbacks only append to the tick ring,
+        # a separate thread batches them into the sink. It
+        # outlives reconnects; tick_consumer.stop() drains it
+        self.tick_ring = TickRing(tick_capacity)
+        self.tick_consumer = TickConsumer(self.tick_ring, tick_sink).start()
+
         # Connects to the IB server with the
         # appropriate connection parameters
         self.connect(ipaddress, portid, clientid)
@@ -181,14 +321,49 @@ class IBAPIApp(IBAPIWrapper, IBAPIClient):
         thread.start()
         setattr(self, "_thread", thread)
 
-        # Listen for the IB responses
-        self.init_error()
-
     def tickPrice(self, reqId, tickType, price, attrib):
-        print('Tick Price [Id: {}] {} of {}'.format(reqId, TickTypeEnum.to_str(tickType), price))
+        self.tick_ring.push(reqId, tickType, price, PRICE)
 
     def tickSize(self, reqId, tickType, size):
-        print('Tick Size [Id: {}] {} of {}'.format(reqId, TickTypeEnum.to_str(tickType), size))
+        self.tick_ring.push(reqId, tickType, float(size), SIZE)
+
+    def download_history(self, contracts, start, end, bar_size='1 day', others=(), store=True, **options):
+        """
+        Downloads historical bars in paced, concurrent chunks,
+        see `exchange.history.HistoricalDownloader`.
+
+        Parameters
+        ----------
+        contracts : `dict`
+            `Contract` by symbol
+        start : `datetime`-like
+            First day
+        end : `datetime`-like
+            Last day (inclusive)
+        bar_size : `str`
+            Such as '1 day' or '1 min'
+        others : `list` of `IBAPIApp`
+            More connections (other client IDs) to spread the
+            requests over
+        store : `boolean`
+            Merge the bars into the local price store and only
+            download what it is missing
+        options
+            Further `HistoricalDownloader` parameters
+
+        Returns
+        -------
+        `dict`
+            By symbol, the path of the stored table if `store`,
+            otherwise the bars as `pd.DataFrame`.
+        """
+        # pandas and the price store only load when history is used
+        from exchange.history import HistoricalDownloader
+
+        downloader = HistoricalDownloader([self, *others], **options)
+        if store:
+            return downloader.backfill(contracts, start, end, bar_size)
+        return downloader.download_many(contracts, start, end, bar_size)
 
 
 if __name__ == '__main__':
@@ -196,6 +371,7 @@ if __name__ == '__main__':
     host = '127.0.0.1'  # Localhost, but change if TWS is running elsewhere
     port = 4001  # Change to the appropriate IB TWS account port number
     client_id = 1234
+    stream_seconds = 30  # How long to buffer market data for before cancelling and printing the tick stats
 
     print("Launching IB API application...")
 
@@ -211,9 +387,16 @@ if __name__ == '__main__':
     sample_contact.currency = 'USD'
 
     app.reqMarketDataType(4)  # switch to delayed-frozen data if live is not available
-    app.reqMktData(1, sample_contact, '', False, False, [])
+    subscription = app.request_market_data(sample_contact)
 
-    app.run()
+    # The message loop already runs on the thread started by
+    # IBAPIApp, a second app.run() here would race it for messages
+    time.sleep(stream_seconds)
+    app.cancel_market_data(subscription.req_id)
+    app.tick_consumer.stop()
+    print('Ticks: %s' % app.tick_consumer.stats())
+    if subscription.error is not None:
+        print(subscription.error)
 
     # Obtain the server time via the IB API app
     # server_time = app.obtain_server_time()
@@ -225,5 +408,6 @@ if __name__ == '__main__':
 
     # Disconnect from the IB server
     app.disconnect()
+    app._thread.join()
 
     print("Disconnected from the IB API application. Finished.")
@@ -0,0 +1,400 @@
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+# IB disconnects clients sending more than 50 messages per second
+MAX_MESSAGES_PER_SECOND = 50
+
+# Messages a cold bucket sends without waiting; small, so a burst
+# and the refill of its first second stay within the rate limit
+DEFAULT_BURST = 5
+
+# Error codes that are notices (data farm status, delayed data),
+# not failures of the request they refer to
+WARNING_CODES = frozenset(range(2100, 2170)) | {10167}
+
+
+class IBError(Exception):
+    """
+    An error reported by IB for a request.
+
+    Parameters
+    ----------
+    req_id : `int`
+        The request ID the error refers to
+    code : `int`
+        The IB error code
+    message : `str`
+        The IB error message
+    """
+
+    def __init__(self, req_id, code, message):
+        super().__init__("IB Error ID (%d), Error Code (%d) with response '%s'" % (req_id, code, message))
+        self.req_id = req_id
+        self.code = code
+        self.message = message
+
+
+class TokenBucket:
+    """
+    Token bucket pacing outgoing messages: tokens refill at
+    `rate` per second up to `burst`, and every message takes
+    one. Thread-safe.
+
+    Parameters
+    ----------
+    rate : `float`
+        Tokens added per second
+    burst : `float`
+        Bucket size, the largest burst sent without waiting
+    clock : `callable`
+        Monotonic clock in seconds
+    """
+
+    def __init__(self, rate=MAX_MESSAGES_PER_SECOND, burst=DEFAULT_BURST, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self.waited = 0.0  # total seconds senders were held back
+
+    def reserve(self, tokens=1):
+        """
+        Takes `tokens` now, going into debt if the bucket is
+        short, and returns how long the caller must wait before
+        sending. Lets asynchronous callers sleep without
+        holding a thread.
+
+        Returns
+        -------
+        `float`
+            Seconds to wait, 0 if the tokens were available.
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.waited += delay
+        return delay
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until `tokens` may be sent.
+
+        Returns
+        -------
+        `float`
+            Seconds waited.
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class RateWindow:
+    """
+    Sliding window limit: at most `limit` messages in any
+    `period` seconds, as IB's historical data pacing rules are
+    stated. Same interface as `TokenBucket`. Thread-safe.
+
+    Parameters
+    ----------
+    limit : `int`
+        Messages allowed per window
+    period : `float`
+        Window length in seconds
+    clock : `callable`
+        Monotonic clock in seconds
+    """
+
+    def __init__(self, limit, period, clock=time.monotonic):
+        self.limit = limit
+        self.period = period
+        self.clock = clock
+        self._sent = collections.deque()  # send times of the last `limit` messages
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def reserve(self, tokens=1):
+        """
+        Books the next send slot(s) and returns how long the
+        caller must wait before sending.
+
+        Returns
+        -------
+        `float`
+            Seconds to wait, 0 if the window has room.
+        """
+        with self._lock:
+            now = self.clock()
+            at = now
+            for _ in range(tokens):
+                if len(self._sent) >= self.limit:
+                    at = max(at, self._sent.popleft() + self.period)
+                self._sent.append(at)
+            delay = at - now
+            self.waited += delay
+        return delay
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until `tokens` may be sent.
+
+        Returns
+        -------
+        `float`
+            Seconds waited.
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class Request:
+    """
+    An in-flight request of a `RequestManager`. Responses are
+    buffered in `items` until the request completes.
+
+    Attributes
+    ----------
+    req_id : `int`
+        The request ID sent to IB
+    kind : `str`
+        What was requested, such as 'contract_details'
+    items : `list`
+        The responses received so far
+    deadline : `float` or None
+        Monotonic time after which the request expires
+    error : `Exception` or None
+        Why the request failed
+    """
+    __slots__ = ('req_id', 'kind', 'items', 'deadline', 'error', 'on_done', '_done')
+
+    def __init__(self, req_id, kind, deadline=None, on_done=None):
+        self.req_id = req_id
+        self.kind = kind
+        self.items = []
+        self.deadline = deadline
+        self.error = None
+        self.on_done = on_done
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the request completes.
+
+        Parameters
+        ----------
+        timeout : `float`, optional
+            Seconds to wait, default until the deadline
+
+        Returns
+        -------
+        `list`
+            The responses.
+
+        Raises
+        ------
+        `TimeoutError`
+            If the request has not completed in time
+        `Exception`
+            The error the request failed with
+        """
+        if timeout is None and self.deadline is not None:
+            timeout = max(self.deadline - time.monotonic(), 0.0)
+        if not self._done.wait(timeout):
+            raise TimeoutError('Request %d (%s) timed out' % (self.req_id, self.kind))
+        if self.error is not None:
+            raise self.error
+        return self.items
+
+
+class RequestManager:
+    """
+    Allocates request IDs and keeps the table of in-flight
+    requests, so every EWrapper callback and `error(id, ...)`
+    reaches the request it belongs to with a dictionary
+    lookup. Responses without a request ID (server time) are
+    matched to the oldest open request of their kind.
+
+    The message thread calls `add`, `finish` and `fail`;
+    requesters call `open` and wait on the returned `Request`,
+    or pass `on_done` to be called when it completes.
+
+    Parameters
+    ----------
+    first_id : `int`
+        The first request ID to allocate
+    pacer : `TokenBucket`, optional
+        Pacing of the outgoing messages. Defaults to IB's
+        message rate limit
+    timeout : `float`, optional
+        Default seconds before a request expires, None for no
+        deadline
+    clock : `callable`
+        Monotonic clock in seconds of the deadlines
+    """
+
+    def __init__(self, first_id=1, pacer=None, timeout=10, clock=time.monotonic):
+        self.pacer = pacer if pacer is not None else TokenBucket()
+        self.timeout = timeout
+        self.clock = clock
+        self._ids = itertools.count(first_id)
+        self._in_flight = {}
+        self._by_kind = collections.defaultdict(collections.deque)
+        self._deadlines = []  # heap of (deadline, req_id)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._in_flight)
+
+    def __contains__(self, req_id):
+        return req_id in self._in_flight
+
+    def open(self, kind, timeout=-1, on_done=None, by_kind=False):
+        """
+        Allocates a request ID and registers the request.
+
+        Parameters
+        ----------
+        kind : `str`
+            What is requested
+        timeout : `float` or None
+            Seconds before the request expires, None for no
+            deadline; defaults to the manager's timeout
+        on_done : `callable`, optional
+            Called with the `Request` when it completes or
+            fails, on the thread completing it
+        by_kind : `boolean`
+            The responses carry no request ID and are matched
+            to the oldest open request of this kind
+
+        Returns
+        -------
+        `Request`
+        """
+        # also drops the heap entries of completed requests once their deadline passed
+        self.expire()
+        timeout = self.timeout if timeout == -1 else timeout
+        deadline = self.clock() + timeout if timeout is not None else None
+        request = Request(next(self._ids), kind, deadline, on_done)
+        with self._lock:
+            self._in_flight[request.req_id] = request
+            if by_kind:
+                self._by_kind[kind].append(request)
+            if deadline is not None:
+                heapq.heappush(self._deadlines, (deadline, request.req_id))
+        return request
+
+    def get(self, req_id):
+        """
+        The in-flight request with this ID, or None.
+        """
+        return self._in_flight.get(req_id)
+
+    def oldest(self, kind):
+        """
+        The oldest in-flight request opened with `by_kind`, or
+        None.
+        """
+        pending = self._by_kind.get(kind)
+        while pending:
+            request = pending[0]
+            if request.req_id in self._in_flight:
+                return request
+            pending.popleft()
+        return None
+
+    def add(self, req_id, item):
+        """
+        Buffers a response of a request; responses of unknown
+        or completed requests are ignored.
+
+        Returns
+        -------
+        `boolean`
+            Whether the request is in flight.
+        """
+        request = self._in_flight.get(req_id)
+        if request is None:
+            return False
+        request.items.append(item)
+        return True
+
+    def finish(self, req_id):
+        """
+        Completes a request with its buffered responses.
+        """
+        return self._complete(req_id, None)
+
+    def fail(self, req_id, error):
+        """
+        Completes a request with an error.
+
+        Returns
+        -------
+        `boolean`
+            Whether the request was in flight.
+        """
+        return self._complete(req_id, error)
+
+    def cancel(self, req_id):
+        """
+        Forgets a request without completing it, e.g. a
+        cancelled subscription.
+        """
+        with self._lock:
+            return self._in_flight.pop(req_id, None) is not None
+
+    def _complete(self, req_id, error):
+        with self._lock:
+            request = self._in_flight.pop(req_id, None)
+        if request is None:
+            return False
+        request.error = error
+        request._done.set()
+        if request.on_done is not None:
+            request.on_done(request)
+        return True
+
+    def expire(self, now=None):
+        """
+        Fails every request past its deadline with
+        `TimeoutError`.
+
+        Returns
+        -------
+        `list` of `Request`
+            The expired requests.
+        """
+        now = self.clock() if now is None else now
+        expired = []
+        while True:
+            with self._lock:
+                if not self._deadlines or self._deadlines[0][0] > now:
+                    break
+                _, req_id = heapq.heappop(self._deadlines)
+                request = self._in_flight.get(req_id)
+            if request is not None and self.fail(req_id, TimeoutError('Request %d (%s) timed out'
+                                                                      % (req_id, request.kind))):
+                expired.append(request)
+        return expired
+
+    def fail_all(self, error):
+        """
+        Fails every in-flight request, e.g. on disconnection.
+        """
+        for req_id in list(self._in_flight):
+            self.fail(req_id, error)
@@ -0,0 +1,339 @@
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+import numpy as np
+
+# Value kinds of a tick record
+PRICE = 0
+SIZE = 1
+
+
+class TickBatch(NamedTuple):
+    """
+    Ticks drained from a `TickRing` in one go, as columns
+    in arrival order.
+
+    Attributes
+    ----------
+    req_id : `np.ndarray` of int32
+        Request ID of the market data subscription.
+    tick_type : `np.ndarray` of int16
+        IB tick type (see `ibapi.ticktype.TickTypeEnum`).
+    kind : `np.ndarray` of int8
+        `PRICE` or `SIZE`.
+    value : `np.ndarray` of float64
+        The price or the size.
+    timestamp : `np.ndarray` of int64
+        `time.monotonic_ns()` when the tick was received.
+    """
+    req_id: np.ndarray
+    tick_type: np.ndarray
+    kind: np.ndarray
+    value: np.ndarray
+    timestamp: np.ndarray
+
+    def __len__(self):
+        return len(self.value)
+
+    @staticmethod
+    def empty():
+        return TickBatch(np.zeros(0, np.int32), np.zeros(0, np.int16), np.zeros(0, np.int8),
+                         np.zeros(0, np.float64), np.zeros(0, np.int64))
+
+    @staticmethod
+    def concatenate(batches):
+        """
+        Joins batches into a single one.
+
+        Parameters
+        ----------
+        batches : `list` of `TickBatch`
+
+        Returns
+        -------
+        `TickBatch`
+        """
+        if not batches:
+            return TickBatch.empty()
+        return TickBatch(*(np.concatenate(columns) for columns in zip(*batches)))
+
+
+def save_ticks(path, batch: TickBatch):
+    """
+    Records ticks to a `.npz` file, one array per column.
+
+    Parameters
+    ----------
+    path : `str`
+        The file to write
+    batch : `TickBatch`
+        The ticks, e.g. `TickConsumer.take()`
+    """
+    np.savez(path, **batch._asdict())
+
+
+def load_ticks(path):
+    """
+    Reads recorded ticks, from a `.npz` file written by
+    `save_ticks` or a CSV file with a header naming the
+    `TickBatch` columns; `req_id` and `kind` may be left out
+    (0 and `PRICE`).
+
+    Parameters
+    ----------
+    path : `str`
+        The file to read
+
+    Returns
+    -------
+    `TickBatch`
+    """
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            columns = {name: data[name] for name in data.files}
+    else:
+        table = np.genfromtxt(path, delimiter=',', names=True, dtype=None, encoding='ascii')
+        columns = {name: np.atleast_1d(table[name]) for name in table.dtype.names}
+    n = len(columns['value'])
+    dtypes = {'req_id': np.int32, 'tick_type': np.int16, 'kind': np.int8, 'value': np.float64,
+              'timestamp': np.int64}
+    return TickBatch(**{
+        name: np.asarray(columns[name], dtype) if name in columns else np.full(n, PRICE if name == 'kind' else 0, dtype)
+        for name, dtype in dtypes.items()
+    })
+
+
+class TickRing:
+    """
+    Bounded single-producer / single-consumer ring buffer of
+    tick records, stored as preallocated columns.
+
+    The producer (the EClient message thread) only writes
+    the slot at `head` and then advances `head`; the consumer
+    only copies the slots before `head` and then advances
+    `tail`. Each index has a single writer, so neither side
+    takes a lock. When the ring is full new ticks are dropped
+    and counted instead of blocking the producer.
+
+    Parameters
+    ----------
+    capacity : `int`
+        Number of ticks the ring holds, rounded up to a
+        power of two.
+    """
+
+    def __init__(self, capacity=1 << 16):
+        capacity = 1 << max(int(capacity) - 1, 0).bit_length()
+        self.capacity = capacity
+        self._half = max(capacity >> 1, 1)
+        self._mask = capacity - 1
+        self._req_id = np.zeros(capacity, dtype=np.int32)
+        self._tick_type = np.zeros(capacity, dtype=np.int16)
+        self._kind = np.zeros(capacity, dtype=np.int8)
+        self._value = np.zeros(capacity, dtype=np.float64)
+        self._timestamp = np.zeros(capacity, dtype=np.int64)
+
+        self.head = 0  # ticks written, only advanced by the producer
+        self.tail = 0  # ticks consumed, only advanced by the consumer
+        self.dropped = 0
+        self.high_water = 0  # largest occupancy seen by the producer
+
+        # set by the producer when the ring is half full,
+        # so a waiting consumer drains early
+        self.wake = threading.Event()
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def push(self, req_id, tick_type, value, kind=PRICE):
+        """
+        Appends a tick; never blocks.
+
+        Returns
+        -------
+        `boolean`
+            False if the ring was full and the tick was dropped.
+        """
+        head = self.head
+        used = head - self.tail
+        if used >= self.capacity:
+            self.dropped += 1
+            return False
+
+        slot = head & self._mask
+        self._req_id[slot] = req_id
+        self._tick_type[slot] = tick_type
+        self._kind[slot] = kind
+        self._value[slot] = value
+        self._timestamp[slot] = time.monotonic_ns()
+        self.head = head + 1
+
+        used += 1
+        if used > self.high_water:
+            self.high_water = used
+        if used == self._half:
+            self.wake.set()
+        return True
+
+    def drain(self, max_ticks=None):
+        """
+        Copies the pending ticks out of the ring and frees
+        their slots.
+
+        Parameters
+        ----------
+        max_ticks : `int`, optional
+            Drain at most this many ticks.
+
+        Returns
+        -------
+        `TickBatch`
+            The drained ticks, oldest first.
+        """
+        tail, head = self.tail, self.head
+        if max_ticks is not None:
+            head = min(head, tail + max_ticks)
+
+        start, stop = tail & self._mask, head & self._mask
+        if head == tail:
+            return TickBatch.empty()
+        if start < stop:
+            parts = [slice(start, stop)]
+        else:
+            # wraps around the end of the buffer
+            parts = [slice(start, self.capacity), slice(0, stop)]
+
+        batch = TickBatch(*(
+            np.concatenate([column[part] for part in parts])
+            for column in (self._req_id, self._tick_type, self._kind, self._value, self._timestamp)
+        ))
+        self.tail = head
+        return batch
+
+
+class TickConsumer:
+    """
+    Thread draining a `TickRing` into a sink in batches, so
+    the EClient message thread only appends to the ring and
+    never does I/O.
+
+    Parameters
+    ----------
+    ring : `TickRing`
+        The ring to drain.
+    sink : `callable`, optional
+        Called with each non-empty `TickBatch` on the consumer
+        thread. By default the batches are kept until `take`
+        collects them.
+    interval : `float`
+        Seconds between drains when the ring is quiet; a
+        half-full ring wakes the consumer immediately.
+    max_batch : `int`, optional
+        Largest number of ticks per batch.
+    """
+
+    def __init__(self, ring: TickRing, sink: Optional[Callable[[TickBatch], None]] = None, interval=0.05,
+                 max_batch=None):
+        self.ring = ring
+        self.sink = sink if sink is not None else self._keep
+        self._batches: List[TickBatch] = []
+        self._batches_lock = threading.Lock()
+        self.interval = interval
+        self.max_batch = max_batch
+
+        self.consumed = 0
+        self.batch_count = 0
+        self.max_latency_ns = 0  # oldest tick age when drained
+        self.errors = 0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='tick-consumer', daemon=True)
+
+    def _keep(self, batch):
+        with self._batches_lock:
+            self._batches.append(batch)
+
+    def take(self):
+        """
+        Collects the batches kept by the default sink since the
+        last call.
+
+        Returns
+        -------
+        `TickBatch`
+            The kept ticks, oldest first.
+        """
+        with self._batches_lock:
+            batches, self._batches = self._batches, []
+        return TickBatch.concatenate(batches)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Drains the remaining ticks and stops the thread.
+        """
+        self._stop.set()
+        self.ring.wake.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        if not self._thread.is_alive():
+            # also drains a consumer that was never started
+            self.flush()
+
+    def flush(self):
+        """
+        Drains every pending tick into the sink.
+
+        Returns
+        -------
+        `int`
+            Number of ticks drained.
+        """
+        drained = 0
+        while len(self.ring):
+            batch = self.ring.drain(self.max_batch)
+            self.max_latency_ns = max(self.max_latency_ns, time.monotonic_ns() - int(batch.timestamp[0]))
+            self.consumed += len(batch)
+            self.batch_count += 1
+            drained += len(batch)
+            try:
+                self.sink(batch)
+            except Exception:
+                # a failing sink must not stop the ingestion
+                self.errors += 1
+        return drained
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.ring.wake.wait(self.interval)
+            self.ring.wake.clear()
+            self.flush()
+        self.flush()
+
+    def stats(self):
+        """
+        Backpressure and drop counters.
+
+        Returns
+        -------
+        `dict`
+            Ticks received, dropped and consumed, batches,
+            current and peak ring occupancy, capacity, worst
+            tick latency in milliseconds and sink errors.
+        """
+        ring = self.ring
+        return {
+            'received': ring.head + ring.dropped,
+            'dropped': ring.dropped,
+            'consumed': self.consumed,
+            'batches': self.batch_count,
+            'pending': len(ring),
+            'high_water': ring.high_water,
+            'capacity': ring.capacity,
+            'max_latency_ms': self.max_latency_ns / 1e6,
+            'sink_errors': self.errors,
+        }
@@ -0,0 +1,27 @@
+import importlib
+import os
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataset')
+
+# public names -> module defining them, imported on first access so `python -m simulation --help`
+# and the scripts only pay for pandas / scipy when they use them
+_EXPORTS = {
+    'total_return': 'utils', 'drawdown': 'utils', 'daily_return': 'utils', 'compound': 'utils',
+    'compound_return': 'utils',
+    'LeveragedETFSimulator': 'leveraged_etf', 'daily_leveraged_etf': 'leveraged_etf',
+    'RateCurve': 'rates', 'load_rate_curve': 'rates', 'process_libor': 'rates',
+}
+
+__all__ = ['DATASET_DIR', *_EXPORTS]
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+from .core import AVG_TRADING_DAYS_PER_YEAR, DAYS_PER_YEAR
+
+METRICS = ['cagr', 'max_drawdown', 'peak_date', 'trough_date', 'recovery_date', 'volatility',
+           'sharpe', 'sortino', 'calmar', 'ulcer_index']
+
+
+def _first_valid(valid: np.ndarray) -> np.ndarray:
+    return np.argmax(valid, axis=1)
+
+
+def _last_valid(valid: np.ndarray) -> np.ndarray:
+    return valid.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+
+
+def _chunk_metrics(nav: np.ndarray, day_numbers: np.ndarray, risk_free: np.ndarray, periods_per_year: int) -> dict:
+    rows = np.arange(nav.shape[0])
+    days = np.arange(nav.shape[1])
+    valid = ~np.isnan(nav)
+    first, last = _first_valid(valid), _last_valid(valid)
+
+    # returns and drawdowns are computed once and shared by every metric below
+    returns = nav[:, 1:] / nav[:, :-1] - 1
+    excess = returns - risk_free
+    peak = np.fmax.accumulate(nav, axis=1)
+    drawdown = nav / peak - 1
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        years = (day_numbers[last] - day_numbers[first]) / DAYS_PER_YEAR
+        cagr = ((nav[rows, last] / nav[rows, first]) ** (1 / years) - 1) * 100
+
+        trough = np.argmin(np.where(valid, drawdown, np.inf), axis=1)
+        max_drawdown = drawdown[rows, trough] * 100
+        # the peak is the last day before the trough that made a new high
+        new_high = np.where(valid & (nav >= peak), days, -1)
+        peak_idx = np.maximum.accumulate(new_high, axis=1)[rows, trough]
+        recovered = (days > trough[:, None]) & (nav >= peak[rows, trough][:, None])
+        recovery_idx = np.where(recovered.any(axis=1), np.argmax(recovered, axis=1), -1)
+
+        # NaN only precedes a path's start, so plain sums over zero-filled arrays replace the slower nan* reductions
+        valid_returns = ~np.isnan(returns)
+        n_returns = valid_returns.sum(axis=1)
+        returns = np.where(valid_returns, returns, 0.0)
+        excess = np.where(valid_returns, excess, 0.0)
+        mean_excess = excess.sum(axis=1) / n_returns
+        mean = returns.sum(axis=1) / n_returns
+        std = np.sqrt(np.maximum(np.einsum('ij,ij->i', returns, returns) - n_returns * mean ** 2, 0) / (n_returns - 1))
+        downside_excess = np.minimum(excess, 0)
+        downside = np.sqrt(np.einsum('ij,ij->i', downside_excess, downside_excess) / n_returns)
+
+        volatility = std * np.sqrt(periods_per_year) * 100
+        sharpe = mean_excess / std * np.sqrt(periods_per_year)
+        sortino = mean_excess / downside * np.sqrt(periods_per_year)
+        calmar = cagr / -max_drawdown
+        drawdown_pct = np.where(valid, drawdown, 0.0) * 100
+        ulcer_index = np.sqrt(np.einsum('ij,ij->i', drawdown_pct, drawdown_pct) / valid.sum(axis=1))
+
+    return {'cagr': cagr, 'max_drawdown': max_drawdown, 'peak': peak_idx, 'trough': trough,
+            'recovery': recovery_idx, 'volatility': volatility, 'sharpe': sharpe, 'sortino': sortino,
+            'calmar': calmar, 'ulcer_index': ulcer_index}
+
+
+def performance(paths, dates=None, risk_free=0.0, periods_per_year: int = AVG_TRADING_DAYS_PER_YEAR,
+                chunk_size: int = 1024) -> pd.DataFrame:
+    """
+    Performance metrics of many value paths at once (e.g. `SweepResult.paths`).
+    Returns and drawdowns are derived once per path and every metric is computed from them,
+    vectorized across paths; NaN before a path's first value (a later start date) is ignored.
+    :param paths: NAV or prices, shaped (paths, days), or a single 1-D path / Series
+    :param dates: Dates of the day axis (default the Series index); without dates, years are days / periods_per_year
+                  and the `*_date` columns hold day positions
+    :param risk_free: Risk-free rate for Sharpe and Sortino, annual in percent, scalar or one value per day
+    :param periods_per_year: Observations per year, to annualize volatility, Sharpe and Sortino
+    :param chunk_size: Paths processed per block, bounds the temporary memory
+    :return: DataFrame with one row per path: `cagr`, `max_drawdown`, `volatility`, `ulcer_index` (in percent),
+             `peak_date`, `trough_date`, `recovery_date` (NaT if not recovered), `sharpe`, `sortino`, `calmar`
+    """
+    if isinstance(paths, pd.Series):
+        dates = paths.index if dates is None else dates
+    paths = np.atleast_2d(np.asarray(paths, dtype=np.float64))
+    n_days = paths.shape[1]
+
+    if dates is None:
+        day_numbers = np.arange(n_days) * DAYS_PER_YEAR / periods_per_year
+    else:
+        dates = pd.DatetimeIndex(dates)
+        day_numbers = dates.values.astype('datetime64[D]').astype(np.float64)
+
+    risk_free = np.broadcast_to(np.asarray(risk_free, dtype=np.float64) / 100 / periods_per_year, (n_days,))[1:]
+
+    chunks = [_chunk_metrics(paths[lo:lo + chunk_size], day_numbers, risk_free, periods_per_year)
+              for lo in range(0, len(paths), chunk_size)]
+    metrics = {k: np.concatenate([c[k] for c in chunks]) for k in chunks[0]}
+
+    table = pd.DataFrame({k: metrics[k] for k in ['cagr', 'max_drawdown']})
+    for name in ['peak', 'trough', 'recovery']:
+        idx = metrics[name]
+        if dates is None:
+            # no calendar: report day positions instead
+            table[f'{name}_date'] = np.where(idx >= 0, idx, np.nan)
+        else:
+            table[f'{name}_date'] = pd.DatetimeIndex(np.where(idx >= 0, dates.values[np.maximum(idx, 0)],
+                                                              np.datetime64('NaT')))
+    for name in ['volatility', 'sharpe', 'sortino', 'calmar', 'ulcer_index']:
+        table[name] = metrics[name]
+
+    return table[METRICS]
@@ -0,0 +1,184 @@
+"""
+Process-pool execution of large scenario batches.
+
+The aligned arrays (returns, financing, resampling histories) are copied once into shared memory blocks that
+every worker attaches to, instead of being pickled with each task. A task is only a block of grid rows or a
+Monte Carlo chunk number, and comes back as its reduced metric table, never as full paths.
+With `workers=1` everything runs in-process through the same code path.
+"""
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Mapping, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from .core import AVG_TRADING_DAYS_PER_YEAR, sweep_rows
+from .scenarios import ScenarioGenerator, scenario_metrics
+from .sweep import day_deltas, grid_rows
+
+
+class SharedArrays:
+    """
+    Named arrays copied into shared memory; `specs` is all a worker needs to attach to them
+    :param arrays: Arrays to share, by name
+    """
+
+    def __init__(self, **arrays: np.ndarray):
+        self._blocks = []
+        self.specs = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self._blocks.append(block)
+            self.specs[name] = (block.name, array.shape, array.dtype.str)
+
+    @staticmethod
+    def attach(specs: dict) -> tuple:
+        """ (arrays by name, blocks to keep open while the arrays are used) """
+        arrays, blocks = {}, []
+        for name, (block_name, shape, dtype) in specs.items():
+            # pool workers share the resource tracker of the creating process, which unlinks the blocks
+            block = shared_memory.SharedMemory(name=block_name)
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            blocks.append(block)
+        return arrays, blocks
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self) -> 'SharedArrays':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# state of a worker process, set once by `_init_worker`
+_worker = {}
+
+
+def _init_worker(specs: dict, task):
+    _worker['arrays'], _worker['blocks'] = SharedArrays.attach(specs)
+    _worker['task'] = task
+
+
+def _run(bounds):
+    return _worker['task'](_worker['arrays'], *bounds)
+
+
+def _map(task, arrays: Dict[str, np.ndarray], bounds: list, workers: Optional[int]) -> list:
+    """ Applies `task(arrays, *b)` to every `b` of `bounds`, in order, on `workers` processes """
+    workers = min(workers or os.cpu_count() or 1, len(bounds))
+    if workers <= 1:
+        return [task(arrays, *b) for b in bounds]
+
+    with SharedArrays(**arrays) as shared:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shared.specs, task)) as pool:
+            return list(pool.map(_run, bounds))
+
+
+def _bounds(n: int, block_size: int) -> list:
+    return [(lo, min(lo + block_size, n)) for lo in range(0, n, block_size)]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Tasks; plain picklable objects holding the scalar settings, the arrays come from shared memory
+
+class _SweepTask:
+    def __init__(self, starting_amount, chunk_size, trading_days, day_count):
+        self.starting_amount = starting_amount
+        self.chunk_size = chunk_size
+        self.trading_days = trading_days
+        self.day_count = day_count
+
+    def __call__(self, arrays, lo, hi):
+        cagr, max_drawdown = np.empty(hi - lo), np.empty(hi - lo)
+        for a, b in _bounds(hi - lo, self.chunk_size):
+            _, cagr[a:b], max_drawdown[a:b] = sweep_rows(arrays['returns'], arrays['financing'], arrays['day_delta'],
+                                                         arrays['rows'][lo + a:lo + b], self.starting_amount,
+                                                         self.trading_days, self.day_count)
+        return cagr, max_drawdown
+
+
+class _ScenarioTask:
+    def __init__(self, generator: ScenarioGenerator, n_paths, n_days, chunk_size, metric_kwargs):
+        # the generator's arrays travel through shared memory, the rest of it is pickled once per worker
+        self.generator = copy.copy(generator)
+        self.shared = [k for k, v in vars(generator).items() if isinstance(v, np.ndarray)]
+        for k in self.shared:
+            setattr(self.generator, k, None)
+        self.n_paths = n_paths
+        self.n_days = n_days
+        self.chunk_size = chunk_size
+        self.metric_kwargs = metric_kwargs
+
+    def arrays(self, generator: ScenarioGenerator) -> Dict[str, np.ndarray]:
+        return {k: getattr(generator, k) for k in self.shared}
+
+    def __call__(self, arrays, lo, hi):
+        for k in self.shared:
+            setattr(self.generator, k, arrays[k])
+        tables = []
+        for i in range(lo, hi):
+            n = min(self.chunk_size, self.n_paths - i * self.chunk_size)
+            tables.append(scenario_metrics(self.generator.chunk(i, n, self.n_days), **self.metric_kwargs))
+        return pd.concat(tables, ignore_index=True)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def batch_sweep(dates: pd.DatetimeIndex, underlying_returns: np.ndarray,
+                financing: Union[np.ndarray, Mapping[str, np.ndarray]],
+                leverage: Sequence[float] = (1.0,), expense_ratio: Sequence[float] = (0.0,),
+                financing_spread: Sequence[float] = (0.0,), start_dates: Sequence = (None,),
+                starting_amount: float = 1.0, workers: Optional[int] = None, shard_size: Optional[int] = None,
+                chunk_size: int = 1024, trading_days: int = AVG_TRADING_DAYS_PER_YEAR,
+                day_count: int = AVG_TRADING_DAYS_PER_YEAR) -> pd.DataFrame:
+    """
+    `sweep.sweep` without paths, with the scenario grid sharded across a process pool
+    :param workers: Processes to use, default one per core; 1 runs in-process
+    :param shard_size: Scenarios per task, default an even split in 4 tasks per worker
+    :return: The scenario grid with `cagr` and `max_drawdown`, as `SweepResult.scenarios`
+    """
+    dates = pd.DatetimeIndex(dates)
+    grid, financing, rows = grid_rows(dates, financing, leverage, expense_ratio, financing_spread, start_dates)
+
+    workers = workers or os.cpu_count() or 1
+    shard_size = shard_size or max(-(-len(grid) // (4 * workers)), 1)
+    arrays = {'returns': np.asarray(underlying_returns, dtype=np.float64), 'financing': financing,
+              'day_delta': day_deltas(dates), 'rows': rows}
+    task = _SweepTask(starting_amount, chunk_size, trading_days, day_count)
+    results = _map(task, arrays, _bounds(len(grid), shard_size), workers)
+
+    grid['cagr'] = np.concatenate([cagr for cagr, _ in results])
+    grid['max_drawdown'] = np.concatenate([max_drawdown for _, max_drawdown in results])
+    return grid
+
+
+def batch_scenarios(generator: ScenarioGenerator, n_paths: int, n_days: int, underlying: str,
+                    leverage: float = 3.0, expense_ratio: float = 0.95, chunk_size: int = 1000,
+                    workers: Optional[int] = None, trading_days: int = AVG_TRADING_DAYS_PER_YEAR,
+                    day_count: int = AVG_TRADING_DAYS_PER_YEAR) -> pd.DataFrame:
+    """
+    `scenarios.simulate_scenarios` with the Monte Carlo chunks spread across a process pool.
+    Chunk `i` is always drawn from the same seed, so the table is identical for any number of workers.
+    :param workers: Processes to use, default one per core; 1 runs in-process
+    :return: `analytics.performance` table with one row per path
+    """
+    n_chunks = -(-n_paths // chunk_size)
+    workers = min(workers or os.cpu_count() or 1, n_chunks)
+    metric_kwargs = {'underlying': underlying, 'leverage': leverage, 'expense_ratio': expense_ratio,
+                     'trading_days': trading_days, 'day_count': day_count}
+    task = _ScenarioTask(generator, n_paths, n_days, chunk_size, metric_kwargs)
+
+    # a few chunks per task balances the load without much scheduling overhead
+    chunks_per_task = max(n_chunks // (4 * workers), 1)
+    tables = _map(task, task.arrays(generator), _bounds(n_chunks, chunks_per_task), workers)
+    return pd.concat(tables, ignore_index=True)
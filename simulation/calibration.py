@@ -0,0 +1,241 @@
+"""
+Calibration of the leveraged ETF model to an actual ETF's prices, by minimizing the tracking error.
+
+The simulated daily return is
+    L * r - ER / (100 * trading_days) - (L - 1) * (f + spread / 100 * days) / day_count
+which is linear in L, ER and (L - 1) * spread, so fitting daily returns is an exact least squares solve.
+Fitting the NAV path (log price errors) is not linear; it starts from the return fit and uses the analytic
+gradient of the objective, with the starting NAV solved in closed form at every step.
+"""
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from .leveraged_etf import AVG_TRADING_DAYS_PER_YEAR, LeveragedETFSimulator
+from .rates import FinancingSource, financing_curve
+from .trading_calendar import TradingCalendar
+
+
+PARAMETERS = ['leverage', 'expense_ratio', 'financing_spread']
+
+
+class CalibrationData(NamedTuple):
+    """
+    Days on which the underlying and the actual ETF both have a return over the same period
+    dates: Date of each return
+    underlying: Underlying daily returns
+    actual: Actual ETF daily returns
+    financing: Financing rate times day delta, as decimal
+    day_delta: Calendar days of each return
+    first_price: Actual ETF price on the day before the first return
+    """
+    dates: pd.DatetimeIndex
+    underlying: np.ndarray
+    actual: np.ndarray
+    financing: np.ndarray
+    day_delta: np.ndarray
+    first_price: float
+
+
+class Calibration(NamedTuple):
+    """
+    leverage, expense_ratio (percent), financing_spread (percent over the financing curve) and starting_amount
+    (NAV on the day before the first return) fitted with the given trading_days and day_count;
+    stats: see `tracking_stats`
+    """
+    leverage: float
+    expense_ratio: float
+    financing_spread: float
+    starting_amount: float
+    trading_days: int
+    day_count: int
+    stats: pd.Series
+
+    def simulator(self) -> LeveragedETFSimulator:
+        """ Simulator with the fitted parameters; shift the financing curve by `financing_spread` to use it """
+        return LeveragedETFSimulator(leverage=self.leverage, expense_ratio=self.expense_ratio,
+                                     starting_amount=self.starting_amount, trading_days=self.trading_days,
+                                     day_count=self.day_count)
+
+
+def calibration_data(underlying: pd.Series, actual: pd.Series, financing: FinancingSource = 'LIBOR') -> CalibrationData:
+    """
+    Aligns the underlying and actual prices; a return is kept only if both series have it over the same days
+    (no missing day on either side) and the financing is known
+    """
+    underlying, actual = underlying.dropna(), actual.dropna()
+    aligned = TradingCalendar.align(underlying=underlying, actual=actual)
+    days = aligned.calendar.days
+    changes = aligned.pct_change()[:, 1:]
+
+    contiguous = np.ones(len(days) - 1, dtype=bool)
+    for series in (underlying, actual):
+        contiguous &= np.diff(TradingCalendar(series.index).positions(days)) == 1
+
+    f = financing_curve(financing).accrual_factors(days, day_count=1)[1:]
+    day_delta = np.diff(days).astype(np.float64)
+    keep = contiguous & ~np.isnan(changes).any(axis=0) & ~np.isnan(f)
+
+    return CalibrationData(dates=aligned.dates[1:][keep], underlying=changes[0][keep], actual=changes[1][keep],
+                           financing=f[keep], day_delta=day_delta[keep], first_price=aligned['actual'][0])
+
+
+def model_returns(data: CalibrationData, params: np.ndarray, trading_days: int = AVG_TRADING_DAYS_PER_YEAR,
+                  day_count: int = AVG_TRADING_DAYS_PER_YEAR) -> np.ndarray:
+    """
+    Simulated daily returns for one or many parameter sets at once
+    :param params: (leverage, expense ratio, financing spread), or an array of them shaped (sets, 3)
+    :return: Returns shaped (days,), or (sets, days)
+    """
+    params = np.asarray(params, dtype=np.float64)
+    sets = np.atleast_2d(params)
+    leverage, expense_ratio, spread = sets[:, 0:1], sets[:, 1:2], sets[:, 2:3]
+    financing = data.financing + spread / 100 * data.day_delta
+    returns = leverage * data.underlying - expense_ratio / (100 * trading_days) - (leverage - 1) * financing / day_count
+    return returns if params.ndim > 1 else returns[0]
+
+
+def tracking_errors(data: CalibrationData, params: np.ndarray, trading_days: int = AVG_TRADING_DAYS_PER_YEAR,
+                    day_count: int = AVG_TRADING_DAYS_PER_YEAR) -> np.ndarray:
+    """ Annualized tracking error (percent) of every parameter set of `params` (sets, 3), e.g. to map the surface """
+    residuals = data.actual - model_returns(data, np.atleast_2d(params), trading_days, day_count)
+    return residuals.std(axis=1, ddof=1) * np.sqrt(trading_days) * 100
+
+
+def _return_gradients(data: CalibrationData, params: np.ndarray, trading_days: int, day_count: int) -> np.ndarray:
+    """ Derivatives of the model returns by leverage, expense ratio and spread, shaped (3, days) """
+    leverage, _, spread = params
+    return np.stack([
+        data.underlying - (data.financing + spread / 100 * data.day_delta) / day_count,
+        np.full(len(data.dates), -1 / (100 * trading_days)),
+        -(leverage - 1) * data.day_delta / (100 * day_count),
+    ])
+
+
+def _fit_returns(data: CalibrationData, fixed: dict, trading_days: int, day_count: int) -> np.ndarray:
+    # actual - f / dc = L * (r - f / dc) - ER / (100 td) - (L - 1) * spread * days / (100 dc)
+    g = data.financing / day_count
+    target = data.actual - g
+    x_leverage = data.underlying - g
+    x_expense = np.full(len(g), -1 / (100 * trading_days))
+    x_spread = -data.day_delta / (100 * day_count)
+
+    leverage, expense_ratio, spread = (fixed.get(name) for name in PARAMETERS)
+    if spread is not None:
+        # (L - 1) * spread * x = L * spread * x - spread * x
+        target = target + spread * x_spread
+        x_leverage = x_leverage + spread * x_spread
+    columns = {}
+    if leverage is None:
+        columns['leverage'] = x_leverage
+    else:
+        target = target - leverage * x_leverage
+    if expense_ratio is None:
+        columns['expense_ratio'] = x_expense
+    else:
+        target = target - expense_ratio * x_expense
+    if spread is None:
+        # with a free leverage the coefficient is (L - 1) * spread
+        columns['financing_spread'] = x_spread if leverage is None else (leverage - 1) * x_spread
+
+    fitted = {}
+    if columns:
+        design = np.stack(list(columns.values()), axis=1)
+        scale = np.linalg.norm(design, axis=0)  # the columns differ by orders of magnitude
+        coefficients, *_ = np.linalg.lstsq(design / scale, target, rcond=None)
+        fitted = dict(zip(columns, coefficients / scale))
+    leverage = fitted.get('leverage', leverage)
+    expense_ratio = fitted.get('expense_ratio', expense_ratio)
+    if spread is None:
+        spread = fitted['financing_spread']
+        if 'leverage' in fitted:
+            spread = spread / (leverage - 1) if not np.isclose(leverage, 1) else 0.0
+    return np.array([leverage, expense_ratio, spread])
+
+
+def _fit_nav(data: CalibrationData, start: np.ndarray, fixed: dict, trading_days: int, day_count: int) -> np.ndarray:
+    from scipy.optimize import minimize
+
+    actual_log_nav = np.cumsum(np.log1p(data.actual))
+
+    def objective(params):
+        returns = model_returns(data, params, trading_days, day_count)
+        errors = actual_log_nav - np.cumsum(np.log1p(returns))
+        errors -= errors.mean()  # best starting NAV, in closed form
+        d_log_nav = np.cumsum(_return_gradients(data, params, trading_days, day_count) / (1 + returns), axis=1)
+        # the starting NAV is optimal for any parameters, so it drops out of the gradient
+        return np.mean(errors ** 2), -2 * d_log_nav @ errors / len(errors)
+
+    # fixed parameters are pinned by their bounds
+    bounds = [(fixed[name], fixed[name]) if fixed.get(name) is not None else (None, None) for name in PARAMETERS]
+    return minimize(objective, start, jac=True, method='L-BFGS-B', bounds=bounds).x
+
+
+def tracking_stats(actual: np.ndarray, simulated: np.ndarray, trading_days: int = AVG_TRADING_DAYS_PER_YEAR,
+                   actual_nav: Optional[np.ndarray] = None, simulated_nav: Optional[np.ndarray] = None) -> pd.Series:
+    """
+    Fit of simulated to actual daily returns: annualized `tracking_error` (percent), `correlation`, `beta`,
+    mean / std / skew / excess kurtosis / lag-1 autocorrelation / largest absolute value of the daily residuals
+    (percent), and `final_nav_error` (percent) if NAV paths are given
+    """
+    residual = actual - simulated
+    centered = residual - residual.mean()
+    std = residual.std(ddof=1)
+    stats = {
+        'days': len(residual),
+        'tracking_error': std * np.sqrt(trading_days) * 100,
+        'correlation': np.corrcoef(actual, simulated)[0, 1],
+        'beta': np.cov(actual, simulated)[0, 1] / simulated.var(ddof=1),
+        'residual_mean': residual.mean() * 100,
+        'residual_std': std * 100,
+        'residual_skew': np.mean(centered ** 3) / std ** 3,
+        'residual_kurtosis': np.mean(centered ** 4) / std ** 4 - 3,
+        'residual_autocorrelation': np.corrcoef(residual[1:], residual[:-1])[0, 1],
+        'residual_max_abs': np.abs(residual).max() * 100,
+    }
+    if actual_nav is not None and simulated_nav is not None:
+        stats['final_nav_error'] = (simulated_nav[-1] / actual_nav[-1] - 1) * 100
+    return pd.Series(stats)
+
+
+def calibrate(underlying: pd.Series, actual: pd.Series, financing: FinancingSource = 'LIBOR',
+              objective: str = 'returns', leverage: Optional[float] = None, expense_ratio: Optional[float] = None,
+              financing_spread: Optional[float] = None, trading_days: int = AVG_TRADING_DAYS_PER_YEAR,
+              day_count: int = AVG_TRADING_DAYS_PER_YEAR) -> Calibration:
+    """
+    Fits leverage, expense ratio, financing spread and starting NAV of the model to an actual ETF
+    over the whole overlap of the two price series
+    :param underlying: Prices of the underlying index
+    :param actual: Prices of the actual ETF
+    :param financing: Financing source (see `rates.financing_curve`)
+    :param objective: 'returns' minimizes the daily tracking error (closed form);
+                      'nav' minimizes the squared log error of the NAV path
+    :param leverage: Fixed leverage, or None to fit it
+    :param expense_ratio: Fixed expense ratio (percent), or None to fit it. The expense ratio and the spread are
+                          both nearly constant drags and only told apart by weekends, so fixing one of them
+                          (e.g. the prospectus expense ratio) gives much more stable fits
+    :param financing_spread: Fixed spread over the financing curve (percent), or None to fit it
+    :param trading_days: Trading days per year of the expense ratio
+    :param day_count: Divisor of the financing (e.g. 252 or 360); compare the tracking error of both to choose
+    :return: Calibration
+    """
+    data = calibration_data(underlying, actual, financing)
+    fixed = {'leverage': leverage, 'expense_ratio': expense_ratio, 'financing_spread': financing_spread}
+    params = _fit_returns(data, fixed, trading_days, day_count)
+    if objective == 'nav':
+        params = _fit_nav(data, params, fixed, trading_days, day_count)
+    elif objective != 'returns':
+        raise ValueError(f"Unknown objective {objective!r}, expected 'returns' or 'nav'")
+
+    simulated = model_returns(data, params, trading_days, day_count)
+    actual_nav = data.first_price * np.cumprod(1 + data.actual)
+    growth = np.cumprod(1 + simulated)
+    # NAV before the first return that minimizes the squared log error of the path
+    starting_amount = np.exp(np.mean(np.log(actual_nav / growth)))
+
+    leverage, expense_ratio, spread = params
+    return Calibration(leverage=leverage, expense_ratio=expense_ratio, financing_spread=spread,
+                       starting_amount=starting_amount, trading_days=trading_days, day_count=day_count,
+                       stats=tracking_stats(data.actual, simulated, trading_days, actual_nav,
+                                            starting_amount * growth))
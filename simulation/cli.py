@@ -0,0 +1,252 @@
+"""
+Command-line entry point, `python -m simulation`:
+
+    python -m simulation run examples/tqqq_tmf.yaml --workers 8 --output reports/cli
+    python -m simulation datasets --verify
+
+A scenario file (YAML or TOML) lists the scenarios to run and what to output:
+
+    defaults:                       # applied to every scenario
+      financing: LIBOR
+    scenarios:
+      - name: TQQQ
+        underlying: NASDAQ_COMPOSITE    # bundled dataset, or a ticker fetched through the price cache
+        leverage: [2, 3]                # every parameter may be a single value or a list to sweep
+        expense_ratio: 0.95
+        financing_spread: [0, 0.5]
+        start: 1994-03-01
+        end: 2021-09-01
+        start_dates: [1999-03-10, 2010-02-11]
+    outputs:
+      performance: true             # full analytics table per path (keeps the paths, for small grids)
+      windows: 5                    # rolling-window distribution for this holding period in years
+      charts: png                   # growth / drawdown charts: png, svg, pdf or html
+
+Only the standard library is imported at module level, so `--help` starts instantly;
+numpy, pandas and the rest load when a command actually runs.
+"""
+import argparse
+import os
+from typing import List, Optional
+
+
+SCENARIO_KEYS = ['name', 'underlying', 'source', 'column', 'leverage', 'expense_ratio', 'financing',
+                 'financing_spread', 'start', 'end', 'start_dates', 'trading_days', 'day_count']
+
+
+def load_config(path: str) -> dict:
+    """ Reads a YAML or TOML scenario file, by extension """
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+
+    import yaml
+
+    with open(path) as f:
+        return yaml.safe_load(f)
+
+
+def _as_list(value) -> list:
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def scenario_specs(config: dict) -> List[dict]:
+    """ Scenarios of a config with the defaults applied """
+    defaults = config.get('defaults', {})
+    specs = []
+    for i, scenario in enumerate(config.get('scenarios', [])):
+        spec = {**defaults, **scenario}
+        unknown = set(spec) - set(SCENARIO_KEYS)
+        if unknown:
+            raise ValueError(f'Unknown keys {sorted(unknown)} in scenario {i}, expected some of {SCENARIO_KEYS}')
+        if 'underlying' not in spec:
+            raise ValueError(f'Scenario {i} has no underlying')
+        spec.setdefault('name', spec['underlying'])
+        specs.append(spec)
+    return specs
+
+
+def load_prices(spec: dict, offline: bool = False):
+    """ Underlying prices of a scenario: a bundled dataset, or a ticker through the price cache """
+    import pandas as pd
+
+    from .datasets import DATASETS, load as load_dataset
+
+    start = pd.Timestamp(spec['start']) if spec.get('start') else None
+    end = pd.Timestamp(spec['end']) if spec.get('end') else None
+    source = spec.get('source', 'dataset' if spec['underlying'] in DATASETS else 'yahoo')
+
+    if source == 'dataset':
+        frame = load_dataset(spec['underlying'])
+        prices = frame[spec['column']] if spec.get('column') else frame.iloc[:, 0]
+        return prices.loc[start:end].dropna()
+
+    from .price_cache import PriceCache
+
+    return PriceCache(offline=offline).get_column(spec['underlying'], start or pd.Timestamp('1970-01-01'),
+                                                  end or pd.Timestamp.today(), column=spec.get('column', 'Adj Close'),
+                                                  source=source)
+
+
+def align(prices, financing):
+    """
+    `LeveragedETFSimulator.align` for one financing source, or for a list of them on the days they all cover
+    :return: (dates, underlying returns, financing vector or mapping of source label to vector)
+    """
+    from .leveraged_etf import LeveragedETFSimulator
+
+    if not isinstance(financing, (list, tuple)):
+        return LeveragedETFSimulator.align(prices, financing)
+
+    aligned = {str(source): LeveragedETFSimulator.align(prices, source) for source in financing}
+    dates = None
+    for index, _, _ in aligned.values():
+        dates = index if dates is None else dates.intersection(index)
+    first_index, first_returns, _ = next(iter(aligned.values()))
+    underlying_returns = first_returns[first_index.get_indexer(dates)]
+    return dates, underlying_returns, {label: f[index.get_indexer(dates)] for label, (index, _, f) in aligned.items()}
+
+
+def run_scenario(spec: dict, outputs: dict, workers: Optional[int] = None, offline: bool = False) -> dict:
+    """
+    Runs one scenario through the batch engine, or through `sweep.sweep` keeping the paths when the performance,
+    windows or charts outputs need them
+    :return: Tables by output name ('metrics', and 'performance' / 'windows' if asked), plus the chart specs
+    """
+    import pandas as pd
+
+    from .batch import batch_sweep
+    from .leveraged_etf import AVG_TRADING_DAYS_PER_YEAR
+
+    prices = load_prices(spec, offline)
+    dates, underlying_returns, financing = align(prices, spec.get('financing', 'LIBOR'))
+    grid = dict(leverage=_as_list(spec.get('leverage', 1.0)), expense_ratio=_as_list(spec.get('expense_ratio', 0.0)),
+                financing_spread=_as_list(spec.get('financing_spread', 0.0)),
+                start_dates=_as_list(spec.get('start_dates')),
+                trading_days=spec.get('trading_days', AVG_TRADING_DAYS_PER_YEAR),
+                day_count=spec.get('day_count', AVG_TRADING_DAYS_PER_YEAR))
+
+    if not (outputs.get('performance') or outputs.get('windows') or outputs.get('charts')):
+        metrics = batch_sweep(dates, underlying_returns, financing, workers=workers, **grid)
+        metrics.insert(0, 'scenario', spec['name'])
+        return {'metrics': metrics, 'charts': []}
+
+    # the other outputs need the paths themselves: the grid is simulated once, keeping them
+    from .analytics import performance
+    from .sweep import sweep
+
+    paths = sweep(dates, underlying_returns, financing, keep_paths=True, **grid)
+    metrics = paths.scenarios.copy()
+    metrics.insert(0, 'scenario', spec['name'])
+    results = {'metrics': metrics, 'charts': []}
+
+    labels = [f"{spec['name']} {row.leverage:g}x ER {row.expense_ratio:g} "
+              f"{getattr(row, 'financing', '')}+{row.financing_spread:g} from {row.start_date:%Y-%m-%d}"
+              for row in paths.scenarios.itertuples()]
+    navs = [pd.Series(path, index=paths.dates, name=label).dropna() for label, path in zip(labels, paths.paths)]
+
+    if outputs.get('performance'):
+        table = performance(paths.paths, paths.dates, periods_per_year=grid['trading_days'])
+        results['performance'] = pd.concat([metrics.drop(columns=['cagr', 'max_drawdown']), table], axis=1)
+
+    if outputs.get('windows'):
+        from .windows import rolling_windows
+
+        horizon = outputs['windows']
+        results['windows'] = pd.DataFrame({
+            f'{nav.name} {stat}': rolling_windows(nav, horizon=horizon)[stat].describe()
+            for nav in navs for stat in ('cagr', 'max_drawdown')
+        }).T
+
+    if outputs.get('charts'):
+        from .report import scenario_charts
+
+        results['charts'] = [chart for nav in navs for chart in scenario_charts(nav.name, nav)]
+
+    return results
+
+
+def run(config_path: str, output_dir: Optional[str] = None, workers: Optional[int] = None, offline: bool = False,
+        table_format: str = 'csv') -> dict:
+    """
+    Runs every scenario of a scenario file, prints the tables and writes them to `output_dir` if given
+    :return: Tables by output name, with the rows of all scenarios
+    """
+    import pandas as pd
+
+    config = load_config(config_path)
+    outputs = config.get('outputs', {})
+    output_dir = output_dir or outputs.get('dir')
+
+    results = [run_scenario(spec, outputs, workers=workers, offline=offline) for spec in scenario_specs(config)]
+    tables = {name: pd.concat([r[name] for r in results]) for name in ('metrics', 'performance', 'windows')
+              if results and name in results[0]}
+
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        for name, table in tables.items():
+            print(f'== {name} ==')
+            print(table.to_string(index=name == 'windows'))
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        for name, table in tables.items():
+            path = os.path.join(output_dir, f'{name}.{table_format}')
+            if table_format == 'json':
+                table.to_json(path, orient='records' if name != 'windows' else 'index', date_format='iso')
+            else:
+                table.to_csv(path, index=name == 'windows')
+
+    charts = [chart for r in results for chart in r['charts']]
+    if charts:
+        from .report import DEFAULT_REPORT_DIR, render_charts
+
+        fmt = outputs['charts'] if isinstance(outputs['charts'], str) else 'png'
+        render_charts(charts, out_dir=os.path.join(output_dir or DEFAULT_REPORT_DIR, 'charts'), fmt=fmt,
+                      workers=workers or 1)
+
+    return tables
+
+
+def datasets(verify: bool = False) -> int:
+    """ Rebuilds the columnar copies of the bundled datasets, or checks their checksums """
+    from . import datasets as bundled
+
+    if verify:
+        results = bundled.verify()
+        for name, bad in results.items():
+            print(f'{name}: {"OK" if not bad else "MISMATCH " + ", ".join(bad)}')
+        return 1 if any(results.values()) else 0
+
+    for name, entry in bundled.build().items():
+        print(f'{name}: {entry["rows"]} rows, {entry["first"]} to {entry["last"]} ({entry["source"]})')
+    return 0
+
+
+def parser() -> argparse.ArgumentParser:
+    root = argparse.ArgumentParser(prog='python -m simulation', description='Leveraged ETF simulations')
+    commands = root.add_subparsers(dest='command', required=True)
+
+    run_cmd = commands.add_parser('run', help='Run the scenarios of a YAML / TOML scenario file')
+    run_cmd.add_argument('config', help='Scenario file (.yaml, .yml or .toml)')
+    run_cmd.add_argument('-o', '--output', help='Directory for the tables and charts (default: outputs.dir)')
+    run_cmd.add_argument('-w', '--workers', type=int, default=None,
+                         help='Processes for the batch engine (default: one per core)')
+    run_cmd.add_argument('--offline', action='store_true', help='Only use cached prices, never download')
+    run_cmd.add_argument('--format', choices=['csv', 'json'], default='csv', help='Format of the written tables')
+
+    datasets_cmd = commands.add_parser('datasets', help='Rebuild the columnar copies of the bundled datasets')
+    datasets_cmd.add_argument('--verify', action='store_true', help='Check the recorded checksums instead')
+    return root
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parser().parse_args(argv)
+    if args.command == 'run':
+        run(args.config, output_dir=args.output, workers=args.workers, offline=args.offline, table_format=args.format)
+        return 0
+    return datasets(verify=args.verify)
@@ -0,0 +1,94 @@
+"""
+Columnar on-disk tables: one directory per table, one `.npy` file per column.
+
+Dates are stored as int64 offsets from the epoch (days by default) and values as float64,
+so every column can be memory-mapped and read back without any parsing.
+`meta.json` holds the column names and any extra metadata of the table.
+"""
+import json
+import os
+from typing import Optional
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+
+META_FILE = 'meta.json'
+DATE_FILE = 'date.npy'
+
+
+def _column_file(name: str) -> str:
+    return quote(str(name), safe='') + '.npy'
+
+
+def _save_atomic(path: str, array: np.ndarray):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def to_epoch(index: pd.DatetimeIndex, unit: str = 'D') -> np.ndarray:
+    """ Dates as int64 offsets from 1970-01-01 in `unit` """
+    return pd.DatetimeIndex(index).values.astype(f'datetime64[{unit}]').astype(np.int64)
+
+
+def from_epoch(values: np.ndarray, unit: str = 'D') -> pd.DatetimeIndex:
+    """ Inverse of `to_epoch` """
+    return pd.DatetimeIndex(np.asarray(values).astype(f'datetime64[{unit}]').astype('datetime64[ns]'))
+
+
+def write_table(path: str, frame: pd.DataFrame, unit: str = 'D', meta: Optional[dict] = None) -> dict:
+    """
+    Writes a DataFrame with a DatetimeIndex as a columnar table
+    :param path: Table directory, created if missing
+    :param frame: Data to store, every column is converted to float64
+    :param unit: Resolution of the stored dates ('D' for daily data, 's' for intraday)
+    :param meta: Extra metadata stored in `meta.json`
+    :return: The metadata written
+    """
+    os.makedirs(path, exist_ok=True)
+
+    _save_atomic(os.path.join(path, DATE_FILE), to_epoch(frame.index, unit))
+    for column in frame.columns:
+        _save_atomic(os.path.join(path, _column_file(column)), frame[column].to_numpy(dtype=np.float64))
+
+    table_meta = dict(meta or {})
+    table_meta.update({'columns': [str(c) for c in frame.columns], 'index_name': frame.index.name,
+                       'unit': unit, 'rows': len(frame)})
+
+    # meta.json goes last: a table is only complete once it is there
+    tmp_path = os.path.join(path, META_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(table_meta, f, indent=2, default=str)
+    os.replace(tmp_path, os.path.join(path, META_FILE))
+
+    return table_meta
+
+
+def read_meta(path: str) -> Optional[dict]:
+    """ Metadata of the table at `path`, or None if there is no complete table """
+    try:
+        with open(os.path.join(path, META_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def read_table(path: str, mmap: bool = True) -> pd.DataFrame:
+    """
+    Reads a table written by `write_table`
+    :param path: Table directory
+    :param mmap: Memory-map the columns instead of reading them into memory
+    :return: DataFrame indexed by date
+    """
+    meta = read_meta(path)
+    if meta is None:
+        raise FileNotFoundError(f'No columnar table at {path}')
+
+    mmap_mode = 'r' if mmap else None
+    index = from_epoch(np.load(os.path.join(path, DATE_FILE), mmap_mode=mmap_mode), meta['unit'])
+    index.name = meta.get('index_name')
+    data = {c: np.load(os.path.join(path, _column_file(c)), mmap_mode=mmap_mode) for c in meta['columns']}
+    return pd.DataFrame(data, index=index, columns=meta['columns'], copy=False)
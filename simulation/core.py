@@ -0,0 +1,90 @@
+"""
+NumPy-only math core: compounding, the leveraged ETF return model and the blocked sweep kernel.
+Nothing here imports pandas, so batch workers and short-lived jobs that only run the numbers start fast;
+the pandas front-ends (`utils`, `leveraged_etf`, `sweep`) re-export these.
+"""
+from typing import Tuple
+
+import numpy as np
+
+
+AVG_TRADING_DAYS_PER_YEAR = 252
+
+DAYS_PER_YEAR = 365.25
+
+
+def compound(returns, starting_amount: float = 1.0, log_space: bool = False) -> np.ndarray:
+    """
+    Compounds periodic returns (decimal, e.g. 0.01 for 1%) into a value path.
+    The first return is not applied: the path starts at `starting_amount` on the first date,
+    matching the convention of `compound_return`.
+    :param returns: 1-D array of returns, or 2-D array with one path per row (days on the last axis)
+    :param starting_amount: Value on the first date
+    :param log_space: Sum log-growth instead of multiplying, which avoids under/overflow on very long horizons
+    :return: ndarray with the same shape as `returns`
+    """
+    growth = np.array(returns, dtype=np.float64)
+    if growth.shape[-1] == 0:
+        return growth
+
+    growth[..., 0] = 0.0
+    if log_space:
+        # log1p(-1) is -inf, which exp() maps back to a total loss
+        with np.errstate(divide='ignore'):
+            return starting_amount * np.exp(np.cumsum(np.log1p(growth), axis=-1))
+
+    growth += 1.0
+    return starting_amount * np.cumprod(growth, axis=-1)
+
+
+def leveraged_returns(underlying_returns, financing, leverage=1.0, expense_ratio=0.2,
+                      trading_days=AVG_TRADING_DAYS_PER_YEAR, day_count=AVG_TRADING_DAYS_PER_YEAR,
+                      trading_cost=0.0) -> np.ndarray:
+    """
+    Daily returns of a leveraged ETF from aligned underlying returns and financing (both decimal).
+    `leverage`, `expense_ratio` and `trading_cost` (percentage) may be arrays shaped to broadcast against the returns,
+    e.g. a column vector to get one row per scenario.
+
+    `trading_cost` is the fee plus slippage paid on the fund's daily rebalancing trades, in percent of the traded
+    value: resetting the exposure to `leverage` after an underlying move r trades about leverage * (leverage - 1) * |r|
+    of the NAV.
+    """
+    etf_expense = np.divide(expense_ratio, 100 * trading_days)
+    leverage_expense = np.multiply(np.subtract(leverage, 1), financing) / day_count
+    rebalance_turnover = np.abs(np.multiply(np.multiply(leverage, np.subtract(leverage, 1)), underlying_returns))
+    trading_expense = np.multiply(np.divide(trading_cost, 100), rebalance_turnover)
+
+    return np.multiply(underlying_returns, leverage) - etf_expense - leverage_expense - trading_expense
+
+
+def sweep_rows(underlying_returns: np.ndarray, financing: np.ndarray, day_delta: np.ndarray, rows: np.ndarray,
+               starting_amount: float = 1.0, trading_days: int = AVG_TRADING_DAYS_PER_YEAR,
+               day_count: int = AVG_TRADING_DAYS_PER_YEAR) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Simulates one block of scenarios
+    :param financing: Financing vectors, one row per financing label
+    :param rows: One row per scenario: leverage, expense ratio, financing spread, financing row, start position
+                 and years from the start to the last date (see `sweep`)
+    :return: (NAV paths with NaN before each start, cagr, max_drawdown)
+    """
+    lev, er, spread = rows[:, 0:1], rows[:, 1:2], rows[:, 2:3]
+    financing_idx, start_idx, elapsed_years = rows[:, 3].astype(np.intp), rows[:, 4].astype(np.intp), rows[:, 5]
+    days = np.arange(len(day_delta))
+
+    chunk_financing = financing[financing_idx] + spread / 100 * day_delta
+    growth = leveraged_returns(underlying_returns, chunk_financing, leverage=lev, expense_ratio=er,
+                               trading_days=trading_days, day_count=day_count)
+
+    # nothing accrues up to and including the start date, so the NAV sits at starting_amount until then
+    before_start = days <= start_idx[:, None]
+    growth[before_start] = 0.0
+    growth += 1.0
+    nav = np.cumprod(growth, axis=1, out=growth)
+    nav *= starting_amount
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        max_drawdown = ((nav / np.maximum.accumulate(nav, axis=1)).min(axis=1) - 1) * 100
+        cagr = ((nav[:, -1] / starting_amount) ** (1 / elapsed_years) - 1) * 100
+
+    nav[days < start_idx[:, None]] = np.nan
+    return nav, cagr, max_drawdown
@@ -0,0 +1,215 @@
+"""
+Bundled `dataset/` series, converted once into memory-mappable columnar tables (see `columnar`).
+
+The original CSV / JSON files stay the source of truth: `build` converts them into `dataset/columnar/`
+and records, per series, the date range, row count and SHA-256 checksums of the source and of every
+column file in `manifest.json`. `load` then memory-maps the columns without parsing anything, and
+rebuilds a series on the fly if its source file changed since it was converted.
+
+    python -m simulation.datasets          # (re)build every series
+    python -m simulation.datasets --verify # check the checksums
+"""
+import hashlib
+import json
+import os
+import sys
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import DATASET_DIR
+from .columnar import read_table, write_table
+
+
+COLUMNAR_DIR = 'columnar'
+MANIFEST_FILE = 'manifest.json'
+
+
+def read_fred(path: str) -> pd.DataFrame:
+    """ FRED export: `DATE,<SERIES_ID>` with `.` for missing values """
+    df = pd.read_csv(path, index_col='DATE', na_values='.')
+    df.index = pd.to_datetime(df.index, format='%Y-%m-%d')
+    return df.astype(np.float64)
+
+
+def read_morningstar_json(path: str) -> pd.DataFrame:
+    """ Morningstar index quote JSON: `data.r[0].t[0].d` holds `{i: date, v: value}` records """
+    with open(path) as f:
+        records = json.load(f)['data']['r'][0]['t'][0]['d']
+
+    index = pd.to_datetime([r['i'] for r in records], format='%Y-%m-%d')
+    values = np.array([r['v'] for r in records], dtype=np.float64)
+    return pd.DataFrame({'Close': values}, index=pd.DatetimeIndex(index, name='Date'))
+
+
+INVESTING_COLUMNS = {'Price': 'Close', 'Vol.': 'Volume'}
+VOLUME_SUFFIXES = {'K': 1e3, 'M': 1e6, 'B': 1e9}
+MONTHS = {m: i for i, m in enumerate(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                                      'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])}
+
+
+def _parse_investing_dates(values: pd.Series) -> pd.DatetimeIndex:
+    """ Vectorized parsing of the fixed-width `%b %d, %Y` dates (e.g. `Sep 16, 2021`) without strptime """
+    chars = np.asarray(values.to_numpy(dtype='S12')).view(np.uint8).reshape(-1, 12).astype(np.int64) - ord('0')
+    if len(chars) and not ((chars[:, [4, 5, 8, 9, 10, 11]] >= 0) & (chars[:, [4, 5, 8, 9, 10, 11]] <= 9)).all():
+        raise ValueError('Dates are not in the "%b %d, %Y" format')
+
+    months = values.str[:3].map(MONTHS)
+    if months.isna().any():
+        raise ValueError(f'Unknown month in {values[months.isna()].iloc[0]!r}')
+
+    years = chars[:, 8] * 1000 + chars[:, 9] * 100 + chars[:, 10] * 10 + chars[:, 11]
+    days = chars[:, 4] * 10 + chars[:, 5]
+    month_starts = ((years - 1970) * 12 + months.to_numpy(dtype=np.int64)).astype('datetime64[M]')
+    return pd.DatetimeIndex(month_starts.astype('datetime64[D]') + (days - 1), name='Date')
+
+
+def _decode_suffixed(values: pd.Series) -> np.ndarray:
+    """ Vectorized decoding of investing.com volumes such as `963.64K` or `1.10M` (`-` means missing) """
+    values = values.fillna('').str.strip()
+    multiplier = values.str[-1:].map(VOLUME_SUFFIXES)
+    digits = values.where(multiplier.isna(), values.str[:-1])
+    return pd.to_numeric(digits, errors='coerce').to_numpy() * multiplier.fillna(1.0).to_numpy()
+
+
+def read_investing(path: str) -> pd.DataFrame:
+    """
+    investing.com historical data export: BOM, quoted fields, newest row first,
+    `"Sep 16, 2021"` dates, `1.10M` volumes and `-1.30%` changes
+    :return: Ascending DataFrame with float64 `Close`, `Open`, `High`, `Low`, `Volume` and `Change %` (in percent)
+    """
+    df = pd.read_csv(path, encoding='utf-8-sig', thousands=',', dtype={'Date': str, 'Vol.': str, 'Change %': str})
+
+    index = _parse_investing_dates(df.pop('Date'))
+    df['Vol.'] = _decode_suffixed(df['Vol.'])
+    df['Change %'] = pd.to_numeric(df['Change %'].str.replace(',', '').str.rstrip('%'), errors='coerce')
+    df = df.rename(columns=INVESTING_COLUMNS).astype(np.float64)
+    df.index = index
+
+    return df.iloc[::-1] if index.is_monotonic_decreasing else df.sort_index(kind='mergesort')
+
+
+# series name -> (source file in dataset/, reader)
+DATASETS: Dict[str, tuple] = {
+    'NASDAQ_COMPOSITE': ('NASDAQ_COMPOSITE.csv', read_fred),
+    'USD1MTD156N': ('USD1MTD156N.csv', read_fred),
+    'XIUSA000ML': ('XIUSA000ML.json', read_morningstar_json),
+    'TMF': ('TMF.csv', read_investing),
+    'TQQQ': ('TQQQ.csv', read_investing),
+}
+
+
+def sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_manifest(out_dir: str) -> dict:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_manifest(out_dir: str, manifest: dict):
+    tmp_path = os.path.join(out_dir, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(out_dir, MANIFEST_FILE))
+
+
+def _source_stamp(path: str) -> dict:
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _convert(name: str, dataset_dir: str, out_dir: str) -> dict:
+    source, reader = DATASETS[name]
+    source_path = os.path.join(dataset_dir, source)
+    frame = reader(source_path)
+
+    table_dir = os.path.join(out_dir, name)
+    meta = write_table(table_dir, frame, meta={'name': name, 'source': source})
+    files = sorted(f for f in os.listdir(table_dir) if f.endswith('.npy'))
+
+    return {
+        'source': source,
+        'source_sha256': sha256(source_path),
+        'source_stamp': _source_stamp(source_path),
+        'columns': meta['columns'],
+        'rows': meta['rows'],
+        'first': str(frame.index[0].date()) if len(frame) else None,
+        'last': str(frame.index[-1].date()) if len(frame) else None,
+        'files': {f: sha256(os.path.join(table_dir, f)) for f in files},
+    }
+
+
+def build(names: Optional[Iterable[str]] = None, dataset_dir: str = DATASET_DIR,
+          out_dir: Optional[str] = None) -> dict:
+    """
+    Converts the bundled series into columnar tables and updates the manifest
+    :param names: Series to convert, default all of `DATASETS`
+    :param dataset_dir: Directory of the source files
+    :param out_dir: Output directory, default `<dataset_dir>/columnar`
+    :return: The manifest
+    """
+    out_dir = out_dir or os.path.join(dataset_dir, COLUMNAR_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = _read_manifest(out_dir)
+    for name in (names or DATASETS):
+        manifest[name] = _convert(name, dataset_dir, out_dir)
+    _write_manifest(out_dir, manifest)
+
+    return manifest
+
+
+def load(name: str, dataset_dir: str = DATASET_DIR, out_dir: Optional[str] = None, mmap: bool = True) -> pd.DataFrame:
+    """
+    Loads a bundled series from its columnar table, converting it first if it is missing or its source changed
+    :param name: Series name, a key of `DATASETS`
+    :param mmap: Memory-map the columns (read-only) instead of reading them into memory
+    :return: DataFrame indexed by date
+    """
+    if name not in DATASETS:
+        raise KeyError(f'Unknown dataset {name!r}, expected one of {sorted(DATASETS)}')
+
+    out_dir = out_dir or os.path.join(dataset_dir, COLUMNAR_DIR)
+    entry = _read_manifest(out_dir).get(name)
+    source_path = os.path.join(dataset_dir, DATASETS[name][0])
+    if entry is None or entry['source_stamp'] != _source_stamp(source_path):
+        build([name], dataset_dir=dataset_dir, out_dir=out_dir)
+
+    return read_table(os.path.join(out_dir, name), mmap=mmap)
+
+
+def verify(dataset_dir: str = DATASET_DIR, out_dir: Optional[str] = None) -> Dict[str, list]:
+    """
+    Checks the source and column checksums recorded in the manifest
+    :return: Mismatching files per series (empty lists when everything matches)
+    """
+    out_dir = out_dir or os.path.join(dataset_dir, COLUMNAR_DIR)
+    problems = {}
+    for name, entry in _read_manifest(out_dir).items():
+        bad = []
+        if sha256(os.path.join(dataset_dir, entry['source'])) != entry['source_sha256']:
+            bad.append(entry['source'])
+        for f, digest in entry['files'].items():
+            path = os.path.join(out_dir, name, f)
+            if not os.path.exists(path) or sha256(path) != digest:
+                bad.append(f)
+        problems[name] = bad
+
+    return problems
+
+
+if __name__ == '__main__':
+    # same as `python -m simulation datasets [--verify]`
+    from .cli import datasets as main
+
+    sys.exit(main(verify='--verify' in sys.argv[1:]))
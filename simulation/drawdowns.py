@@ -0,0 +1,109 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+class DrawdownIndex:
+    """
+    Every peak -> trough -> recovery episode of one or many value paths, found in a single linear scan.
+    An episode starts on the last high before the value drops below it and ends on the first day it is back
+    at or above that high (the recovery), or is still open at the end of the data.
+
+    Queries such as the top N or all episodes longer than a year work on the stored table without rescanning.
+
+    :param paths: NAV or prices, shaped (paths, days), or a single 1-D path / Series
+    :param dates: Dates of the day axis (default the Series index)
+    """
+
+    def __init__(self, paths, dates=None):
+        if isinstance(paths, pd.Series):
+            dates = paths.index if dates is None else dates
+        if dates is None:
+            raise ValueError('DrawdownIndex needs the dates of the paths')
+        self.dates = pd.DatetimeIndex(dates)
+
+        paths = np.atleast_2d(np.asarray(paths, dtype=np.float64))
+        self.episodes = self._scan(paths, self.dates)
+        # depth order is computed once, so top-N queries are a slice
+        self._by_depth = np.argsort(self.episodes['depth'].to_numpy(), kind='mergesort')
+
+    @staticmethod
+    def _scan(paths: np.ndarray, dates: pd.DatetimeIndex) -> pd.DataFrame:
+        n_paths, n_days = paths.shape
+        peak = np.fmax.accumulate(paths, axis=1)
+        with np.errstate(invalid='ignore'):
+            drawdown = (paths / peak - 1) * 100
+            below = paths < peak
+
+        # pad every row with a day at its high, so episodes never run from one path into the next
+        padded = np.zeros((n_paths, n_days + 1), dtype=bool)
+        padded[:, :-1] = below
+        flat_below = padded.ravel()
+        edges = np.diff(flat_below.astype(np.int8), prepend=np.int8(0))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)  # first day back at the high (or the padding)
+
+        flat_drawdown = np.zeros(n_paths * (n_days + 1))
+        flat_drawdown.reshape(n_paths, n_days + 1)[:, :-1] = np.where(below, drawdown, 0.0)
+
+        # depth and first trough position of each episode
+        depth = np.minimum.reduceat(flat_drawdown, starts) if len(starts) else np.empty(0)
+        if len(starts):
+            # reduceat runs to the next start, which is past the episode end; the days in between are at 0
+            episode_id = np.cumsum(edges == 1) - 1
+            at_trough = flat_below & (flat_drawdown == depth[np.maximum(episode_id, 0)])
+            _, first_trough = np.unique(episode_id[at_trough], return_index=True)
+            troughs = np.flatnonzero(at_trough)[first_trough]
+        else:
+            troughs = np.empty(0, dtype=np.int64)
+
+        path = starts // (n_days + 1)
+        start_day, trough_day, end_day = starts % (n_days + 1), troughs % (n_days + 1), ends % (n_days + 1)
+        recovered = end_day < n_days
+
+        day_values = dates.values
+        peak_date = day_values[start_day - 1]
+        trough_date = day_values[trough_day]
+        last_date = day_values[np.minimum(end_day, n_days - 1)]
+        recovery_date = np.where(recovered, last_date, np.datetime64('NaT'))
+
+        return pd.DataFrame({
+            'path': path,
+            'peak_date': pd.DatetimeIndex(peak_date),
+            'trough_date': pd.DatetimeIndex(trough_date),
+            'recovery_date': pd.DatetimeIndex(recovery_date),
+            'depth': depth,
+            # peak to recovery, or to the last date while the episode is still open
+            'duration': pd.TimedeltaIndex(last_date - peak_date),
+            'time_to_trough': pd.TimedeltaIndex(trough_date - peak_date),
+            'time_to_recover': pd.TimedeltaIndex(recovery_date - trough_date),
+            'recovered': recovered,
+        })
+
+    def __len__(self) -> int:
+        return len(self.episodes)
+
+    def top(self, n: int = 10, path: Optional[int] = None) -> pd.DataFrame:
+        """ The `n` deepest episodes, over all paths or of one path """
+        ordered = self.episodes.iloc[self._by_depth]
+        if path is not None:
+            ordered = ordered[ordered['path'].to_numpy() == path]
+        return ordered.head(n)
+
+    def longer_than(self, duration='365D', path: Optional[int] = None) -> pd.DataFrame:
+        """ Episodes lasting longer than `duration` (peak to recovery, or still open), deepest first """
+        ordered = self.episodes.iloc[self._by_depth]
+        keep = ordered['duration'] > pd.Timedelta(duration)
+        if path is not None:
+            keep &= ordered['path'] == path
+        return ordered[keep]
+
+    def worst(self) -> pd.DataFrame:
+        """ Deepest episode of every path that had one """
+        ordered = self.episodes.iloc[self._by_depth]
+        return ordered.drop_duplicates('path').sort_values('path')
+
+    def underwater(self) -> pd.Series:
+        """ Total time spent in drawdown per path """
+        return self.episodes.groupby('path')['duration'].sum()
@@ -0,0 +1,102 @@
+from typing import Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .core import AVG_TRADING_DAYS_PER_YEAR, compound, leveraged_returns  # noqa: F401 (re-exported)
+from .rates import RateCurve, financing_curve
+from .trading_calendar import TradingCalendar
+
+
+class LeveragedETFSimulator:
+    """
+    https://www.bogleheads.org/forum/viewtopic.php?f=10&t=272007
+    Daily performance of a leveraged ETF (in percentage) is:
+    (Daily % of underlying total return index) * X - ER/250 - (X - 1) * (1 month LIBOR) * (Current date - previous date)/360
+    where X is the leverage (e.g. 2 or 3), the current date is the current date and the previous date is the previous trading day.
+
+    The simulation runs on plain arrays: `align` matches an underlying price series with a financing series once,
+    after which `simulate` can be called for any number of leverage / expense ratio combinations.
+
+    :param leverage: Daily leverage multiple (e.g. 3 for TQQQ)
+    :param expense_ratio: Annual expense ratio, passed as percentage (0 to 100)
+    :param starting_amount: NAV on the first simulated date
+    :param trading_days: Trading days per year used to spread the expense ratio
+    :param day_count: Divisor applied to the financing series (252 fits the actual ETFs better than 360)
+    :param trading_cost: Fee and slippage on the daily rebalancing trades, as percentage of the traded value
+    """
+
+    def __init__(self, leverage: float = 1.0, expense_ratio: float = 0.2, starting_amount: float = 1.0,
+                 trading_days: int = AVG_TRADING_DAYS_PER_YEAR, day_count: int = AVG_TRADING_DAYS_PER_YEAR,
+                 trading_cost: float = 0.0):
+        self.leverage = leverage
+        self.expense_ratio = expense_ratio
+        self.starting_amount = starting_amount
+        self.trading_days = trading_days
+        self.day_count = day_count
+        self.trading_cost = trading_cost
+
+    @staticmethod
+    def align(etf_prices, daily_financing: Union[pd.Series, RateCurve, str]) -> Tuple[pd.DatetimeIndex, np.ndarray,
+                                                                                      np.ndarray]:
+        """
+        Computes the daily returns of the underlying and matches them with the financing series
+        :param etf_prices: Underlying prices, as a Series or a DataFrame with a `Close` column
+        :param daily_financing: A financing source (`RateCurve`, `'LIBOR'`, `'SOFR'`, CSV path...) accrued on the
+                                trading days of `etf_prices` (see `rates.financing_curve`), or the financing rate
+                                times day delta on those days, as percentage (`RateCurve.daily_financing`,
+                                `process_libor(dates=etf_prices.index)['Value']`); days it does not cover are dropped
+        :return: (dates, underlying daily returns, financing as decimal), all the same length
+        """
+        if isinstance(etf_prices, pd.DataFrame):
+            etf_prices = etf_prices['Close']
+        if not isinstance(daily_financing, pd.Series):
+            daily_financing = financing_curve(daily_financing).daily_financing(etf_prices.index)
+
+        prices = etf_prices.to_numpy(dtype=np.float64)
+        returns = prices[1:] / prices[:-1] - 1
+        index = etf_prices.index[1:]
+
+        # since daily financing is missing some days, only keep the days it covers
+        financing_calendar = TradingCalendar(daily_financing.index)
+        pos = financing_calendar.positions(index)
+        financing = np.where(pos >= 0, financing_calendar.take(daily_financing)[pos], np.nan) / 100
+        # since some etf_prices skip a lot of data in the 1980s (but LIBOR is fully logged), remove all NaN
+        keep = ~(np.isnan(returns) | np.isnan(financing))
+
+        return index[keep], returns[keep], financing[keep]
+
+    def simulate(self, underlying_returns: np.ndarray, financing: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Simulates the leveraged ETF on aligned arrays (see `align`)
+        :param underlying_returns: Daily returns of the underlying, as decimal
+        :param financing: Financing rate times day delta, as decimal
+        :return: (daily returns of the leveraged ETF, NAV)
+        """
+        lev_returns = leveraged_returns(underlying_returns, financing, leverage=self.leverage,
+                                        expense_ratio=self.expense_ratio, trading_days=self.trading_days,
+                                        day_count=self.day_count, trading_cost=self.trading_cost)
+        return lev_returns, compound(lev_returns, starting_amount=self.starting_amount)
+
+    def run(self, etf_prices, daily_financing: Union[pd.Series, RateCurve, str]) -> pd.DataFrame:
+        """
+        Aligns and simulates in one go
+        :return: DataFrame with the daily returns (`Close`) and NAV (`Investment`) of the leveraged ETF
+        """
+        index, underlying_returns, financing = self.align(etf_prices, daily_financing)
+        lev_returns, nav = self.simulate(underlying_returns, financing)
+        return pd.DataFrame({'Close': lev_returns, 'Investment': nav}, index=index)
+
+
+def daily_leveraged_etf(etf_prices, daily_libor, starting_amount=1.0, leverage=1.0, expense_ratio=0.2,
+                        trading_cost=0.0):
+    """
+    Simulates a leveraged ETF, see `LeveragedETFSimulator`
+
+    daily_libor: passed as percentage (0 to 100), or any financing source (`RateCurve`, `'SOFR'`, CSV path...)
+    expense_ratio: passed as percentage (0 to 100)
+    trading_cost: fee and slippage on the daily rebalancing trades, passed as percentage of the traded value
+    """
+    simulator = LeveragedETFSimulator(leverage=leverage, expense_ratio=expense_ratio, starting_amount=starting_amount,
+                                      trading_cost=trading_cost)
+    return simulator.run(etf_prices, daily_libor)
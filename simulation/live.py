@@ -0,0 +1,130 @@
+import json
+import os
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .core import leveraged_returns
+from .leveraged_etf import LeveragedETFSimulator
+from .rates import RateCurve
+
+
+Financing = Union[RateCurve, float]
+
+
+class LiveLeveragedETF:
+    """
+    Incremental leveraged ETF simulation: keeps the last NAV, date and underlying price together with the
+    running drawdown peak, so each new daily bar is applied in O(1) instead of re-simulating the history.
+    The state can be saved to and restored from a JSON file.
+
+    :param simulator: Leverage, expense ratio and day count to simulate
+    :param nav: NAV after the last applied bar
+    :param last_date: Date of the last applied bar
+    :param last_price: Underlying price of the last applied bar
+    :param peak: Highest NAV so far
+    :param max_drawdown: Worst drawdown so far, in percent (0 to -100)
+    """
+
+    def __init__(self, simulator: LeveragedETFSimulator, nav: float, last_date, last_price: float,
+                 peak: Optional[float] = None, max_drawdown: float = 0.0):
+        self.simulator = simulator
+        self.nav = nav
+        self.last_date = pd.Timestamp(last_date).normalize()
+        self.last_price = last_price
+        self.peak = nav if peak is None else peak
+        self.max_drawdown = max_drawdown
+
+    @classmethod
+    def start(cls, simulator: LeveragedETFSimulator, date, price: float) -> 'LiveLeveragedETF':
+        """ New state at `simulator.starting_amount` on `date` """
+        return cls(simulator, simulator.starting_amount, date, price)
+
+    @classmethod
+    def from_history(cls, simulator: LeveragedETFSimulator, etf_prices, daily_financing) -> 'LiveLeveragedETF':
+        """ State at the end of a full simulation (see `LeveragedETFSimulator.run`), to continue from there """
+        if isinstance(etf_prices, pd.DataFrame):
+            etf_prices = etf_prices['Close']
+        index, underlying_returns, financing = simulator.align(etf_prices, daily_financing)
+        _, nav = simulator.simulate(underlying_returns, financing)
+
+        peak = np.maximum.accumulate(nav)
+        return cls(simulator, nav[-1], index[-1], float(etf_prices.loc[index[-1]]), peak=peak[-1],
+                   max_drawdown=((nav / peak).min() - 1) * 100)
+
+    @property
+    def drawdown(self) -> float:
+        """ Current drawdown from the peak, in percent """
+        return (self.nav / self.peak - 1) * 100
+
+    def _bar_return(self, date: pd.Timestamp, price: float, financing: Financing) -> float:
+        if isinstance(financing, RateCurve):
+            # rate fixed on the previous bar, accrued over the actual days since then
+            rate = financing.asof([self.last_date])[0]
+        else:
+            rate = financing
+        daily_financing = rate / 100 * (date - self.last_date).days
+
+        return float(leveraged_returns(price / self.last_price - 1, daily_financing,
+                                       leverage=self.simulator.leverage, expense_ratio=self.simulator.expense_ratio,
+                                       trading_days=self.simulator.trading_days, day_count=self.simulator.day_count,
+                                       trading_cost=self.simulator.trading_cost))
+
+    def indicative_nav(self, price: float, financing: Financing, date=None) -> float:
+        """ NAV if the bar closed at `price` now (e.g. from a live tick), without changing the state """
+        date = pd.Timestamp(date or pd.Timestamp.today()).normalize()
+        return self.nav * (1 + self._bar_return(date, price, financing))
+
+    def update(self, date, price: float, financing: Financing) -> float:
+        """
+        Applies one daily bar; bars on or before the last applied date are ignored
+        :param date: Date of the bar
+        :param price: Underlying close of the bar
+        :param financing: `RateCurve`, or the annual financing rate in percent
+        :return: NAV after the bar
+        """
+        date = pd.Timestamp(date).normalize()
+        if date <= self.last_date:
+            return self.nav
+
+        self.nav *= 1 + self._bar_return(date, price, financing)
+        self.last_date, self.last_price = date, price
+        if self.nav > self.peak:
+            self.peak = self.nav
+        self.max_drawdown = min(self.max_drawdown, self.drawdown)
+
+        return self.nav
+
+    def catch_up(self, prices: pd.Series, financing: Financing) -> float:
+        """ Applies every bar of `prices` (e.g. from the price cache) newer than the last applied date """
+        for date, price in prices.loc[self.last_date + pd.Timedelta(days=1):].dropna().items():
+            self.update(date, price, financing)
+        return self.nav
+
+    def to_dict(self) -> dict:
+        sim = self.simulator
+        return {
+            'simulator': {'leverage': sim.leverage, 'expense_ratio': sim.expense_ratio,
+                          'starting_amount': sim.starting_amount, 'trading_days': sim.trading_days,
+                          'day_count': sim.day_count, 'trading_cost': sim.trading_cost},
+            'nav': self.nav, 'last_date': str(self.last_date.date()), 'last_price': self.last_price,
+            'peak': self.peak, 'max_drawdown': self.max_drawdown,
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'LiveLeveragedETF':
+        return cls(LeveragedETFSimulator(**state['simulator']), state['nav'], state['last_date'], state['last_price'],
+                   peak=state['peak'], max_drawdown=state['max_drawdown'])
+
+    def save(self, path: str):
+        """ Writes the state to `path` atomically, so a crash never leaves a half-written file """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'LiveLeveragedETF':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
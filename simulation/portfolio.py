@@ -0,0 +1,199 @@
+"""
+Backtests of a rebalanced mix of assets, e.g. simulated TQQQ and TMF.
+
+Between two rebalances the holdings are fixed, so the portfolio value is a weighted sum of each asset's growth
+since the last rebalance; with proportional costs every rebalance scales the NAV by a factor, so the whole NAV is
+computed with array operations once the rebalance days are known. Threshold bands only need a scan of the
+candidate days for the next breach, one event at a time.
+"""
+from itertools import product
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .analytics import performance
+from .core import AVG_TRADING_DAYS_PER_YEAR, DAYS_PER_YEAR
+
+
+REBALANCE_FREQUENCIES = ['daily', 'weekly', 'monthly', 'quarterly', 'yearly']
+
+
+class TransactionCosts(NamedTuple):
+    """
+    commission: Fees, as percentage of the traded value
+    slippage: Price impact and spread, as percentage of the traded value
+    """
+    commission: float = 0.0
+    slippage: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return (self.commission + self.slippage) / 100
+
+
+class PortfolioResult(NamedTuple):
+    """
+    nav: Portfolio value at each close, after the costs of that day's rebalance
+    weights: Weight of each asset at each close, after rebalancing
+    rebalances: Dates the portfolio was rebalanced on
+    turnover: Traded value of each rebalance, as a fraction of the NAV (buys plus sells)
+    """
+    nav: pd.Series
+    weights: pd.DataFrame
+    rebalances: pd.DatetimeIndex
+    turnover: np.ndarray
+
+
+def rebalance_days(dates: pd.DatetimeIndex, frequency: Optional[str] = 'monthly') -> np.ndarray:
+    """
+    Positions of the scheduled rebalance days: the last trading day of each week, month, quarter or year,
+    every day for 'daily', none for None (buy and hold)
+    """
+    n = len(dates)
+    if frequency is None:
+        return np.empty(0, dtype=np.intp)
+    if frequency == 'daily':
+        return np.arange(1, n)
+
+    dates = pd.DatetimeIndex(dates)
+    if frequency == 'weekly':
+        period = (dates.values.astype('datetime64[D]').astype(np.int64) + 3) // 7  # weeks starting on Monday
+    elif frequency == 'monthly':
+        period = dates.year * 12 + dates.month
+    elif frequency == 'quarterly':
+        period = dates.year * 4 + (dates.month - 1) // 3
+    elif frequency == 'yearly':
+        period = dates.year
+    else:
+        raise ValueError(f'Unknown rebalance frequency {frequency!r}, expected one of {REBALANCE_FREQUENCIES} or None')
+
+    period = np.asarray(period)
+    return np.flatnonzero(period[:-1] != period[1:])
+
+
+def _band_events(growth: np.ndarray, weights: np.ndarray, candidates: np.ndarray, band: float) -> np.ndarray:
+    """ Candidate days on which some weight has drifted more than `band` from its target since the last event """
+    events = []
+    start, i = 0, 0
+    lookahead = 64
+    while i < len(candidates):
+        block = candidates[i:i + lookahead]
+        block = block[block > start]
+        if not len(block):
+            i += lookahead
+            continue
+        held = weights[:, None] * growth[:, block] / growth[:, start, None]
+        drift = np.abs(held / held.sum(axis=0) - weights[:, None]).max(axis=0)
+        breach = np.flatnonzero(drift > band)
+        if len(breach):
+            start = block[breach[0]]
+            events.append(start)
+            i = np.searchsorted(candidates, start, side='right')
+            lookahead = 64
+        else:
+            i += lookahead
+            lookahead *= 2  # quiet markets: look further ahead at once
+    return np.asarray(events, dtype=np.intp)
+
+
+def backtest(prices: pd.DataFrame, weights: Sequence[float], rebalance: Optional[str] = 'monthly',
+             band: Optional[float] = None, costs: TransactionCosts = TransactionCosts(),
+             starting_amount: float = 1.0) -> PortfolioResult:
+    """
+    Backtests a portfolio holding `prices` columns at target `weights`
+    :param prices: Prices or NAV of each asset, one column per asset, on a common calendar
+                   (e.g. `TradingCalendar.align(...).frame()`); days where any asset is missing are dropped
+    :param weights: Target weight of each column, summing to 1
+    :param rebalance: 'daily', 'weekly', 'monthly', 'quarterly', 'yearly' or None (only `band`, checked daily)
+    :param band: Only rebalance once a weight is more than `band` (absolute, e.g. 0.05) off its target,
+                 checked on the scheduled days; None rebalances on every scheduled day
+    :param costs: Transaction costs charged on the traded value of each rebalance
+    :param starting_amount: Value invested at the target weights on the first day
+    :return: PortfolioResult
+    """
+    prices = prices.dropna()
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(weights) != prices.shape[1]:
+        raise ValueError(f'{len(weights)} weights for {prices.shape[1]} assets')
+    if not np.isclose(weights.sum(), 1.0):
+        raise ValueError(f'Weights must sum to 1, not {weights.sum()}')
+
+    values = prices.to_numpy(dtype=np.float64).T
+    growth = values / values[:, :1]
+    n_days = growth.shape[1]
+
+    candidates = rebalance_days(prices.index, 'daily' if rebalance is None and band is not None else rebalance)
+    events = candidates if band is None else _band_events(growth, weights, candidates, band)
+
+    # last rebalance strictly before each day (day 0 is the initial purchase)
+    is_event = np.zeros(n_days, dtype=bool)
+    is_event[0] = True
+    is_event[events] = True
+    segment_start = np.maximum.accumulate(np.where(is_event, np.arange(n_days), 0))
+    previous_start = np.empty(n_days, dtype=np.intp)
+    previous_start[0] = 0
+    previous_start[1:] = segment_start[:-1]
+
+    # value of each holding relative to the NAV right after the last rebalance
+    held = weights[:, None] * growth / growth[:, previous_start]
+    relative = held.sum(axis=0)
+    drifted = held / relative
+
+    turnover = np.abs(drifted[:, events] - weights[:, None]).sum(axis=0)
+    event_factor = relative[events] * (1 - costs.rate * turnover)
+    after_rebalance = np.empty(n_days)
+    after_rebalance[0] = starting_amount
+    after_rebalance[events] = starting_amount * np.cumprod(event_factor)
+
+    nav = after_rebalance[previous_start] * relative
+    nav[events] = after_rebalance[events]
+    nav[0] = starting_amount
+    drifted[:, events] = weights[:, None]
+
+    return PortfolioResult(nav=pd.Series(nav, index=prices.index, name='Portfolio'),
+                           weights=pd.DataFrame(drifted.T, index=prices.index, columns=prices.columns),
+                           rebalances=prices.index[events], turnover=turnover)
+
+
+def backtest_grid(prices: pd.DataFrame, weights: Sequence[Sequence[float]], bands: Sequence[Optional[float]] = (None,),
+                  rebalance: Sequence[Optional[str]] = ('monthly',), costs: TransactionCosts = TransactionCosts(),
+                  periods_per_year: int = AVG_TRADING_DAYS_PER_YEAR) -> pd.DataFrame:
+    """
+    Backtests every combination of target weights, rebalance frequency and band
+    :return: One row per combination: the weight of each asset, `rebalance`, `band`, the number of `rebalances`,
+             the mean `turnover` per year (fraction of the NAV) and the `analytics.performance` metrics
+    """
+    prices = prices.dropna()
+    combos = list(product(weights, rebalance, bands))
+    navs = np.empty((len(combos), len(prices)))
+    rows = []
+    years = (prices.index[-1] - prices.index[0]).days / DAYS_PER_YEAR
+    for i, (w, frequency, band) in enumerate(combos):
+        result = backtest(prices, w, rebalance=frequency, band=band, costs=costs)
+        navs[i] = result.nav.to_numpy()
+        rows.append(dict(zip(prices.columns, w), rebalance=frequency, band=band,
+                         rebalances=len(result.rebalances), turnover=result.turnover.sum() / years))
+
+    # metrics of all combinations in one vectorized pass
+    metrics = performance(navs, prices.index, periods_per_year=periods_per_year)
+    return pd.concat([pd.DataFrame(rows), metrics], axis=1)
+
+
+if __name__ == '__main__':
+    from .datasets import load as load_dataset
+    from .leveraged_etf import LeveragedETFSimulator
+    from .rates import load_rate_curve
+    from .trading_calendar import TradingCalendar
+
+    libor = load_rate_curve('USD1MTD156N')
+    ndqcom = load_dataset('NASDAQ_COMPOSITE').iloc[:, 0].loc['1994-03-01':].dropna()
+    xiusa000ml = load_dataset('XIUSA000ML')['Close'].loc['1994-03-01':]
+
+    tqqq = LeveragedETFSimulator(leverage=3, expense_ratio=0.95, trading_cost=0.02).run(ndqcom, libor)
+    tmf = LeveragedETFSimulator(leverage=3, expense_ratio=1.06, trading_cost=0.02).run(xiusa000ml, libor)
+    prices = TradingCalendar.align(TQQQ=tqqq['Investment'], TMF=tmf['Investment']).frame()
+
+    table = backtest_grid(prices, weights=[(w, 1 - w) for w in (0.4, 0.55, 0.7)], bands=(None, 0.05, 0.1),
+                          rebalance=('monthly', 'quarterly'), costs=TransactionCosts(commission=0.01, slippage=0.05))
+    print(table[['TQQQ', 'TMF', 'rebalance', 'band', 'rebalances', 'turnover', 'cagr', 'max_drawdown', 'sharpe']])
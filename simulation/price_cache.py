@@ -0,0 +1,88 @@
+import os
+from datetime import date, timedelta
+from typing import Callable
+from urllib.parse import quote
+
+import pandas as pd
+
+from .columnar import read_meta, read_table, write_table
+
+
+DEFAULT_CACHE_DIR = os.environ.get('SIMULATION_CACHE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'simulation', 'prices'))
+
+Fetcher = Callable[[str, str, pd.Timestamp, pd.Timestamp], pd.DataFrame]
+
+
+def datareader_fetch(symbol: str, source: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """ Downloads prices through pandas_datareader (imported on first use) """
+    import pandas_datareader.data as web
+
+    return web.DataReader(symbol, source, start, end)
+
+
+class PriceCache:
+    """
+    Local store in front of the price downloads, keyed by source and symbol.
+    Each symbol is kept as a single columnar table (see `columnar`) together with the date range
+    already requested from the source, so overlapping requests are served locally
+    and only the missing head or tail of the range is downloaded.
+
+    :param cache_dir: Root directory of the store
+    :param fetch: Download function `fetch(symbol, source, start, end) -> DataFrame`
+    :param offline: Never download; serve whatever is stored
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, fetch: Fetcher = datareader_fetch, offline: bool = False):
+        self.cache_dir = cache_dir
+        self.fetch = fetch
+        self.offline = offline
+
+    def path(self, symbol: str, source: str = 'yahoo') -> str:
+        return os.path.join(self.cache_dir, quote(source, safe=''), quote(symbol, safe=''))
+
+    def get(self, symbol: str, start, end, source: str = 'yahoo') -> pd.DataFrame:
+        """
+        Prices of `symbol` between `start` and `end` (inclusive)
+        :return: DataFrame as returned by the source (e.g. `Adj Close`, `Close`, `Volume`... for yahoo)
+        """
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        path = self.path(symbol, source)
+        meta = read_meta(path)
+        stored = read_table(path) if meta is not None else None
+
+        if not self.offline:
+            # the current day is never marked as covered, so it gets refreshed on the next run
+            covered_until = min(end, pd.Timestamp(date.today() - timedelta(days=1)))
+            if stored is None:
+                stored = self._fetch(symbol, source, start, end)
+                covered = (start, covered_until)
+            else:
+                stored_covered = (pd.Timestamp(meta['covered_start']), pd.Timestamp(meta['covered_end']))
+                parts = [stored]
+                if start < stored_covered[0]:
+                    parts.append(self._fetch(symbol, source, start, stored_covered[0] - timedelta(days=1)))
+                if end > stored_covered[1]:
+                    parts.append(self._fetch(symbol, source, stored_covered[1] + timedelta(days=1), end))
+                if len(parts) == 1:
+                    return stored.loc[start:end].copy()
+
+                stored = pd.concat(parts).sort_index()
+                stored = stored[~stored.index.duplicated(keep='last')]
+                covered = (min(start, stored_covered[0]), max(covered_until, stored_covered[1]))
+
+            write_table(path, stored, meta={'symbol': symbol, 'source': source,
+                                            'covered_start': covered[0].date(), 'covered_end': covered[1].date()})
+        elif stored is None:
+            raise KeyError(f'{symbol} ({source}) is not cached in {self.cache_dir} and the cache is offline')
+
+        return stored.loc[start:end].copy()
+
+    def get_column(self, symbol: str, start, end, column: str = 'Adj Close', source: str = 'yahoo') -> pd.Series:
+        """ Single column of `get`, e.g. the adjusted close """
+        return self.get(symbol, start, end, source=source)[column]
+
+    def _fetch(self, symbol: str, source: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        fetched = self.fetch(symbol, source, start, end)
+        fetched.index = pd.DatetimeIndex(fetched.index).normalize()
+        return fetched.sort_index()
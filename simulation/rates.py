@@ -0,0 +1,208 @@
+import os
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .datasets import load as load_dataset, read_fred
+
+
+ACT_360 = 360
+
+# calendar days a fixing stays in effect without a newer one, covering long weekends around holidays
+DEFAULT_MAX_STALENESS = 7
+
+# USD LIBOR panel ended after 2023-06-30; ISDA fallback spread adjustment of 1M USD LIBOR over SOFR, in percent
+USD_LIBOR_CESSATION = '2023-06-30'
+SOFR_1M_SPREAD_ADJUSTMENT = 0.11448
+
+
+def _as_days(dates) -> np.ndarray:
+    return pd.DatetimeIndex(dates).values.astype('datetime64[D]')
+
+
+class RateCurve:
+    """
+    A financing rate (in percent, e.g. 1-month LIBOR) observed on given dates.
+    Missing fixings are forward-filled, and lookups for any date return the last fixing on or before it,
+    unless that fixing is more than `max_staleness` days old (e.g. after a discontinued series' last fixing).
+
+    :param dates: Observation dates
+    :param rates: Rate on each observation date, in percent (NaN for missing fixings)
+    :param name: Label of the curve
+    :param max_staleness: Calendar days a fixing stays in effect without a newer one; None for no limit
+    """
+
+    def __init__(self, dates, rates, name: str = '', max_staleness: Optional[int] = DEFAULT_MAX_STALENESS):
+        dates = _as_days(dates)
+        rates = np.asarray(rates, dtype=np.float64)
+        order = np.argsort(dates, kind='mergesort')
+        dates, rates = dates[order], rates[order]
+
+        # forward-fill missing fixings, dropping the ones before the first observation
+        valid = ~np.isnan(rates)
+        if not valid.any():
+            raise ValueError(f'Rate curve {name!r} has no observations')
+        last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(rates)), 0))
+        first = np.argmax(valid)
+
+        self.dates = dates[first:]
+        self.rates = rates[last_valid][first:]
+        self.fixing_dates = dates[last_valid][first:]  # date of the fixing in effect on each date
+        self.name = name
+        self.max_staleness = max_staleness
+
+    @classmethod
+    def from_series(cls, series: pd.Series, name: Optional[str] = None, **kwargs) -> 'RateCurve':
+        return cls(series.index, series.to_numpy(dtype=np.float64), name=name or str(series.name), **kwargs)
+
+    @classmethod
+    def from_csv(cls, csv_path: str, column: Optional[str] = None, **kwargs) -> 'RateCurve':
+        """ Rate series from a FRED-style CSV (`DATE,<SERIES_ID>`, `.` for missing values) """
+        df = read_fred(csv_path)
+        return cls.from_series(df[column or df.columns[0]], **kwargs)
+
+    @classmethod
+    def stitch(cls, segments: Sequence[Tuple['RateCurve', Optional[str]]], name: Optional[str] = None) -> 'RateCurve':
+        """
+        Composite curve that switches source at cutover dates, e.g. LIBOR until its cessation and SOFR after
+        :param segments: (curve, first date it applies from) pairs in order; the first segment's date is ignored
+        The staleness limit is the last segment's
+        """
+        dates, rates, fixing_dates = [], [], []
+        for i, (curve, start) in enumerate(segments):
+            keep = np.ones(len(curve.dates), dtype=bool)
+            if i > 0:
+                keep &= curve.dates >= np.datetime64(pd.Timestamp(start).date(), 'D')
+            if i + 1 < len(segments):
+                keep &= curve.dates < np.datetime64(pd.Timestamp(segments[i + 1][1]).date(), 'D')
+            dates.append(curve.dates[keep])
+            rates.append(curve.rates[keep])
+            fixing_dates.append(curve.fixing_dates[keep])
+
+        stitched = cls(np.concatenate(dates), np.concatenate(rates),
+                       name=name or '+'.join(c.name for c, _ in segments), max_staleness=segments[-1][0].max_staleness)
+        stitched.fixing_dates = np.concatenate(fixing_dates)
+        return stitched
+
+    def shifted(self, spread: float) -> 'RateCurve':
+        """ The same curve plus `spread` (in percent) """
+        curve = RateCurve(self.dates, self.rates + spread, name=f'{self.name}{spread:+g}',
+                          max_staleness=self.max_staleness)
+        curve.fixing_dates = self.fixing_dates
+        return curve
+
+    def asof(self, dates) -> np.ndarray:
+        """
+        Rate in effect on each of `dates` (the last fixing on or before it), NaN before the first fixing
+        and once the last fixing is more than `max_staleness` days old
+        """
+        days = _as_days(dates)
+        pos = np.searchsorted(self.dates, days, side='right') - 1
+        rates = self.rates[np.maximum(pos, 0)]
+        rates[pos < 0] = np.nan
+        if self.max_staleness is not None:
+            age = (days - self.fixing_dates[np.maximum(pos, 0)]).astype(np.int64)
+            rates[age > self.max_staleness] = np.nan
+        return rates
+
+    @staticmethod
+    def previous_dates(dates) -> np.ndarray:
+        """ Previous date of the calendar for each date; the first date's is the previous business day """
+        days = _as_days(dates)
+        prev = np.empty_like(days)
+        if len(days):
+            prev[1:] = days[:-1]
+            prev[0] = np.busday_offset(days[0], -1, roll='backward')
+        return prev
+
+    def accrual_factors(self, dates, day_count: int = ACT_360) -> np.ndarray:
+        """
+        Interest accrued over each period of the calendar, as decimal: the rate fixed on the previous date
+        times the actual days since then, over `day_count` (ACT/360 by default)
+        """
+        days = _as_days(dates)
+        prev = self.previous_dates(days)
+        return self.asof(prev) / 100 * (days - prev).astype(np.float64) / day_count
+
+    def daily_financing(self, dates) -> pd.Series:
+        """
+        Rate (in percent) times the actual days since the previous date of the calendar,
+        in the form `LeveragedETFSimulator` takes for `daily_financing`
+        """
+        values = self.accrual_factors(dates, day_count=1) * 100
+        return pd.Series(values, index=pd.DatetimeIndex(dates), name=self.name)
+
+
+@lru_cache(maxsize=None)
+def load_rate_curve(name: str = 'USD1MTD156N') -> RateCurve:
+    """ Rate curve of a bundled FRED series, loaded once per process """
+    df = load_dataset(name)
+    return RateCurve.from_series(df[df.columns[0]], name=name)
+
+
+def fred_rate_curve(series_id: str, start='1986-01-01', end=None, cache=None) -> RateCurve:
+    """
+    Rate curve of any FRED series (e.g. `SOFR`), downloaded once through the price cache
+    :param cache: `PriceCache` to use, default one in the default cache directory
+    """
+    from .price_cache import PriceCache
+
+    cache = cache or PriceCache()
+    df = cache.get(series_id, start, end or pd.Timestamp.today(), source='fred')
+    return RateCurve.from_series(df[series_id], name=series_id)
+
+
+FinancingSource = Union[RateCurve, str]
+
+# named financing sources, see `financing_curve`
+FINANCING_SOURCES = {
+    'LIBOR': lambda: load_rate_curve('USD1MTD156N'),
+    'SOFR': lambda: fred_rate_curve('SOFR'),
+    'LIBOR+SOFR': lambda: RateCurve.stitch([
+        (load_rate_curve('USD1MTD156N'), None),
+        (fred_rate_curve('SOFR').shifted(SOFR_1M_SPREAD_ADJUSTMENT), pd.Timestamp(USD_LIBOR_CESSATION) + pd.Timedelta(days=1)),
+    ], name='LIBOR+SOFR'),
+}
+
+
+def financing_curve(source: FinancingSource) -> RateCurve:
+    """
+    Resolves a financing source into a rate curve
+    :param source: A `RateCurve`, a name of `FINANCING_SOURCES` (`LIBOR`, `SOFR`, `LIBOR+SOFR`),
+                   a bundled FRED series name (e.g. `USD1MTD156N`) or the path of a FRED-style CSV
+    """
+    if isinstance(source, RateCurve):
+        return source
+    if source in FINANCING_SOURCES:
+        return FINANCING_SOURCES[source]()
+    if os.path.isfile(source):
+        return RateCurve.from_csv(source)
+    return load_rate_curve(source)
+
+
+def process_libor(csv_path: Optional[str] = None, dates=None) -> pd.DataFrame:
+    """
+    Gets and Process LIBOR
+    :param csv_path: Path to a FRED CSV, default the bundled USD1MTD156N
+    :param dates: Calendar to accrue on (e.g. the trading days of the ETF), default the actual fixing dates
+    :return: DataFrame on `dates` with `LIBOR` in effect, `Days` since the previous date and
+             `Value`: (1 month LIBOR of the previous date) * `Days`, as `RateCurve.daily_financing`.
+             On the fixing dates, holidays without a fixing are left out and the first fixing uses its own LIBOR
+    """
+    curve = load_rate_curve() if csv_path is None else RateCurve.from_csv(csv_path)
+    if dates is not None:
+        dates = _as_days(dates)
+        days = (dates - RateCurve.previous_dates(dates)).astype(np.int64)
+        values = curve.daily_financing(dates).to_numpy()
+        return pd.DataFrame({'LIBOR': curve.asof(dates), 'Days': days, 'Value': values},
+                            index=pd.DatetimeIndex(dates, name='DATE'))
+
+    fixed = curve.fixing_dates == curve.dates
+    dates, rates = curve.dates[fixed], curve.rates[fixed]
+    prev_rates = np.empty_like(rates)
+    prev_rates[1:], prev_rates[:1] = rates[:-1], rates[:1]
+    days = (dates - RateCurve.previous_dates(dates)).astype(np.int64)
+    return pd.DataFrame({'LIBOR': rates, 'Days': days, 'Value': prev_rates * days},
+                        index=pd.DatetimeIndex(dates, name='DATE'))
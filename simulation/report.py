@@ -0,0 +1,186 @@
+"""
+Headless chart rendering for batch jobs: charts are described as `Chart` specs and rendered to files,
+as PNG / SVG / PDF through matplotlib's Agg canvas (no GUI, no pyplot state) or as interactive HTML through plotly.
+
+Long daily series are decimated to the min and max of each pixel bucket before plotting, which keeps every
+spike visible while drawing a few thousand points instead of decades of days. A renderer reuses its figure
+for every chart, and `render_charts` can spread many charts over a process pool.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .utils import drawdown, total_return
+
+
+CHART_KINDS = ['line', 'growth', 'drawdown', 'scatter', 'overlay']
+
+DEFAULT_REPORT_DIR = os.environ.get('SIMULATION_REPORT_DIR', 'reports')
+
+
+class Chart(NamedTuple):
+    """
+    name: File name of the chart, without extension
+    kind: 'line', 'growth' (lines on a log scale), 'drawdown' (filled area), 'scatter' (points)
+          or 'overlay' (first series on the left axis, second on the right one)
+    series: Series to plot, by legend label
+    title: Chart title
+    """
+    name: str
+    kind: str
+    series: Dict[str, pd.Series]
+    title: str = ''
+
+
+def decimate(series: pd.Series, buckets: int = 1000) -> pd.Series:
+    """
+    Keeps the lowest and highest point of each of `buckets` equal slices of the series (in order), plus its
+    first and last points, so the plot looks the same at that many pixels wide and spans the same dates:
+    at most 2 * buckets + 2 points; shorter series are returned as they are
+    """
+    series = series.dropna()
+    n = len(series)
+    if n <= 2 * buckets:
+        return series
+
+    values = series.to_numpy(dtype=np.float64)
+    bucket = np.arange(n) * buckets // n
+    # sorted by bucket, then value: the first and last of each bucket are its min and max
+    order = np.lexsort((values, bucket))
+    bounds = np.searchsorted(bucket[order], np.arange(buckets + 1))
+    keep = np.unique(np.concatenate([[0, n - 1], order[bounds[:-1]], order[bounds[1:] - 1]]))
+    return series.iloc[keep]
+
+
+def scenario_charts(name: str, nav: pd.Series, benchmarks: Optional[Dict[str, pd.Series]] = None,
+                    overlay: Optional[Tuple[str, pd.Series]] = None) -> List[Chart]:
+    """
+    Standard charts of one scenario: growth of $1 against `benchmarks`, drawdown,
+    and the drawdown against an `overlay` series such as (`'VIX'`, vix) if given
+    """
+    series = {name: nav}
+    series.update(benchmarks or {})
+    growth = {label: total_return(s.dropna()) for label, s in series.items()}
+    nav_drawdown = drawdown(nav.dropna())
+
+    charts = [Chart(f'{name} growth', 'growth', growth, f'Growth of $1: {name}'),
+              Chart(f'{name} drawdown', 'drawdown', {name: nav_drawdown}, f'{name} drawdown')]
+    if overlay is not None:
+        label, s = overlay
+        charts.append(Chart(f'{name} vs {label}', 'overlay', {label: s, f'{name} drawdown': nav_drawdown},
+                            f'{name} drawdown vs {label}'))
+    return charts
+
+
+class ChartRenderer:
+    """
+    Renders charts with matplotlib's Agg canvas, reusing one figure for every chart
+    :param width: Figure width in inches
+    :param height: Figure height in inches
+    :param dpi: Pixels per inch; width * dpi is the number of decimation buckets
+    """
+
+    def __init__(self, width: float = 10, height: float = 6, dpi: int = 100):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.figure = Figure(figsize=(width, height), dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.buckets = int(width * dpi)
+
+    def draw(self, chart: Chart):
+        self.figure.clf()
+        ax = self.figure.add_subplot(1, 1, 1)
+        ax.set_title(chart.title or chart.name)
+        series = {label: decimate(s, self.buckets) for label, s in chart.series.items()}
+
+        if chart.kind in ('line', 'growth'):
+            for label, s in series.items():
+                ax.plot(s.index, s.to_numpy(), label=label, linewidth=1)
+            if chart.kind == 'growth':
+                ax.set_yscale('log')
+        elif chart.kind == 'drawdown':
+            for label, s in series.items():
+                ax.fill_between(s.index, s.to_numpy(), 0, color='red', alpha=0.5, label=label)
+        elif chart.kind == 'scatter':
+            for label, s in series.items():
+                ax.scatter(s.index, s.to_numpy(), label=label, s=2)
+        elif chart.kind == 'overlay':
+            (left_label, left), (right_label, right) = series.items()
+            right_ax = ax.twinx()
+            ax.plot(left.index, left.to_numpy(), 'b-', linewidth=1)
+            right_ax.plot(right.index, right.to_numpy(), 'r-', linewidth=1)
+            ax.set_ylabel(left_label, color='b')
+            right_ax.set_ylabel(right_label, color='r')
+        else:
+            raise ValueError(f'Unknown chart kind {chart.kind!r}, expected one of {CHART_KINDS}')
+
+        if chart.kind != 'overlay' and len(series) > 1:
+            ax.legend()
+
+    def render(self, chart: Chart, path: str) -> str:
+        """ Draws `chart` and writes it to `path`, in the format of its extension """
+        self.draw(chart)
+        self.figure.savefig(path)
+        return path
+
+
+def render_html(chart: Chart, path: str, buckets: int = 1000) -> str:
+    """ Writes `chart` as an interactive plotly page (plotly.js is loaded from its CDN) """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    overlay = chart.kind == 'overlay'
+    figure = make_subplots(specs=[[{'secondary_y': overlay}]])
+    for i, (label, s) in enumerate(chart.series.items()):
+        s = decimate(s, buckets)
+        if chart.kind == 'scatter':
+            trace = go.Scattergl(x=s.index, y=s.to_numpy(), name=label, mode='markers', marker={'size': 2})
+        elif chart.kind == 'drawdown':
+            trace = go.Scattergl(x=s.index, y=s.to_numpy(), name=label, fill='tozeroy', line={'color': 'red'})
+        else:
+            trace = go.Scattergl(x=s.index, y=s.to_numpy(), name=label, mode='lines')
+        figure.add_trace(trace, secondary_y=overlay and i == 1)
+
+    figure.update_layout(title=chart.title or chart.name)
+    if chart.kind == 'growth':
+        figure.update_yaxes(type='log')
+    figure.write_html(path, include_plotlyjs='cdn')
+    return path
+
+
+# renderer of a worker process, made once by `_init_worker`
+_renderer: Optional[ChartRenderer] = None
+
+
+def _init_worker(width: float, height: float, dpi: int):
+    global _renderer
+    _renderer = ChartRenderer(width, height, dpi)
+
+
+def _render(chart: Chart, path: str) -> str:
+    if path.endswith('.html'):
+        return render_html(chart, path, buckets=_renderer.buckets)
+    return _renderer.render(chart, path)
+
+
+def render_charts(charts: Sequence[Chart], out_dir: str = DEFAULT_REPORT_DIR, fmt: str = 'png', workers: int = 1,
+                  width: float = 10, height: float = 6, dpi: int = 100) -> List[str]:
+    """
+    Renders every chart into `out_dir`, as `<name>.<fmt>`
+    :param fmt: 'png', 'svg', 'pdf' or 'html'
+    :param workers: Processes rendering in parallel, each with its own reused figure; 1 renders in-process
+    :return: Paths of the written files, in the order of `charts`
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = [os.path.join(out_dir, f'{chart.name}.{fmt}') for chart in charts]
+
+    if workers <= 1:
+        _init_worker(width, height, dpi)
+        return [_render(chart, path) for chart, path in zip(charts, paths)]
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(width, height, dpi)) as pool:
+        return list(pool.map(_render, charts, paths, chunksize=max(len(charts) // (4 * workers), 1)))
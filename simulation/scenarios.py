@@ -0,0 +1,225 @@
+"""
+Synthetic daily return paths for stress testing, resampled from the bundled histories.
+
+Every generator draws, for each synthetic day, a day of the joint history (returns of all series and the
+financing on the same date), so cross-asset correlation and the rate environment are kept together:
+
+- `BlockBootstrap`: consecutive blocks of a fixed length (moving block bootstrap)
+- `StationaryBootstrap`: blocks of geometric random length (Politis & Romano)
+- `GarchSimulation`: GARCH(1,1) volatility fitted per return series, driven by the historical
+  standardized residuals (filtered historical simulation)
+
+Paths come out in chunks from a seeded generator, so any number of paths can be streamed through
+`simulate_scenarios` with bounded memory.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .analytics import performance
+from .core import AVG_TRADING_DAYS_PER_YEAR, compound, leveraged_returns
+from .datasets import load as load_dataset
+from .rates import financing_curve
+from .trading_calendar import TradingCalendar
+
+
+FINANCING = 'financing'
+
+
+def historical_returns(names: Sequence[str] = ('NASDAQ_COMPOSITE', 'XIUSA000ML'), financing='LIBOR',
+                       max_gap_days: int = 5) -> pd.DataFrame:
+    """
+    Joint daily history to resample from: the daily returns of the bundled series on their common dates,
+    plus the `financing` column (rate times day delta, as decimal, see `LeveragedETFSimulator.align`)
+    :param names: Bundled price series (see `datasets.DATASETS`)
+    :param financing: Financing source (see `rates.financing_curve`), or None to leave it out
+    :param max_gap_days: Returns spanning more calendar days than this are dropped (e.g. monthly data before 1994)
+    """
+    prices = {name: load_dataset(name).iloc[:, 0].dropna() for name in names}
+    aligned = TradingCalendar.align(**prices)
+    changes = aligned.pct_change()[:, 1:]
+    dates = aligned.dates[1:]
+
+    gaps = np.diff(aligned.calendar.days).astype(np.float64)
+    keep = (gaps <= max_gap_days) & ~np.isnan(changes).any(axis=0)
+
+    history = pd.DataFrame(changes.T, index=dates, columns=aligned.names)
+    if financing is not None:
+        history[FINANCING] = financing_curve(financing).daily_financing(aligned.dates)[1:].to_numpy() / 100
+        keep &= ~np.isnan(history[FINANCING].to_numpy())
+
+    return history[keep]
+
+
+class ScenarioGenerator(ABC):
+    """
+    Base class of the path generators, which pick the historical day of each synthetic day in `_day_indices`
+    :param history: Joint daily history, one column per series (see `historical_returns`)
+    :param seed: Seed of the random generator; the same seed and chunk size give the same paths
+    """
+
+    def __init__(self, history: pd.DataFrame, seed: Optional[int] = None):
+        self.columns = list(history.columns)
+        self.values = history.to_numpy(dtype=np.float64)
+        # without a seed, fresh entropy is drawn once, so every chunk of this generator stays reproducible
+        self.seed = np.random.SeedSequence(seed).entropy
+
+    @abstractmethod
+    def _day_indices(self, rng: np.random.Generator, n_paths: int, n_days: int) -> np.ndarray:
+        """ Row of the history drawn for each day of each path, shaped (n_paths, n_days) """
+
+    def _draw(self, rng: np.random.Generator, n_paths: int, n_days: int) -> Dict[str, np.ndarray]:
+        days = self._day_indices(rng, n_paths, n_days)
+        return {c: self.values[:, i][days] for i, c in enumerate(self.columns)}
+
+    def chunks(self, n_paths: int, n_days: int, chunk_size: int = 1000) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Generates `n_paths` paths of `n_days` days, `chunk_size` paths at a time
+        :return: Iterator of {column: (paths in chunk, n_days) array}
+        """
+        for i, lo in enumerate(range(0, n_paths, chunk_size)):
+            yield self.chunk(i, min(chunk_size, n_paths - lo), n_days)
+
+    def chunk(self, i: int, n_paths: int, n_days: int) -> Dict[str, np.ndarray]:
+        """ The `i`-th chunk of `chunks`, generated on its own (e.g. in another process) """
+        rng = np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(i,)))
+        return self._draw(rng, n_paths, n_days)
+
+
+class BlockBootstrap(ScenarioGenerator):
+    """
+    Moving block bootstrap: paths are built from consecutive historical blocks of `block_size` days
+    """
+
+    def __init__(self, history: pd.DataFrame, block_size: int = 21, seed: Optional[int] = None):
+        super().__init__(history, seed)
+        self.block_size = block_size
+
+    def _day_indices(self, rng, n_paths, n_days):
+        n_hist = len(self.values)
+        n_blocks = -(-n_days // self.block_size)
+        block_starts = rng.integers(0, n_hist - self.block_size + 1, size=(n_paths, n_blocks))
+        days = block_starts[:, :, None] + np.arange(self.block_size)
+        return days.reshape(n_paths, -1)[:, :n_days]
+
+
+class StationaryBootstrap(ScenarioGenerator):
+    """
+    Stationary bootstrap: blocks start at random days and have geometric lengths with mean `mean_block_size`,
+    wrapping around the end of the history
+    """
+
+    def __init__(self, history: pd.DataFrame, mean_block_size: float = 21, seed: Optional[int] = None):
+        super().__init__(history, seed)
+        self.mean_block_size = mean_block_size
+
+    def _day_indices(self, rng, n_paths, n_days):
+        n_hist = len(self.values)
+        new_block = rng.random((n_paths, n_days)) < 1 / self.mean_block_size
+        new_block[:, 0] = True
+        starts = rng.integers(0, n_hist, size=(n_paths, n_days))
+
+        # offset of each day inside its block, from the position of the last block start
+        positions = np.arange(n_days)
+        block_start_pos = np.maximum.accumulate(np.where(new_block, positions, 0), axis=1)
+        block_start_day = np.take_along_axis(starts, block_start_pos, axis=1)
+        return (block_start_day + positions - block_start_pos) % n_hist
+
+
+class GarchSimulation(ScenarioGenerator):
+    """
+    GARCH(1,1) with constant mean, fitted by maximum likelihood (with variance targeting) to every return column.
+    Paths are driven by historical standardized residuals of randomly drawn days, shared across series, and the
+    other columns (e.g. `financing`) take the values of the same historical days.
+
+    :param garch_columns: Columns to model, default every column except `financing`
+    """
+
+    def __init__(self, history: pd.DataFrame, seed: Optional[int] = None,
+                 garch_columns: Optional[Sequence[str]] = None):
+        super().__init__(history, seed)
+        self.garch_columns = list(garch_columns or [c for c in self.columns if c != FINANCING])
+        self.params = {}
+        residuals = []
+        for c in self.garch_columns:
+            returns = self.values[:, self.columns.index(c)]
+            self.params[c] = self.fit(returns)
+            mu, omega, alpha, beta = self.params[c]
+            residuals.append((returns - mu) / np.sqrt(self.variance(returns - mu, omega, alpha, beta)))
+        self.residuals = np.stack(residuals, axis=1)
+
+    @staticmethod
+    def variance(eps: np.ndarray, omega: float, alpha: float, beta: float) -> np.ndarray:
+        """ Conditional variance recursion, started at the sample variance """
+        from scipy.signal import lfilter
+
+        sigma2 = np.empty_like(eps)
+        sigma2[0] = eps.var()
+        sigma2[1:] = lfilter([1.0], [1.0, -beta], omega + alpha * eps[:-1] ** 2, zi=[beta * sigma2[0]])[0]
+        return sigma2
+
+    @classmethod
+    def fit(cls, returns: np.ndarray) -> tuple:
+        """ (mu, omega, alpha, beta) of a GARCH(1,1) fitted to `returns` """
+        from scipy.optimize import minimize
+
+        mu = returns.mean()
+        eps = returns - mu
+        sample_var = eps.var()
+
+        def neg_log_likelihood(x):
+            alpha, beta = x
+            sigma2 = cls.variance(eps, sample_var * (1 - alpha - beta), alpha, beta)
+            return 0.5 * np.mean(np.log(sigma2) + eps ** 2 / sigma2)
+
+        # stationarity (alpha + beta < 1) keeps the targeted omega positive
+        result = minimize(neg_log_likelihood, x0=[0.08, 0.9], method='SLSQP',
+                          bounds=[(1e-6, 0.5), (0.0, 0.998)],
+                          constraints=[{'type': 'ineq', 'fun': lambda x: 0.999 - x[0] - x[1]}])
+        alpha, beta = result.x
+        return mu, sample_var * (1 - alpha - beta), alpha, beta
+
+    def _day_indices(self, rng, n_paths, n_days):
+        return rng.integers(0, len(self.values), size=(n_paths, n_days))
+
+    def _draw(self, rng, n_paths, n_days):
+        days = self._day_indices(rng, n_paths, n_days)
+        paths = {c: self.values[:, i][days] for i, c in enumerate(self.columns) if c not in self.garch_columns}
+
+        mu, omega, alpha, beta = (np.array(p) for p in zip(*(self.params[c] for c in self.garch_columns)))
+        shocks = self.residuals[days]  # (paths, days, series)
+        eps = np.empty_like(shocks)
+        sigma2 = np.broadcast_to(omega / (1 - alpha - beta), (n_paths, len(mu))).copy()
+        for t in range(n_days):
+            eps[:, t] = np.sqrt(sigma2) * shocks[:, t]
+            sigma2 = omega + alpha * eps[:, t] ** 2 + beta * sigma2
+
+        for i, c in enumerate(self.garch_columns):
+            paths[c] = mu[i] + eps[:, :, i]
+        return paths
+
+
+def simulate_scenarios(generator: ScenarioGenerator, n_paths: int, n_days: int, underlying: str,
+                       leverage: float = 3.0, expense_ratio: float = 0.95, chunk_size: int = 1000,
+                       trading_days: int = AVG_TRADING_DAYS_PER_YEAR,
+                       day_count: int = AVG_TRADING_DAYS_PER_YEAR) -> pd.DataFrame:
+    """
+    Streams generated paths through the leveraged ETF formula and the performance analytics, chunk by chunk,
+    so only one chunk of paths is ever in memory
+    :param underlying: Column of the generator to use as the underlying's daily returns
+    :return: `analytics.performance` table with one row per path (dates are day positions)
+    """
+    tables = [scenario_metrics(chunk, underlying, leverage, expense_ratio, trading_days, day_count)
+              for chunk in generator.chunks(n_paths, n_days, chunk_size=chunk_size)]
+    return pd.concat(tables, ignore_index=True)
+
+
+def scenario_metrics(chunk: Dict[str, np.ndarray], underlying: str, leverage: float = 3.0,
+                     expense_ratio: float = 0.95, trading_days: int = AVG_TRADING_DAYS_PER_YEAR,
+                     day_count: int = AVG_TRADING_DAYS_PER_YEAR) -> pd.DataFrame:
+    """ `analytics.performance` of the leveraged ETF paths of one generated chunk """
+    lev_returns = leveraged_returns(chunk[underlying], chunk.get(FINANCING, 0.0), leverage=leverage,
+                                    expense_ratio=expense_ratio, trading_days=trading_days, day_count=day_count)
+    return performance(compound(lev_returns), periods_per_year=trading_days)
@@ -0,0 +1,114 @@
+from typing import Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .core import AVG_TRADING_DAYS_PER_YEAR, DAYS_PER_YEAR, sweep_rows
+
+
+class SweepResult(NamedTuple):
+    """
+    scenarios: One row per scenario with its parameters, `cagr` and `max_drawdown` (both in percent)
+    paths: NAV paths shaped (scenarios, days), NaN before each scenario's start date; None if not kept
+    dates: Dates of the day axis of `paths`
+    """
+    scenarios: pd.DataFrame
+    paths: Optional[np.ndarray]
+    dates: pd.DatetimeIndex
+
+
+def scenario_grid(leverage: Sequence[float] = (1.0,), expense_ratio: Sequence[float] = (0.0,),
+                  financing_spread: Sequence[float] = (0.0,), start_dates: Sequence = (None,),
+                  financing: Sequence[str] = (None,)) -> pd.DataFrame:
+    """ Cartesian product of the sweep parameters, one scenario per row (start date varies fastest) """
+    index = pd.MultiIndex.from_product([leverage, expense_ratio, financing, financing_spread, range(len(start_dates))],
+                                       names=['leverage', 'expense_ratio', 'financing', 'financing_spread', 'start'])
+    grid = index.to_frame(index=False)
+    grid['start_date'] = [start_dates[i] for i in grid.pop('start')]
+    if financing == (None,):
+        del grid['financing']
+    return grid
+
+
+def day_deltas(dates: pd.DatetimeIndex) -> np.ndarray:
+    """ Accrual days between observations (1 on the first day), so a spread accrues like the financing rate does """
+    day_delta = np.ones(len(dates))
+    day_delta[1:] = np.diff(dates.values).astype('timedelta64[D]').astype(np.float64)
+    return day_delta
+
+
+def grid_rows(dates: pd.DatetimeIndex, financing: Union[np.ndarray, Mapping[str, np.ndarray]],
+              leverage: Sequence[float], expense_ratio: Sequence[float], financing_spread: Sequence[float],
+              start_dates: Sequence) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    Scenario grid of a sweep and its numeric form
+    :return: (grid with the resolved start dates, financing vectors with one row per label, `sweep_rows` rows)
+    """
+    if isinstance(financing, Mapping):
+        financing_labels = tuple(financing)
+        financing = np.stack([np.asarray(financing[label], dtype=np.float64) for label in financing_labels])
+    else:
+        financing_labels = (None,)
+        financing = np.asarray(financing, dtype=np.float64)[None, :]
+
+    grid = scenario_grid(leverage, expense_ratio, financing_spread, start_dates, financing=financing_labels)
+    first = [0 if start is None else dates.searchsorted(pd.Timestamp(start)) for start in start_dates]
+    if max(first) >= len(dates):
+        raise ValueError('Start date after the last date of the returns')
+    # start date is the innermost level of the grid, financing the third
+    start_idx = np.tile(first, len(grid) // len(start_dates))
+    financing_idx = np.tile(np.repeat(np.arange(len(financing_labels)), len(financing_spread) * len(start_dates)),
+                            len(leverage) * len(expense_ratio))
+    grid['start_date'] = dates[start_idx]
+
+    elapsed_years = (dates[-1] - dates[start_idx]).days.to_numpy() / DAYS_PER_YEAR
+    rows = np.stack([grid['leverage'].to_numpy(dtype=np.float64), grid['expense_ratio'].to_numpy(dtype=np.float64),
+                     grid['financing_spread'].to_numpy(dtype=np.float64), financing_idx, start_idx, elapsed_years],
+                    axis=1)
+
+    return grid, financing, rows
+
+
+def sweep(dates: pd.DatetimeIndex, underlying_returns: np.ndarray,
+          financing: Union[np.ndarray, Mapping[str, np.ndarray]],
+          leverage: Sequence[float] = (1.0,), expense_ratio: Sequence[float] = (0.0,),
+          financing_spread: Sequence[float] = (0.0,), start_dates: Sequence = (None,),
+          starting_amount: float = 1.0, keep_paths: bool = True, chunk_size: int = 1024,
+          trading_days: int = AVG_TRADING_DAYS_PER_YEAR, day_count: int = AVG_TRADING_DAYS_PER_YEAR) -> SweepResult:
+    """
+    Simulates every combination of leverage, expense ratio, financing spread and start date at once,
+    from a single aligned return vector (see `LeveragedETFSimulator.align`).
+    :param dates: Dates of the aligned returns
+    :param underlying_returns: Daily returns of the underlying, as decimal
+    :param financing: Financing rate times day delta, as decimal; or a mapping of labels to such vectors
+                      (e.g. pre-aligned LIBOR, SOFR and stitched curves) to sweep over funding assumptions
+    :param leverage: Leverage multiples to sweep
+    :param expense_ratio: Annual expense ratios to sweep, as percentage (0 to 100)
+    :param financing_spread: Annual spreads over the financing rate to sweep, as percentage (0 to 100)
+    :param start_dates: Start dates to sweep (first trading day on or after each); None starts at the first date
+    :param starting_amount: NAV on each scenario's start date
+    :param keep_paths: Keep the full (scenarios, days) NAV matrix; turn off for large grids to only get metrics
+    :param chunk_size: Scenarios computed per block, bounds the temporary memory
+    :return: SweepResult
+    """
+    dates = pd.DatetimeIndex(dates)
+    underlying_returns = np.asarray(underlying_returns, dtype=np.float64)
+    n_days = len(dates)
+    grid, financing, rows = grid_rows(dates, financing, leverage, expense_ratio, financing_spread, start_dates)
+    day_delta = day_deltas(dates)
+
+    n_scenarios = len(grid)
+    paths = np.empty((n_scenarios, n_days)) if keep_paths else None
+    cagr = np.empty(n_scenarios)
+    max_drawdown = np.empty(n_scenarios)
+
+    for lo in range(0, n_scenarios, chunk_size):
+        hi = min(lo + chunk_size, n_scenarios)
+        nav, cagr[lo:hi], max_drawdown[lo:hi] = sweep_rows(underlying_returns, financing, day_delta, rows[lo:hi],
+                                                           starting_amount, trading_days, day_count)
+        if keep_paths:
+            paths[lo:hi] = nav
+
+    grid['cagr'] = cagr
+    grid['max_drawdown'] = max_drawdown
+    return SweepResult(scenarios=grid, paths=paths, dates=dates)
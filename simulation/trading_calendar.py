@@ -0,0 +1,106 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+
+def _as_days(dates) -> np.ndarray:
+    return pd.DatetimeIndex(dates).values.astype('datetime64[D]')
+
+
+class AlignedSeries:
+    """
+    Several series aligned on one calendar, stored as a single (series, days) float64 matrix
+
+    :param calendar: The common calendar
+    :param values: Matrix with one row per series, NaN where a series has no observation
+    :param names: Name of each row
+    """
+
+    def __init__(self, calendar: 'TradingCalendar', values: np.ndarray, names: List[str]):
+        self.calendar = calendar
+        self.values = values
+        self.names = names
+        self._rows = {name: i for i, name in enumerate(names)}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.values[self._rows[name]]
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        return self.calendar.index
+
+    def pct_change(self) -> np.ndarray:
+        """ Day-over-day change of every row, NaN on the first day """
+        changes = np.full_like(self.values, np.nan)
+        np.divide(self.values[:, 1:], self.values[:, :-1], out=changes[:, 1:])
+        changes[:, 1:] -= 1
+        return changes
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.values.T, index=self.dates, columns=self.names)
+
+
+class TradingCalendar:
+    """
+    Sorted, unique trading dates with O(log n) date -> position lookups,
+    used to align series once into contiguous arrays instead of joining pandas indexes repeatedly
+
+    :param dates: Trading dates (any order, duplicates are dropped)
+    """
+
+    def __init__(self, dates):
+        self.days = np.unique(_as_days(dates))
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.days)
+
+    @classmethod
+    def union(cls, *indexes) -> 'TradingCalendar':
+        """ Every date present in any of `indexes` """
+        return cls(np.concatenate([_as_days(i) for i in indexes]))
+
+    @classmethod
+    def intersection(cls, *indexes) -> 'TradingCalendar':
+        """ Only the dates present in all of `indexes` """
+        days = np.unique(_as_days(indexes[0]))
+        for index in indexes[1:]:
+            days = np.intersect1d(days, _as_days(index), assume_unique=False)
+        return cls(days)
+
+    def positions(self, dates) -> np.ndarray:
+        """ Position of each date in the calendar, -1 for dates not in it """
+        days = _as_days(dates)
+        pos = np.searchsorted(self.days, days)
+        found = pos < len(self.days)
+        found[found] = self.days[pos[found]] == days[found]
+        return np.where(found, pos, -1)
+
+    def take(self, series: pd.Series) -> np.ndarray:
+        """ Values of `series` on the calendar dates, NaN where it has none """
+        values = np.full(len(self.days), np.nan)
+        pos = self.positions(series.index)
+        found = pos >= 0
+        values[pos[found]] = series.to_numpy(dtype=np.float64)[found]
+        return values
+
+    @classmethod
+    def align(cls, how: str = 'inner', **series: pd.Series) -> AlignedSeries:
+        """
+        Aligns the given series on a calendar built from their dates, in a single pass per series
+        :param how: 'inner' keeps the dates all series share, 'outer' every date of any series
+        :param series: Series to align, by name
+        :return: AlignedSeries with one row per series, in keyword order
+        """
+        indexes = [s.index for s in series.values()]
+        calendar = cls.intersection(*indexes) if how == 'inner' else cls.union(*indexes)
+
+        values = np.empty((len(series), len(calendar)))
+        for i, s in enumerate(series.values()):
+            values[i] = calendar.take(s)
+
+        return AlignedSeries(calendar, values, list(series))
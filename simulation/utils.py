@@ -1,6 +1,12 @@
-from datetime import datetime
+from typing import TYPE_CHECKING
 
-import pandas as pd
+import numpy as np
+
+from .core import DAYS_PER_YEAR, compound  # noqa: F401 (compound re-exported)
+
+if TYPE_CHECKING:
+    # only for the annotations, the module stays NumPy-only at runtime
+    import pandas as pd
 
 
 def total_return(prices):
@@ -14,6 +20,12 @@ def drawdown(prices):
     return (rets.div(rets.cummax()) - 1) * 100
 
 
+def cagr(prices):
+    """ Calculates the Compound Annual Growth Rate (CAGR) of a stock with given prices, in percent """
+    delta = (prices.index[-1] - prices.index[0]).days / DAYS_PER_YEAR
+    return ((prices.iloc[-1] / prices.iloc[0]) ** (1 / delta) - 1) * 100
+
+
 def daily_return(prices, remove_first_date=False):
     """ Daily return """
     # returns = prices.pct_change(1) if in_percent else prices.diff(1)
@@ -21,41 +33,11 @@ def daily_return(prices, remove_first_date=False):
     return returns[1:] if remove_first_date else returns
 
 
-def compound_return(etf: pd.DataFrame, starting_amount: float = 1.0, base_col: str = 'Close') -> pd.DataFrame:
-    total_val = starting_amount
-    df = pd.DataFrame(index=etf.index)
-    df.loc[df.iloc[0], 'Investment'] = total_val
-
-    row_idx = 0
-    for index, _ in df.iterrows():
-        if row_idx != 0:
-            total_val = total_val + total_val * etf.loc[index, base_col]
-
-        # df.at[index, 'Investment'] = total_val
-        df.loc[index, 'Investment'] = total_val
-        row_idx += 1
-
-    return df
-
-
-def process_libor(csv_path: str) -> pd.Series:
-    """
-    Gets and Process LIBOR
-    :param csv_path: Path to CSV
-    # :param last_data_date: End date for LIBOR data
-    :return:
-    """
-    df_libor = pd.read_csv(csv_path, index_col='DATE')
-    df_libor = df_libor[df_libor['USD1MTD156N'] != '.'] # .loc[:last_data_date]
-    df_libor['USD1MTD156N'] = pd.to_numeric(df_libor['USD1MTD156N'])
-    df_libor.index = pd.to_datetime(df_libor.index)
-    df_libor = df_libor.rename(columns={'USD1MTD156N': 'LIBOR'})
-
-    # READ: https://pandas.pydata.org/pandas-docs/stable/user_guide/timeseries.html
-    # freq='B' for Business Offset
-    # column `Value`: (1 month LIBOR) * (Current date - previous date)/360
-    d_shifted = df_libor.index.shift(-1, freq='B')
-    df_libor_day_delta = pd.to_datetime(df_libor.index) - pd.to_datetime(d_shifted)
-    df_libor['Value'] = pd.concat([df_libor['LIBOR'] * abs(df_libor_day_delta.days)], axis=1)
-
-    return df_libor
+def compound_return(etf: 'pd.DataFrame', starting_amount: float = 1.0, base_col: str = 'Close',
+                    log_space: bool = False) -> 'pd.DataFrame':
+    """ Compounds the returns in `base_col` into an `Investment` column starting at `starting_amount` """
+    import pandas as pd
+
+    values = compound(etf[base_col].to_numpy(dtype=np.float64), starting_amount=starting_amount,
+                      log_space=log_space)
+    return pd.DataFrame({'Investment': values}, index=etf.index)
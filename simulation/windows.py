@@ -0,0 +1,114 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .core import DAYS_PER_YEAR
+
+
+def _next_high(nav: np.ndarray):
+    """
+    For each day, the next day at or above its value (n if none) and the lowest value until then,
+    with a monotonic stack in a single backward pass
+    """
+    n = len(nav)
+    next_high = np.full(n, n)
+    segment_low = nav.copy()
+    stack = []
+    for i in range(n - 1, -1, -1):
+        low = nav[i]
+        while stack and nav[stack[-1]] < nav[i]:
+            low = min(low, segment_low[stack.pop()])
+        if stack:
+            next_high[i] = stack[-1]
+        segment_low[i] = low
+        stack.append(i)
+    return next_high, segment_low
+
+
+def _range_min_table(nav: np.ndarray) -> list:
+    """ Sparse table: level k holds the minimum of every 2**k day range """
+    table = [nav]
+    while 2 ** len(table) <= len(nav):
+        half = 2 ** (len(table) - 1)
+        prev = table[-1]
+        table.append(np.minimum(prev[:-half], prev[half:]))
+    return table
+
+
+def _range_min(table: list, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """ Minimum of nav[lo:hi + 1], for arrays of ranges """
+    k = np.floor(np.log2(hi - lo + 1)).astype(np.intp)
+    out = np.empty(len(lo))
+    for level in np.unique(k):
+        m = k == level
+        out[m] = np.minimum(table[level][lo[m]], table[level][hi[m] - 2 ** level + 1])
+    return out
+
+
+def window_drawdowns(nav: np.ndarray, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """
+    Max drawdown (in percent) of nav[start:end + 1] for every (start, end) pair, in O((N + windows) log N).
+
+    From a start day, the running high stays at its value until the next day at or above it, so a window splits
+    into such segments along the chain of next highs; each full segment's drawdown is known from the stack pass
+    and the chain is walked by binary lifting, only the last, partial segment needs a range minimum.
+    """
+    n = len(nav)
+    next_high, segment_low = _next_high(nav)
+
+    # node n is a sentinel that jumps to itself
+    jump = [np.append(next_high, n)]
+    worst = [np.append(1 - segment_low / nav, 0.0)]
+    while 2 ** len(jump) <= n:
+        prev_jump, prev_worst = jump[-1], worst[-1]
+        jump.append(prev_jump[prev_jump])
+        worst.append(np.maximum(prev_worst, prev_worst[prev_jump]))
+
+    cur = np.asarray(start, dtype=np.intp).copy()
+    end = np.asarray(end, dtype=np.intp)
+    drawdown = np.zeros(len(cur))
+    for level in range(len(jump) - 1, -1, -1):
+        step = jump[level][cur] <= end
+        drawdown[step] = np.maximum(drawdown[step], worst[level][cur[step]])
+        cur[step] = jump[level][cur[step]]
+
+    partial = 1 - _range_min(_range_min_table(nav), cur, end) / nav[cur]
+    return -np.maximum(drawdown, partial) * 100
+
+
+def rolling_windows(nav, horizon: Optional[float] = None, dates=None) -> pd.DataFrame:
+    """
+    Outcome of entering on every possible start date, held for a fixed horizon or until the last date
+    (e.g. all 5-year windows since 1986), without re-simulating per start date
+    :param nav: NAV or prices of one path, as a Series or array
+    :param horizon: Holding period in years (ends on the last date at most that long after the start);
+                    None holds every window to the last date. Windows that would run past the data are left out
+    :param dates: Dates of `nav` (default the Series index)
+    :return: DataFrame indexed by start date: `end_date`, `total_return`, `cagr` and `max_drawdown` (in percent)
+    """
+    if isinstance(nav, pd.Series):
+        dates = nav.index if dates is None else dates
+    dates = pd.DatetimeIndex(dates)
+    nav = np.asarray(nav, dtype=np.float64)
+    n = len(nav)
+
+    start = np.arange(n)
+    if horizon is None:
+        end = np.full(n, n - 1)
+    else:
+        end_dates = dates + pd.Timedelta(days=round(horizon * DAYS_PER_YEAR))
+        end = dates.searchsorted(end_dates, side='right') - 1
+        complete = end_dates <= dates[-1]
+        start, end = start[complete], end[complete]
+    keep = end > start
+    start, end = start[keep], end[keep]
+
+    years = (dates[end] - dates[start]).days.to_numpy() / DAYS_PER_YEAR
+    growth = nav[end] / nav[start]
+    return pd.DataFrame({
+        'end_date': dates[end],
+        'total_return': (growth - 1) * 100,
+        'cagr': (growth ** (1 / years) - 1) * 100,
+        'max_drawdown': window_drawdowns(nav, start, end),
+    }, index=pd.Index(dates[start], name='start_date'))
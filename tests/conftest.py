@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+# the packages are used from the repository root, like `python -m simulation...`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def stock():
+    """ Factory of SMART-routed USD stock contracts """
+    from ibapi.contract import Contract
+
+    def make(symbol):
+        contract = Contract()
+        contract.symbol = symbol
+        contract.secType = 'STK'
+        contract.exchange = 'SMART'
+        contract.currency = 'USD'
+        return contract
+
+    return make
+
+
+@pytest.fixture
+def connect():
+    """ Connects `IBAPIApp`s to a gateway, disconnected at teardown """
+    from exchange.ib_api_connection import IBAPIApp
+
+    apps = []
+
+    def make(gateway, client_id=1, **options):
+        app = IBAPIApp(*gateway.address, client_id, **options)
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        app.disconnect()
+        app._thread.join(10)
+        app.tick_consumer.stop()
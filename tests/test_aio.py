@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('ibapi')
+
+from exchange.aio import AsyncIBApp  # noqa: E402
+from exchange.fake_gateway import FakeGateway, synthetic_ticks  # noqa: E402
+from exchange.request_manager import IBError  # noqa: E402
+
+DAYS = pd.bdate_range('2021-01-04', '2021-09-01')
+BARS = pd.DataFrame({'Close': np.arange(len(DAYS), dtype=float) + 100}, index=DAYS)
+
+
+def run(coroutine, timeout=30):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout))
+
+
+def test_requests_are_answered_concurrently_on_one_message_thread(stock):
+    async def session(gateway):
+        async with AsyncIBApp() as app:
+            await app.start(*gateway.address, client_id=1)
+            server_time, bars, more_bars = await asyncio.gather(
+                app.server_time(),
+                app.historical_bars(stock('TQQQ'), end='20210301 23:59:59', duration='1 M'),
+                app.historical_bars(stock('TQQQ'), duration='1 W'),
+            )
+            threads = [t for t in threading.enumerate() if t.name == 'ib-messages']
+            return server_time, bars, more_bars, len(threads), len(app.requests)
+
+    with FakeGateway(history={'TQQQ': BARS}, clock=lambda: 1630000000) as gateway:
+        server_time, bars, more_bars, threads, in_flight = run(session(gateway))
+
+    assert server_time == 1630000000
+    expected = BARS.loc['2021-02-02':'2021-03-01']
+    assert [bar.date for bar in bars] == expected.index.strftime('%Y%m%d').tolist()
+    assert [bar.close for bar in bars] == expected['Close'].tolist()
+    assert more_bars[-1].date == '20210901'
+    # a single message loop reads the socket, and every request was completed
+    assert threads == 1
+    assert in_flight == 0
+
+
+def test_unknown_symbol_raises_ib_error(stock):
+    async def session(gateway):
+        async with AsyncIBApp() as app:
+            await app.start(*gateway.address, client_id=1)
+            with pytest.raises(IBError) as history_error:
+                await app.historical_bars(stock('NOPE'), duration='1 M')
+            stream = await app.market_data(stock('NOPE'))
+            with pytest.raises(IBError) as stream_error:
+                async for _ in stream:
+                    pass
+            return history_error.value, stream_error.value
+
+    with FakeGateway(history={'TQQQ': BARS}) as gateway:
+        history_error, stream_error = run(session(gateway))
+    assert history_error.code == 162
+    assert stream_error.code == 200
+
+
+def test_streaming_subscription_is_cancelled_on_close(stock):
+    # a slow real-time replay that would run for over a minute
+    ticks = synthetic_ticks(20_000, interval=0.01)
+
+    async def session(gateway):
+        async with AsyncIBApp() as app:
+            await app.start(*gateway.address, client_id=1)
+            received = 0
+            async with await app.market_data(stock('TQQQ')) as stream:
+                async for batch in stream:
+                    received += len(batch)
+                    if received >= 10:
+                        break
+            req_id = stream.req_id
+            await asyncio.get_running_loop().run_in_executor(None, gateway.streams[0].stopped.wait, 5)
+            return received, req_id, req_id in app.requests, app._streams
+
+    with FakeGateway({'TQQQ': ticks}, speed=1.0) as gateway:
+        received, req_id, registered, streams = run(session(gateway))
+        stream = gateway.streams[0]
+        assert stream.stopped.is_set()
+        assert stream.req_id == req_id
+        assert stream.sent < len(stream.replay)
+    assert received >= 10
+    assert not registered
+    assert streams == {}
+
+
+def test_snapshot_stream_ends_after_the_snapshot(stock):
+    async def session(gateway):
+        async with AsyncIBApp() as app:
+            await app.start(*gateway.address, client_id=1)
+            stream = await app.market_data(stock('TQQQ'), snapshot=True)
+            return [batch async for batch in stream]
+
+    ticks = synthetic_ticks(1000)
+    with FakeGateway({'TQQQ': ticks}, speed=None) as gateway:
+        batches = run(session(gateway))
+    values = np.concatenate([batch.value for batch in batches])
+    np.testing.assert_array_equal(values, ticks.value[-2:])
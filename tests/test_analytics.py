@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation.analytics import METRICS, performance
+from simulation.core import AVG_TRADING_DAYS_PER_YEAR, DAYS_PER_YEAR
+
+DATES = pd.bdate_range('2015-01-01', periods=1500)
+
+
+def reference(path: pd.Series, risk_free: float) -> dict:
+    """ Metrics of one path, computed the straightforward way with pandas """
+    s = path.dropna()
+    returns = s.pct_change().dropna()
+    excess = returns - risk_free / 100 / AVG_TRADING_DAYS_PER_YEAR
+    years = (s.index[-1] - s.index[0]).days / DAYS_PER_YEAR
+    cagr = ((s.iloc[-1] / s.iloc[0]) ** (1 / years) - 1) * 100
+
+    peak = s.cummax()
+    drawdown = s / peak - 1
+    trough = drawdown.idxmin()
+    at_high = (s >= peak).loc[:trough]
+    recovered = s.loc[trough:].iloc[1:] >= peak[trough]
+
+    scale = np.sqrt(AVG_TRADING_DAYS_PER_YEAR)
+    return {
+        'cagr': cagr, 'max_drawdown': drawdown[trough] * 100,
+        'peak_date': at_high[at_high].index[-1], 'trough_date': trough,
+        'recovery_date': recovered.idxmax() if recovered.any() else pd.NaT,
+        'volatility': returns.std() * scale * 100,
+        'sharpe': excess.mean() / returns.std() * scale,
+        'sortino': excess.mean() / np.sqrt((excess.clip(upper=0) ** 2).mean()) * scale,
+        'calmar': cagr / -(drawdown[trough] * 100),
+        'ulcer_index': np.sqrt(((drawdown * 100) ** 2).mean()),
+    }
+
+
+def test_performance_matches_pandas_per_path():
+    rng = np.random.default_rng(0)
+    paths = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, (6, len(DATES))), axis=1))
+    paths[1, :250] = np.nan  # starts a year later
+    paths[2] = np.linspace(100, 200, len(DATES))  # never draws down
+    paths[3, 900:] = paths[3, 899] * 0.5  # crashes, never recovers
+
+    table = performance(paths, DATES, risk_free=2.0, chunk_size=4)
+    assert list(table.columns) == METRICS
+    for i in range(len(paths)):
+        with np.errstate(divide='ignore'):
+            expected = reference(pd.Series(paths[i], index=DATES), risk_free=2.0)
+        for name, value in expected.items():
+            if name.endswith('_date'):
+                assert table[name][i] == value or (pd.isna(value) and pd.isna(table[name][i])), (i, name)
+            elif i == 2 and name in ('sortino', 'calmar'):
+                continue  # no downside: division by zero
+            else:
+                assert table[name][i] == pytest.approx(value, rel=1e-9), (i, name)
+    assert table['max_drawdown'][2] == 0 and pd.isna(table['recovery_date'][3])
+
+
+def test_single_series_and_day_positions():
+    path = pd.Series(np.r_[np.nan, np.nan, 100, 110, 99, 121, 120], index=DATES[:7])
+    by_series = performance(path)
+    assert by_series['trough_date'][0] == DATES[4] and by_series['recovery_date'][0] == DATES[5]
+
+    # without dates the days are positions and years count trading days
+    by_position = performance(path.to_numpy())
+    assert (by_position['peak_date'][0], by_position['trough_date'][0], by_position['recovery_date'][0]) == (3, 4, 5)
+    years = 4 / AVG_TRADING_DAYS_PER_YEAR
+    assert by_position['cagr'][0] == pytest.approx(((120 / 100) ** (1 / years) - 1) * 100)
+    assert by_position['max_drawdown'][0] == pytest.approx(-10)
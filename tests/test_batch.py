@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation.batch import SharedArrays, batch_scenarios, batch_sweep
+from simulation.scenarios import FINANCING, BlockBootstrap, simulate_scenarios
+from simulation.sweep import sweep
+
+
+@pytest.fixture
+def market():
+    rng = np.random.default_rng(3)
+    dates = pd.bdate_range('2000-01-03', periods=1500)
+    returns = rng.normal(0.0004, 0.015, len(dates))
+    financing = np.full(len(dates), 0.02 / 360)
+    return dates, returns, financing
+
+
+GRID = dict(leverage=[1, 2, 3], expense_ratio=[0.5, 0.95], financing_spread=[0, 0.5],
+            start_dates=[None, '2001-06-01', '2003-01-02'])
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_batch_sweep_matches_the_serial_sweep(market, workers):
+    dates, returns, financing = market
+    expected = sweep(dates, returns, financing, keep_paths=False, **GRID).scenarios
+    actual = batch_sweep(dates, returns, financing, workers=workers, shard_size=5, chunk_size=4, **GRID)
+
+    pd.testing.assert_frame_equal(actual.drop(columns=['cagr', 'max_drawdown']),
+                                  expected.drop(columns=['cagr', 'max_drawdown']))
+    np.testing.assert_allclose(actual['cagr'], expected['cagr'], rtol=1e-12)
+    np.testing.assert_allclose(actual['max_drawdown'], expected['max_drawdown'], rtol=1e-12)
+
+
+def test_batch_sweep_over_financing_sources(market):
+    dates, returns, financing = market
+    sources = {'low': financing, 'high': financing * 3}
+    expected = sweep(dates, returns, sources, keep_paths=False, leverage=[2, 3]).scenarios
+    actual = batch_sweep(dates, returns, sources, workers=2, shard_size=1, leverage=[2, 3])
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_batch_scenarios_match_the_serial_run(market, workers):
+    dates, returns, financing = market
+    history = pd.DataFrame({'underlying': returns, FINANCING: financing}, index=dates)
+    generator = BlockBootstrap(history, block_size=10, seed=7)
+
+    expected = simulate_scenarios(generator, 250, 300, 'underlying', chunk_size=40)
+    actual = batch_scenarios(generator, 250, 300, 'underlying', chunk_size=40, workers=workers)
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_shared_arrays_round_trip():
+    arrays = {'a': np.arange(10.0), 'b': np.arange(6, dtype=np.int32).reshape(2, 3)}
+    with SharedArrays(**arrays) as shared:
+        attached, blocks = SharedArrays.attach(shared.specs)
+        for name, array in arrays.items():
+            np.testing.assert_array_equal(attached[name], array)
+            assert attached[name].dtype == array.dtype
+        del attached
+        for block in blocks:
+            block.close()
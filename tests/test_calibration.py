@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation.calibration import calibrate, calibration_data, model_returns, tracking_errors
+from simulation.leveraged_etf import LeveragedETFSimulator
+from simulation.rates import RateCurve
+
+
+@pytest.fixture(scope='module')
+def market():
+    rng = np.random.default_rng(4)
+    days = pd.date_range('2010-01-01', '2016-12-31')
+    curve = RateCurve(days, np.clip(2 + np.cumsum(rng.normal(0, 0.02, len(days))), 0.1, None), name='rate')
+    dates = pd.bdate_range('2010-02-01', '2016-12-30')
+    underlying = pd.Series(1000 * np.cumprod(1 + rng.normal(0.0004, 0.012, len(dates))), index=dates)
+    return underlying, curve
+
+
+def simulated_etf(underlying, curve, leverage, expense_ratio, spread):
+    nav = LeveragedETFSimulator(leverage=leverage, expense_ratio=expense_ratio, starting_amount=25.0).run(
+        underlying, curve.shifted(spread))['Investment']
+    return nav
+
+
+@pytest.mark.parametrize('objective', ['returns', 'nav'])
+def test_recovers_the_parameters_of_a_simulated_etf(market, objective):
+    underlying, curve = market
+    actual = simulated_etf(underlying, curve, 3.0, 0.95, 0.5)
+
+    fit = calibrate(underlying, actual, curve, objective=objective)
+    np.testing.assert_allclose([fit.leverage, fit.expense_ratio, fit.financing_spread], [3.0, 0.95, 0.5],
+                               rtol=1e-4, atol=1e-4)
+    np.testing.assert_allclose(fit.starting_amount, 25.0, rtol=1e-6)
+    assert fit.stats['tracking_error'] < 1e-6
+
+
+def test_fixed_parameters_are_kept(market):
+    underlying, curve = market
+    actual = simulated_etf(underlying, curve, 2.0, 0.9, 0.3)
+
+    fit = calibrate(underlying, actual, curve, expense_ratio=0.9)
+    assert fit.expense_ratio == 0.9
+    np.testing.assert_allclose([fit.leverage, fit.financing_spread], [2.0, 0.3], rtol=1e-6, atol=1e-6)
+
+    fit = calibrate(underlying, actual, curve, leverage=2.0, financing_spread=0.3)
+    assert (fit.leverage, fit.financing_spread) == (2.0, 0.3)
+    np.testing.assert_allclose(fit.expense_ratio, 0.9, rtol=1e-6)
+
+
+def test_tracking_error_surface_is_lowest_at_the_true_parameters(market):
+    underlying, curve = market
+    actual = simulated_etf(underlying, curve, 3.0, 0.95, 0.0)
+    data = calibration_data(underlying, actual, curve)
+
+    grid = np.array([[leverage, 0.95, 0.0] for leverage in (2.9, 2.95, 3.0, 3.05, 3.1)])
+    errors = tracking_errors(data, grid)
+    assert np.argmin(errors) == 2
+    assert model_returns(data, grid).shape == (5, len(data.dates))
+    np.testing.assert_allclose(model_returns(data, grid[2]), data.actual, atol=1e-12)
+
+
+def test_unknown_objective(market):
+    underlying, curve = market
+    with pytest.raises(ValueError):
+        calibrate(underlying, simulated_etf(underlying, curve, 3.0, 0.95, 0.0), curve, objective='prices')
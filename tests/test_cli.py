@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import simulation.batch
+import simulation.sweep
+from simulation.cli import load_config, run_scenario, scenario_specs
+
+YAML = """
+defaults:
+  financing: LIBOR
+  start: 1994-03-01
+scenarios:
+  - name: TQQQ
+    underlying: NASDAQ_COMPOSITE
+    leverage: [2, 3]
+"""
+
+TOML = """
+[defaults]
+financing = "LIBOR"
+start = "1994-03-01"
+
+[[scenarios]]
+name = "TQQQ"
+underlying = "NASDAQ_COMPOSITE"
+leverage = [2, 3]
+"""
+
+
+@pytest.mark.parametrize('suffix, text', [('.yaml', YAML), ('.toml', TOML)])
+def test_yaml_and_toml_configs_give_the_same_scenarios(tmp_path, suffix, text):
+    path = tmp_path / f'scenarios{suffix}'
+    path.write_text(text)
+    spec, = scenario_specs(load_config(str(path)))
+    assert spec['name'] == 'TQQQ'
+    assert spec['leverage'] == [2, 3]
+    assert spec['financing'] == 'LIBOR'
+    assert str(spec['start']) == '1994-03-01'
+
+
+def test_scenarios_need_an_underlying():
+    with pytest.raises(ValueError):
+        scenario_specs({'scenarios': [{'name': 'x'}]})
+
+
+def test_unknown_scenario_keys_are_rejected():
+    with pytest.raises(ValueError):
+        scenario_specs({'scenarios': [{'underlying': 'TQQQ', 'levrage': 3}]})
+
+
+@pytest.fixture
+def engine_calls(monkeypatch):
+    """ Counts the grid simulations of the batch and serial engines """
+    calls = {'batch_sweep': 0, 'sweep': 0}
+
+    def counted(module, name):
+        function = getattr(module, name)
+
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return function(*args, **kwargs)
+        monkeypatch.setattr(module, name, wrapper)
+
+    counted(simulation.batch, 'batch_sweep')
+    counted(simulation.sweep, 'sweep')
+    return calls
+
+
+SPEC = {'name': 'TQQQ', 'underlying': 'NASDAQ_COMPOSITE', 'start': '2010-01-01', 'end': '2012-12-31',
+        'leverage': [2, 3], 'expense_ratio': 0.95, 'start_dates': ['2010-02-01', '2011-06-01']}
+
+
+def test_paths_outputs_simulate_the_grid_once(engine_calls):
+    metrics_only = run_scenario(SPEC, {}, workers=1)
+    assert engine_calls == {'batch_sweep': 1, 'sweep': 0}
+
+    results = run_scenario(SPEC, {'performance': True, 'windows': 1, 'charts': True}, workers=1)
+    assert engine_calls == {'batch_sweep': 1, 'sweep': 1}
+
+    metrics = results['metrics']
+    assert len(metrics) == 4 and (metrics['scenario'] == 'TQQQ').all()
+    pd.testing.assert_frame_equal(metrics.drop(columns=['cagr', 'max_drawdown']),
+                                  metrics_only['metrics'].drop(columns=['cagr', 'max_drawdown']))
+    np.testing.assert_allclose(metrics['cagr'], metrics_only['metrics']['cagr'], rtol=1e-12)
+    np.testing.assert_allclose(results['performance']['cagr'], metrics['cagr'], rtol=1e-9)
+    assert len(results['charts']) == 2 * len(metrics)
@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation.core import compound
+from simulation.utils import compound_return
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('module', ['simulation', 'simulation.core', 'simulation.utils', 'simulation.cli'])
+def test_module_imports_numpy_only(module):
+    probe = f'import sys, {module}; print(",".join(m for m in ("pandas", "scipy", "matplotlib") if m in sys.modules))'
+    result = subprocess.run([sys.executable, '-c', probe], cwd=ROOT, check=True, capture_output=True, text=True)
+    assert result.stdout.strip() == ''
+
+
+@pytest.mark.parametrize('log_space', [False, True])
+def test_compound_return_matches_a_loop(log_space):
+    returns = np.random.default_rng(0).normal(0.0005, 0.02, 500)
+    returns[0] = np.nan  # the first day's return is never applied
+    etf = pd.DataFrame({'Close': returns}, index=pd.bdate_range('2020-01-01', periods=len(returns)))
+
+    expected = [1.5]
+    for r in returns[1:]:
+        expected.append(expected[-1] * (1 + r))
+    np.testing.assert_allclose(compound_return(etf, 1.5, log_space=log_space)['Investment'], expected, rtol=1e-9)
+    np.testing.assert_allclose(compound(returns, 1.5), expected, rtol=1e-12)
@@ -0,0 +1,104 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation import DATASET_DIR
+from simulation.datasets import MANIFEST_FILE, build, load, read_fred, read_investing, verify
+
+FRED = 'DATE,USD1MTD156N\n2021-01-04,0.14\n2021-01-05,.\n2021-01-06,0.13\n2021-01-07,0.12\n'
+
+
+@pytest.fixture
+def dataset_dir(tmp_path):
+    (tmp_path / 'USD1MTD156N.csv').write_text(FRED)
+    return str(tmp_path)
+
+
+def manifest_path(dataset_dir):
+    return os.path.join(dataset_dir, 'columnar', MANIFEST_FILE)
+
+
+def test_build_records_the_series(dataset_dir):
+    manifest = build(['USD1MTD156N'], dataset_dir=dataset_dir)
+    entry = manifest['USD1MTD156N']
+    assert (entry['rows'], entry['first'], entry['last']) == (4, '2021-01-04', '2021-01-07')
+    assert entry['columns'] == ['USD1MTD156N']
+    assert sorted(entry['files']) == ['USD1MTD156N.npy', 'date.npy']
+    with open(manifest_path(dataset_dir)) as f:
+        assert json.load(f) == manifest
+    assert verify(dataset_dir) == {'USD1MTD156N': []}
+
+
+def test_load_builds_once_and_matches_the_source(dataset_dir):
+    frame = load('USD1MTD156N', dataset_dir=dataset_dir)
+    expected = read_fred(os.path.join(dataset_dir, 'USD1MTD156N.csv'))
+    np.testing.assert_array_equal(frame.index, expected.index)
+    np.testing.assert_array_equal(frame['USD1MTD156N'], [0.14, np.nan, 0.13, 0.12])
+
+    stamp = os.stat(manifest_path(dataset_dir)).st_mtime_ns
+    load('USD1MTD156N', dataset_dir=dataset_dir, mmap=False)
+    assert os.stat(manifest_path(dataset_dir)).st_mtime_ns == stamp
+    with pytest.raises(KeyError):
+        load('NOPE', dataset_dir=dataset_dir)
+
+
+def test_verify_reports_tampered_files(dataset_dir):
+    build(['USD1MTD156N'], dataset_dir=dataset_dir)
+    with open(manifest_path(dataset_dir)) as f:
+        manifest = json.load(f)
+    manifest['USD1MTD156N']['files']['date.npy'] = '0' * 64
+    with open(manifest_path(dataset_dir), 'w') as f:
+        json.dump(manifest, f)
+    assert verify(dataset_dir) == {'USD1MTD156N': ['date.npy']}
+
+    column = os.path.join(dataset_dir, 'columnar', 'USD1MTD156N', 'USD1MTD156N.npy')
+    np.save(column, np.zeros(4))
+    with open(os.path.join(dataset_dir, 'USD1MTD156N.csv'), 'a') as f:
+        f.write('2021-01-08,0.11\n')
+    assert verify(dataset_dir) == {'USD1MTD156N': ['USD1MTD156N.csv', 'USD1MTD156N.npy', 'date.npy']}
+
+    # the changed source is converted again on load
+    frame = load('USD1MTD156N', dataset_dir=dataset_dir)
+    assert frame.index[-1] == pd.Timestamp('2021-01-08') and frame['USD1MTD156N'].iloc[0] == 0.14
+    assert verify(dataset_dir) == {'USD1MTD156N': []}
+
+
+INVESTING = ('\ufeff"Date","Price","Open","High","Low","Vol.","Change %"\n'
+             '"Sep 16, 2021","1,047.45","1,045.83","1,048.10","1,043.25","963.64K","-1.30%"\n'
+             '"Sep 15, 2021","29.99","30.31","30.38","29.60","1.10M","1,000.50%"\n'
+             '"Sep 03, 2021","29.29","29.10","29.35","29.04","2.5B","0.00%"\n'
+             '"Dec 31, 2020","30.00","30.00","30.00","30.00","-","-"\n'
+             '"Jan 02, 2020","31.00","31.00","31.00","31.00","750","1.91%"\n')
+
+
+def test_read_investing_decodes_the_export(tmp_path):
+    path = tmp_path / 'TMF.csv'
+    path.write_text(INVESTING, encoding='utf-8')
+    frame = read_investing(str(path))
+
+    assert list(frame.columns) == ['Close', 'Open', 'High', 'Low', 'Volume', 'Change %']
+    assert (frame.dtypes == np.float64).all()
+    # oldest first
+    assert list(frame.index) == list(pd.to_datetime(['2020-01-02', '2020-12-31', '2021-09-03', '2021-09-15',
+                                                     '2021-09-16']))
+    np.testing.assert_array_equal(frame['Close'], [31.0, 30.0, 29.29, 29.99, 1047.45])
+    np.testing.assert_allclose(frame['Volume'], [750, np.nan, 2.5e9, 1.1e6, 963.64e3])
+    np.testing.assert_allclose(frame['Change %'], [1.91, np.nan, 0.0, 1000.5, -1.3])
+
+
+def test_read_investing_rejects_other_date_formats(tmp_path):
+    path = tmp_path / 'TMF.csv'
+    path.write_text(INVESTING.replace('"Sep 03, 2021"', '"2021-09-03 "'), encoding='utf-8')
+    with pytest.raises(ValueError):
+        read_investing(str(path))
+
+
+def test_bundled_investing_exports():
+    tqqq = load('TQQQ', mmap=False)
+    source = read_investing(os.path.join(DATASET_DIR, 'TQQQ.csv'))
+    assert tqqq.index.is_monotonic_increasing
+    np.testing.assert_array_equal(tqqq.to_numpy(), source.to_numpy())
+    assert tqqq.loc['2021-09-16', 'Volume'] == 26.29e6
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation.drawdowns import DrawdownIndex
+
+
+def naive_episodes(paths, dates):
+    """ Peak -> trough -> recovery episodes found day by day """
+    rows = []
+    for p, path in enumerate(paths):
+        peak, peak_day, episode = -np.inf, None, None
+        for day, value in enumerate(path):
+            if np.isnan(value):
+                continue
+            if value >= peak:
+                if episode is not None:
+                    rows.append({**episode, 'recovery_date': dates[day]})
+                    episode = None
+                peak, peak_day = value, day
+                continue
+            depth = (value / peak - 1) * 100
+            if episode is None:
+                episode = {'path': p, 'peak_date': dates[peak_day], 'trough_date': dates[day], 'depth': depth}
+            elif depth < episode['depth']:
+                episode.update(trough_date=dates[day], depth=depth)
+        if episode is not None:
+            rows.append({**episode, 'recovery_date': pd.NaT})
+    return pd.DataFrame(rows, columns=['path', 'peak_date', 'trough_date', 'recovery_date', 'depth'])
+
+
+@pytest.fixture
+def random_paths():
+    rng = np.random.default_rng(12)
+    paths = np.cumprod(1 + rng.normal(0.0003, 0.02, (20, 600)), axis=1)
+    paths[3, :50] = np.nan  # path starting later, as in a sweep
+    paths[5] = np.round(paths[5], 1)  # ties with the peak
+    return paths, pd.bdate_range('2000-01-03', periods=paths.shape[1])
+
+
+def test_episodes_match_a_daily_loop(random_paths):
+    paths, dates = random_paths
+    index = DrawdownIndex(paths, dates)
+    expected = naive_episodes(paths, dates)
+
+    actual = index.episodes[expected.columns].reset_index(drop=True)
+    assert len(actual) == len(expected)
+    np.testing.assert_array_equal(actual['path'], expected['path'])
+    for column in ('peak_date', 'trough_date', 'recovery_date'):
+        assert pd.DatetimeIndex(actual[column]).equals(pd.DatetimeIndex(expected[column])), column
+    np.testing.assert_allclose(actual['depth'], expected['depth'])
+
+
+def test_queries_match_sorting_the_episodes(random_paths):
+    paths, dates = random_paths
+    index = DrawdownIndex(paths, dates)
+    episodes = index.episodes
+
+    deepest = episodes.sort_values('depth', kind='mergesort')
+    pd.testing.assert_frame_equal(index.top(5), deepest.head(5))
+    pd.testing.assert_frame_equal(index.top(3, path=2), deepest[deepest['path'] == 2].head(3))
+    long = index.longer_than('180D')
+    assert (long['duration'] > pd.Timedelta('180D')).all()
+    assert len(long) == (episodes['duration'] > pd.Timedelta('180D')).sum()
+    np.testing.assert_allclose(index.worst()['depth'], episodes.groupby('path')['depth'].min())
+
+
+def test_single_series_and_open_episode():
+    dates = pd.bdate_range('2021-01-04', periods=6)
+    series = pd.Series([1.0, 2.0, 1.5, 2.5, 2.0, 1.0], index=dates)
+    episodes = DrawdownIndex(series).episodes
+
+    assert len(episodes) == 2
+    assert episodes['recovered'].tolist() == [True, False]
+    assert episodes['recovery_date'].iloc[0] == dates[3]
+    assert episodes['trough_date'].iloc[1] == dates[5]
+    np.testing.assert_allclose(episodes['depth'], [-25.0, -60.0])
@@ -0,0 +1,126 @@
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip('ibapi')
+
+from ibapi.message import OUT  # noqa: E402
+from ibapi.server_versions import MAX_CLIENT_VER  # noqa: E402
+from ibapi.ticktype import TickTypeEnum  # noqa: E402
+
+from exchange.fake_gateway import NO_SECURITY, FakeGateway, TickReplay, synthetic_ticks  # noqa: E402
+from exchange.request_manager import IBError  # noqa: E402
+from exchange.ticks import PRICE, SIZE, TickBatch, save_ticks  # noqa: E402
+
+
+def recording(trades=2000, seed=0):
+    """ Quotes and trades as IBAPIApp records them: sized prices followed by their size, and volume ticks """
+    rng = np.random.default_rng(seed)
+    last = synthetic_ticks(2 * trades, seed=seed)
+    bid = np.round(last.value[0::2] - 0.01 * rng.integers(1, 5, trades), 2)
+    rows = []
+    for i in range(trades):
+        rows += [(TickTypeEnum.BID, PRICE, bid[i]), (TickTypeEnum.BID_SIZE, SIZE, 100 * (i % 7 + 1)),
+                 (TickTypeEnum.LAST, PRICE, last.value[2 * i]), (TickTypeEnum.LAST_SIZE, SIZE, last.value[2 * i + 1]),
+                 (TickTypeEnum.VOLUME, SIZE, 1000 + i)]
+    tick_type, kind, value = (np.array(column) for column in zip(*rows))
+    return TickBatch(np.zeros(len(rows), np.int32), tick_type.astype(np.int16), kind.astype(np.int8),
+                     value.astype(np.float64), np.arange(len(rows), dtype=np.int64) * 1000)
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.mark.parametrize('suffix', ['.npz', '.csv'])
+def test_recorded_ticks_are_replayed_tick_for_tick(connect, stock, tmp_path, suffix):
+    recorded = recording()
+    path = str(tmp_path / ('ticks' + suffix))
+    if suffix == '.npz':
+        save_ticks(path, recorded)
+    else:
+        np.savetxt(path, np.column_stack([recorded.tick_type, recorded.kind, recorded.value, recorded.timestamp]),
+                   fmt=['%d', '%d', '%.17g', '%d'], delimiter=',', header='tick_type,kind,value,timestamp',
+                   comments='')
+
+    with FakeGateway({'TQQQ': path}, speed=None) as gateway:
+        app = connect(gateway, tick_capacity=1 << 12)
+        subscription = app.request_market_data(stock('TQQQ'))
+        assert wait_for(lambda: app.tick_consumer.consumed >= len(recorded))
+        app.cancel_market_data(subscription.req_id)
+        stream = gateway.streams[0]
+        assert wait_for(stream.done.is_set)
+        replay = gateway.replay('TQQQ')
+
+    app.tick_consumer.stop()
+    received = app.tick_consumer.take()
+    # bid and last travel with their size in one message
+    assert len(replay) == 3 * len(recorded) // 5 == stream.sent
+    assert replay.n_ticks == len(recorded)
+    assert app.tick_consumer.stats()['dropped'] == 0
+    assert not subscription.done
+    np.testing.assert_array_equal(received.req_id, subscription.req_id)
+    for column in ('tick_type', 'kind', 'value'):
+        np.testing.assert_array_equal(getattr(received, column), getattr(recorded, column))
+
+
+def test_replay_merges_only_sizes_following_their_price():
+    ticks = TickBatch(np.zeros(5, np.int32),
+                      np.array([TickTypeEnum.ASK, TickTypeEnum.ASK_SIZE, TickTypeEnum.ASK_SIZE, TickTypeEnum.LAST,
+                                -1], np.int16),
+                      np.array([PRICE, SIZE, SIZE, PRICE, PRICE], np.int8), np.array([10.5, 200, 300, 10.4, 0]),
+                      np.array([0, 5, 10, 2000, 3000], np.int64))
+    replay = TickReplay(ticks)
+    assert replay.n_ticks == 4  # the negative marker is dropped
+    np.testing.assert_array_equal(replay.ticks_per_message, [2, 1, 1])
+    np.testing.assert_array_equal(replay.size, [200, 0, 0])
+    np.testing.assert_array_equal(replay.due_ns, [0, 10, 2000])
+
+
+def test_handshake_and_server_time(connect):
+    with FakeGateway(clock=lambda: 1600000000.5) as gateway:
+        app = connect(gateway)
+        assert app.isConnected()
+        assert app.serverVersion() == MAX_CLIENT_VER
+        assert app.obtain_server_time() == 1600000000
+        assert wait_for(lambda: gateway.stats()['connections'] == 1)
+
+    assert gateway.received[OUT.START_API] == 1
+    assert gateway.received[OUT.REQ_CURRENT_TIME] == 1
+
+
+@pytest.mark.parametrize('server_version', [MAX_CLIENT_VER, 130])
+def test_contract_details_round_trip(connect, stock, server_version):
+    ticks = synthetic_ticks(10)
+    with FakeGateway({'TQQQ': ticks, 'UPRO': ticks}, server_version=server_version) as gateway:
+        app = connect(gateway)
+        details, = app.request_contract_details(stock('UPRO'))
+        other, = app.request_contract_details(stock('TQQQ'))
+
+    assert app.serverVersion() == server_version
+    contract = details.contract
+    assert (contract.symbol, contract.secType, contract.exchange, contract.currency) == ('UPRO', 'STK', 'SMART', 'USD')
+    assert contract.conId == 2 and other.contract.conId == 1
+    assert details.longName == 'UPRO' and details.minTick == 0.01
+    assert details.stockType == ('ETF' if server_version == MAX_CLIENT_VER else '')
+    assert len(app.requests) == 0
+
+
+def test_unknown_symbol_is_an_error(connect, stock):
+    with FakeGateway({'TQQQ': synthetic_ticks(10)}) as gateway:
+        app = connect(gateway)
+        with pytest.raises(IBError) as details_error:
+            app.request_contract_details(stock('NOPE'))
+        subscription = app.request_market_data(stock('NOPE'))
+        with pytest.raises(IBError) as market_data_error:
+            subscription.wait(10)
+        # the errors reached their requests, not the error queue
+        assert not app.is_error()
+
+    assert details_error.value.code == market_data_error.value.code == NO_SECURITY
+    assert market_data_error.value.req_id == subscription.req_id
+    assert gateway.streams == []
@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('ibapi')
+
+from exchange.fake_gateway import FakeGateway  # noqa: E402
+from exchange.history import CHUNK_DURATIONS, HistoricalDownloader, chunk_ends  # noqa: E402
+from simulation.price_cache import PriceCache  # noqa: E402
+
+DAYS = pd.bdate_range('2018-01-02', '2021-12-31')
+
+
+def daily_bars(seed=0):
+    close = 100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.01, len(DAYS))))
+    return pd.DataFrame({'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close,
+                         'Volume': np.arange(len(DAYS)) * 100}, index=DAYS)
+
+
+HISTORY = {'TQQQ': daily_bars(0), 'UPRO': daily_bars(1)}
+
+
+def fast_downloader(apps, cache_dir, **options):
+    return HistoricalDownloader(apps, retry_delay=0.2, timeout=10, cache_dir=cache_dir, **options)
+
+
+def test_chunk_ends_cover_the_range():
+    # the year up to 2020-02-16 already reaches back before 2019-03-01
+    assert chunk_ends('2019-03-01', '2021-02-15') == [('20210215 23:59:59', '1 Y'), ('20200216 23:59:59', '1 Y')]
+    assert chunk_ends('2019-02-16', '2021-02-15') == [
+        ('20210215 23:59:59', '1 Y'), ('20200216 23:59:59', '1 Y'), ('20190216 23:59:59', '1 Y')]
+    assert chunk_ends('2021-02-15', '2021-02-15') == [('20210215 23:59:59', '1 Y')]
+    assert chunk_ends('2021-02-16', '2021-02-15') == []
+
+    # intraday chunks of one session skip the weekend: Mon 8th to Mon 15th
+    minutes = chunk_ends('2021-02-08', '2021-02-15 16:00', '1 min')
+    assert [end[:8] for end, _ in minutes] == ['20210215', '20210212', '20210211', '20210210', '20210209',
+                                               '20210208']
+    assert {duration for _, duration in minutes} == {'1 D'}
+    assert chunk_ends('2021-02-01', '2021-02-15', '5 mins') == [
+        ('20210215 23:59:59', '1 W'), ('20210208 23:59:59', '1 W'), ('20210201 23:59:59', '1 W')]
+
+    with pytest.raises(ValueError):
+        chunk_ends('2021-01-01', '2021-02-01', '7 mins')
+    assert set(CHUNK_DURATIONS) >= {'1 min', '1 hour', '1 day'}
+
+
+def test_request_historical_data(connect, stock):
+    minutes = pd.date_range('2021-02-12 14:30', '2021-02-12 21:00', freq='min', inclusive='left')
+    intraday = pd.DataFrame({'Close': np.linspace(100, 101, len(minutes))}, index=minutes)
+    with FakeGateway(history={'TQQQ': HISTORY['TQQQ'], 'MIN': intraday}) as gateway:
+        app = connect(gateway)
+        daily = app.request_historical_data(stock('TQQQ'), end='20210131 23:59:59', duration='1 M').wait()
+        bars = app.request_historical_data(stock('MIN'), end='20210212 23:59:59', duration='1 D',
+                                           bar_size='1 min', format_date=2).wait()
+        missing = app.request_historical_data(stock('NOPE'), duration='1 M')
+        with pytest.raises(Exception) as error:
+            missing.wait()
+
+    expected = HISTORY['TQQQ'].loc['2021-01-01':'2021-01-31']
+    assert [bar.date for bar in daily] == expected.index.strftime('%Y%m%d').tolist()
+    assert [bar.close for bar in daily] == expected['Close'].tolist()
+    assert [int(bar.volume) for bar in daily] == expected['Volume'].tolist()
+    # intraday bars in unix seconds
+    assert [int(bar.date) for bar in bars] == ((minutes - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).tolist()
+    assert [bar.close for bar in bars] == intraday['Close'].tolist()
+    assert error.value.code == 162
+    assert len(app.requests) == 0
+
+
+def test_backfill_stores_only_the_missing_bars(connect, stock, tmp_path):
+    cache_dir = str(tmp_path)
+    contracts = {symbol: stock(symbol) for symbol in HISTORY}
+    with FakeGateway(history=HISTORY) as gateway:
+        downloader = fast_downloader([connect(gateway, 1), connect(gateway, 2)], cache_dir)
+        paths = downloader.backfill(contracts, '2019-01-01', '2020-12-31')
+        first_requests = gateway.stats()['historical_requests']
+
+        # extends the tail of TQQQ only; UPRO is already up to date
+        again = downloader.backfill({'TQQQ': contracts['TQQQ']}, '2019-01-01', '2021-06-30')
+        upro = downloader.backfill({'UPRO': contracts['UPRO']}, '2019-06-01', '2020-06-30')
+        requests = gateway.stats()['historical_requests'] - first_requests
+
+    store = PriceCache(cache_dir, offline=True)
+    assert paths == {symbol: store.path(symbol, 'ib') for symbol in HISTORY}
+    assert again == {'TQQQ': paths['TQQQ']} and upro == {'UPRO': paths['UPRO']}
+    assert all(os.path.exists(path) for path in paths.values())
+    assert first_requests == 2 * len(chunk_ends('2019-01-01', '2020-12-31'))
+    assert requests == len(chunk_ends('2021-01-01', '2021-06-30'))
+
+    for symbol, last in (('TQQQ', '2021-06-30'), ('UPRO', '2020-12-31')):
+        stored = store.get(symbol, '2019-01-01', '2021-12-31', source='ib')
+        expected = HISTORY[symbol].loc['2019-01-01':last]
+        assert len(stored) == len(expected)
+        np.testing.assert_array_equal(stored.index, expected.index)
+        np.testing.assert_allclose(stored['Close'], expected['Close'])
+        np.testing.assert_allclose(stored['Volume'], expected['Volume'])
+    assert downloader.stats['bars'] > 0 and downloader.stats['retries'] == 0
+
+
+def test_pacing_violations_are_retried(connect, stock, tmp_path):
+    # the gateway rejects more than 2 requests per second
+    with FakeGateway(history=HISTORY, pacing=(2, 1.0)) as gateway:
+        downloader = fast_downloader([connect(gateway)], str(tmp_path), in_flight=3, retries=20)
+        frame = downloader.download(stock('TQQQ'), '2018-01-01', '2021-12-31')
+
+    assert downloader.stats['retries'] > 0
+    assert downloader.stats['requests'] == len(chunk_ends('2018-01-01', '2021-12-31')) + downloader.stats['retries']
+    np.testing.assert_allclose(frame['Close'], HISTORY['TQQQ']['Close'])
+
+
+def test_download_without_store(connect, stock, tmp_path):
+    contracts = {symbol: stock(symbol) for symbol in HISTORY}
+    contracts['NOPE'] = stock('NOPE')
+    with FakeGateway(history=HISTORY) as gateway:
+        frames = connect(gateway).download_history(contracts, '2020-03-01', '2020-03-31', store=False,
+                                                   cache_dir=str(tmp_path), retry_delay=0.2)
+
+    assert os.listdir(str(tmp_path)) == []
+    assert set(frames) == set(contracts)
+    assert frames['NOPE'].empty
+    for symbol in HISTORY:
+        expected = HISTORY[symbol].loc['2020-03-01':'2020-03-31']
+        np.testing.assert_array_equal(frames[symbol].index, expected.index)
+        np.testing.assert_allclose(frames[symbol]['Open'], expected['Open'])
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation.leveraged_etf import daily_leveraged_etf
+
+DAYS = pd.bdate_range('2020-01-01', periods=300)
+
+
+def baseline(etf_prices: pd.DataFrame, daily_libor: pd.Series, starting_amount, leverage, expense_ratio):
+    """ The original pandas implementation: lev_return - ER/252 - (L-1)*libor/252, compounded row by row """
+    daily_libor = daily_libor / 100
+    dly_return = etf_prices.pct_change(fill_method=None)[1:]
+    dly_return = dly_return[dly_return.index.isin(daily_libor.index)]
+    lev_etf = dly_return * leverage - expense_ratio / 100 / 252
+    lev_etf = lev_etf.subtract((leverage - 1) * daily_libor / 252, axis=0).dropna()
+
+    nav, total = [], starting_amount
+    for i, r in enumerate(lev_etf['Close']):
+        if i:
+            total = total + total * r
+        nav.append(total)
+    lev_etf['Investment'] = nav
+    return lev_etf
+
+
+@pytest.mark.parametrize('leverage, expense_ratio', [(3, 0.95), (2, 0.2), (1, 0.0)])
+def test_matches_the_baseline_formula(leverage, expense_ratio):
+    rng = np.random.default_rng(leverage)
+    prices = pd.DataFrame({'Close': 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(DAYS))))}, index=DAYS)
+    prices.iloc[:5] = np.nan  # the underlying starts later
+    prices.iloc[40] = np.nan
+    # financing on fewer days than the prices, with a weekend accrual
+    libor = pd.Series(rng.uniform(0.1, 2.0, len(DAYS)) * np.where(DAYS.dayofweek == 0, 3, 1), index=DAYS)
+    libor = libor.drop(DAYS[[10, 11, 120]])
+
+    simulated = daily_leveraged_etf(prices, libor, starting_amount=1.5, leverage=leverage,
+                                    expense_ratio=expense_ratio)
+    expected = baseline(prices, libor, 1.5, leverage, expense_ratio)
+
+    assert list(simulated.columns) == ['Close', 'Investment']
+    assert simulated.index.equals(expected.index)
+    np.testing.assert_allclose(simulated['Close'], expected['Close'], rtol=1e-12, atol=1e-15)
+    np.testing.assert_allclose(simulated['Investment'], expected['Investment'], rtol=1e-12)
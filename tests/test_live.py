@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation.leveraged_etf import LeveragedETFSimulator
+from simulation.live import LiveLeveragedETF
+from simulation.rates import RateCurve
+
+DAYS = pd.bdate_range('2021-01-04', '2021-12-31')
+DAYS = DAYS[~DAYS.isin(pd.to_datetime(['2021-01-18', '2021-07-05', '2021-12-24']))]  # market holidays
+PRICES = pd.Series(100 * np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.02, len(DAYS)))), index=DAYS)
+FIXINGS = pd.bdate_range('2020-12-01', '2021-12-31')
+CURVE = RateCurve(FIXINGS, np.linspace(0.15, 0.5, len(FIXINGS)), name='test')
+SIMULATOR = LeveragedETFSimulator(leverage=3, expense_ratio=0.95, trading_cost=0.02)
+
+
+def test_catch_up_continues_the_full_simulation():
+    full = SIMULATOR.run(PRICES, CURVE)
+
+    live = LiveLeveragedETF.from_history(SIMULATOR, PRICES.loc[:'2021-06-30'], CURVE)
+    assert live.last_date == pd.Timestamp('2021-06-30')
+    assert live.nav == pytest.approx(full.loc['2021-06-30', 'Investment'], rel=1e-12)
+
+    navs = [live.update(date, price, CURVE) for date, price in PRICES.loc['2021-07-01':'2021-09-30'].items()]
+    np.testing.assert_allclose(navs, full.loc['2021-07-01':'2021-09-30', 'Investment'], rtol=1e-12)
+    # bars already applied are ignored
+    assert live.catch_up(PRICES, CURVE) == pytest.approx(full['Investment'].iloc[-1], rel=1e-12)
+    assert live.last_date == DAYS[-1]
+
+    nav = full['Investment'].to_numpy()
+    peak = np.maximum.accumulate(nav)
+    assert live.peak == pytest.approx(peak[-1], rel=1e-12)
+    assert live.max_drawdown == pytest.approx(((nav / peak).min() - 1) * 100, rel=1e-9)
+    assert live.drawdown == pytest.approx((nav[-1] / peak[-1] - 1) * 100, rel=1e-9)
+
+
+def test_constant_rate_matches_its_flat_curve():
+    flat = RateCurve(FIXINGS, np.full(len(FIXINGS), 0.25))
+    start = LiveLeveragedETF.from_history(SIMULATOR, PRICES.loc[:'2021-03-31'], flat)
+    by_rate = LiveLeveragedETF.from_dict(start.to_dict()).catch_up(PRICES, 0.25)
+    assert by_rate == pytest.approx(start.catch_up(PRICES, flat), rel=1e-12)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    live = LiveLeveragedETF.from_history(SIMULATOR, PRICES.loc[:'2021-06-30'], CURVE)
+    path = str(tmp_path / 'tqqq.json')
+    live.save(path)
+    loaded = LiveLeveragedETF.load(path)
+
+    assert loaded.to_dict() == live.to_dict()
+    assert vars(loaded.simulator) == vars(SIMULATOR)
+    assert loaded.catch_up(PRICES, CURVE) == live.catch_up(PRICES, CURVE)
+    assert not (tmp_path / 'tqqq.json.tmp').exists()
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation.portfolio import TransactionCosts, backtest, rebalance_days
+
+
+def loop_backtest(prices, weights, scheduled, band, rate, starting_amount=1.0):
+    """ Day by day: hold the shares, rebalance on scheduled days when the band is breached """
+    values = prices.to_numpy()
+    weights = np.asarray(weights)
+    shares = weights * starting_amount / values[0]
+    nav, drifted, events, turnover = [starting_amount], [weights], [], []
+    for day in range(1, len(values)):
+        value = shares @ values[day]
+        current = shares * values[day] / value
+        if day in scheduled and (band is None or np.abs(current - weights).max() > band):
+            traded = np.abs(current - weights).sum()
+            value *= 1 - rate * traded
+            shares = weights * value / values[day]
+            current = weights
+            events.append(day)
+            turnover.append(traded)
+        nav.append(value)
+        drifted.append(current)
+    return np.array(nav), np.array(drifted), events, np.array(turnover)
+
+
+@pytest.fixture
+def prices():
+    rng = np.random.default_rng(8)
+    dates = pd.bdate_range('2005-01-03', periods=1300)
+    returns = rng.normal([0.001, 0.0002, 0.0004], [0.04, 0.015, 0.01], (len(dates), 3))
+    return pd.DataFrame(np.cumprod(1 + returns, axis=0) * [50, 20, 100], index=dates, columns=['A', 'B', 'C'])
+
+
+@pytest.mark.parametrize('rebalance, band', [('daily', None), ('weekly', None), ('monthly', None),
+                                             ('quarterly', 0.02), ('yearly', None), (None, 0.05), (None, None),
+                                             ('monthly', 0.1)])
+def test_backtest_matches_a_daily_loop(prices, rebalance, band):
+    weights = [0.5, 0.3, 0.2]
+    costs = TransactionCosts(commission=0.05, slippage=0.1)
+    result = backtest(prices, weights, rebalance=rebalance, band=band, costs=costs, starting_amount=2.0)
+
+    frequency = 'daily' if rebalance is None and band is not None else rebalance
+    scheduled = set(rebalance_days(prices.index, frequency).tolist())
+    nav, drifted, events, turnover = loop_backtest(prices, weights, scheduled, band, costs.rate, 2.0)
+
+    np.testing.assert_allclose(result.nav.to_numpy(), nav, rtol=1e-12)
+    np.testing.assert_allclose(result.weights.to_numpy(), drifted, rtol=1e-10, atol=1e-12)
+    assert result.rebalances.equals(prices.index[events])
+    np.testing.assert_allclose(result.turnover, turnover, rtol=1e-10)
+
+
+@pytest.mark.parametrize('frequency, rule', [('weekly', 'W'), ('monthly', 'M'), ('quarterly', 'Q'), ('yearly', 'Y')])
+def test_rebalance_days_are_the_last_day_of_each_period(prices, frequency, rule):
+    dates = prices.index
+    periods = dates.to_period(rule)
+    last_days = pd.Series(np.arange(len(dates)), index=dates).groupby(periods).max().to_numpy()[:-1]
+    np.testing.assert_array_equal(rebalance_days(dates, frequency), last_days)
+
+
+def test_backtest_rejects_bad_weights(prices):
+    with pytest.raises(ValueError):
+        backtest(prices, [0.5, 0.5])
+    with pytest.raises(ValueError):
+        backtest(prices, [0.5, 0.3, 0.3])
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation.columnar import read_meta, read_table, write_table
+from simulation.price_cache import PriceCache
+
+DAYS = pd.bdate_range('2020-01-01', '2020-12-31')
+PRICES = pd.DataFrame({'Close': np.linspace(100, 200, len(DAYS)), 'Adj Close': np.linspace(90, 180, len(DAYS))},
+                      index=pd.DatetimeIndex(DAYS, name='Date'))
+
+
+def assert_same(frame, expected):
+    # dates compare by value whatever their resolution
+    pd.testing.assert_frame_equal(frame, expected, check_freq=False, check_index_type=False)
+
+
+class StubReader:
+    """ Serves `PRICES` and records the requested ranges """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, symbol, source, start, end):
+        self.calls.append((symbol, source, start, end))
+        # like the readers, with a time of day the cache normalizes away
+        frame = PRICES.loc[start:end].copy()
+        frame.index = frame.index + pd.Timedelta(hours=16)
+        return frame
+
+
+def test_only_the_missing_head_and_tail_are_fetched(tmp_path):
+    reader = StubReader()
+    cache = PriceCache(str(tmp_path), fetch=reader)
+
+    first = cache.get('SPY', '2020-03-01', '2020-06-30')
+    assert_same(first, PRICES.loc['2020-03-01':'2020-06-30'])
+    assert reader.calls == [('SPY', 'yahoo', pd.Timestamp('2020-03-01'), pd.Timestamp('2020-06-30'))]
+
+    # inside the stored range: served locally
+    inside = cache.get('SPY', '2020-04-01', '2020-05-31')
+    assert len(reader.calls) == 1
+    assert_same(inside, PRICES.loc['2020-04-01':'2020-05-31'])
+
+    wider = cache.get('SPY', '2020-01-15', '2020-09-30')
+    assert reader.calls[1:] == [('SPY', 'yahoo', pd.Timestamp('2020-01-15'), pd.Timestamp('2020-02-29')),
+                                ('SPY', 'yahoo', pd.Timestamp('2020-07-01'), pd.Timestamp('2020-09-30'))]
+    assert_same(wider, PRICES.loc['2020-01-15':'2020-09-30'])
+
+    meta = read_meta(cache.path('SPY'))
+    assert (meta['covered_start'], meta['covered_end']) == ('2020-01-15', '2020-09-30')
+    assert cache.get_column('SPY', '2020-01-15', '2020-09-30').equals(wider['Adj Close'])
+    assert len(reader.calls) == 3
+
+
+def test_sources_are_stored_apart(tmp_path):
+    reader = StubReader()
+    cache = PriceCache(str(tmp_path), fetch=reader)
+    cache.get('SPY', '2020-03-01', '2020-03-31')
+    cache.get('SPY', '2020-03-01', '2020-03-31', source='stooq')
+    assert [call[1] for call in reader.calls] == ['yahoo', 'stooq']
+    assert cache.path('SPY', 'yahoo') != cache.path('SPY', 'stooq')
+
+
+def test_offline_serves_only_what_is_stored(tmp_path):
+    PriceCache(str(tmp_path), fetch=StubReader()).get('SPY', '2020-03-01', '2020-06-30')
+
+    def no_download(*args):
+        raise AssertionError('offline cache downloaded %s' % (args,))
+
+    offline = PriceCache(str(tmp_path), fetch=no_download, offline=True)
+    # a wider range returns the stored part only
+    served = offline.get('SPY', '2020-01-01', '2020-12-31')
+    assert_same(served, PRICES.loc['2020-03-01':'2020-06-30'])
+    with pytest.raises(KeyError):
+        offline.get('QQQ', '2020-03-01', '2020-06-30')
+
+
+@pytest.mark.parametrize('unit', ['D', 's'])
+def test_table_round_trip(tmp_path, unit):
+    index = DAYS if unit == 'D' else pd.date_range('2020-01-02 09:30', periods=500, freq='min')
+    frame = pd.DataFrame({'Close': np.arange(len(index), dtype=np.float64), 'Vol. %': np.ones(len(index)),
+                          'Count': np.arange(len(index))}, index=pd.DatetimeIndex(index, name='Date'))
+    frame.loc[frame.index[3], 'Close'] = np.nan
+    path = str(tmp_path / 'table')
+
+    meta = write_table(path, frame, unit=unit, meta={'symbol': 'SPY'})
+    assert meta == read_meta(path)
+    assert (meta['rows'], meta['unit'], meta['symbol']) == (len(frame), unit, 'SPY')
+    for mmap in (True, False):
+        table = read_table(path, mmap=mmap)
+        assert_same(table, frame.astype(np.float64))
+
+    assert read_meta(str(tmp_path / 'missing')) is None
+    with pytest.raises(FileNotFoundError):
+        read_table(str(tmp_path / 'missing'))
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation.leveraged_etf import LeveragedETFSimulator
+from simulation.rates import RateCurve, load_rate_curve, process_libor
+
+
+def test_asof_forward_fills_missing_fixings():
+    curve = RateCurve(['2021-01-04', '2021-01-05', '2021-01-06'], [1.0, np.nan, 2.0])
+    rates = curve.asof(['2021-01-03', '2021-01-04', '2021-01-05', '2021-01-08'])
+    np.testing.assert_array_equal(rates, [np.nan, 1.0, 1.0, 2.0])
+
+
+def test_asof_is_nan_past_the_staleness_limit():
+    curve = RateCurve(['2021-01-04', '2021-01-05'], [1.0, 2.0], max_staleness=7)
+    rates = curve.asof(['2021-01-12', '2021-01-13'])
+    np.testing.assert_array_equal(rates, [2.0, np.nan])
+
+
+def test_missing_fixings_count_towards_staleness():
+    dates = pd.bdate_range('2021-01-04', periods=10)
+    curve = RateCurve(dates, [1.0] + [np.nan] * 9, max_staleness=3)
+    rates = curve.asof(dates)
+    assert np.isnan(rates[dates > pd.Timestamp('2021-01-07')]).all()
+    assert (rates[dates <= pd.Timestamp('2021-01-07')] == 1.0).all()
+
+
+def test_no_staleness_limit_forward_fills_indefinitely():
+    curve = RateCurve(['2021-01-04'], [1.0], max_staleness=None)
+    assert curve.asof(['2030-01-01'])[0] == 1.0
+
+
+def test_discontinued_libor_stops_after_last_fixing():
+    libor = load_rate_curve('USD1MTD156N')
+    last = pd.Timestamp(libor.dates[-1])
+    rates = libor.asof([last, last + pd.Timedelta(days=7), last + pd.Timedelta(days=8), '2023-01-03'])
+    assert not np.isnan(rates[:2]).any()
+    assert np.isnan(rates[2:]).all()
+
+
+def test_stitch_and_shift_keep_the_staleness_of_fixings():
+    old = RateCurve(['2021-01-04', '2021-01-05'], [1.0, 1.5])
+    new = RateCurve(['2021-01-11', '2021-01-12'], [0.5, 0.6]).shifted(0.1)
+    stitched = RateCurve.stitch([(old, None), (new, '2021-01-11')])
+    np.testing.assert_allclose(stitched.asof(['2021-01-08', '2021-01-11', '2021-01-20']), [1.5, 0.6, np.nan])
+
+
+def test_process_libor_accrues_holidays_on_the_next_fixing():
+    libor = process_libor()
+    assert len(libor) == 9037  # one row per published fixing, as the CSV has
+    assert pd.Timestamp('2019-12-26') not in libor.index and pd.Timestamp('2020-01-01') not in libor.index
+    # Christmas and Boxing Day accrue at the rate fixed on the 24th, New Year's Day at the 31st's
+    assert libor.loc['2019-12-27', 'Days'] == 3
+    assert libor.loc['2019-12-27', 'Value'] == pytest.approx(3 * 1.80475)
+    assert libor.loc['2020-01-02', 'Value'] == pytest.approx(2 * 1.76250)
+    # the first fixing has no previous one
+    assert libor['Value'].iloc[0] == libor['LIBOR'].iloc[0] * libor['Days'].iloc[0]
+
+
+def test_process_libor_on_a_trading_calendar_matches_the_rate_curve():
+    days = pd.bdate_range('2019-12-16', '2020-01-10')
+    days = days[~days.isin(pd.to_datetime(['2019-12-25', '2020-01-01']))]
+    libor = process_libor(dates=days)
+    expected = load_rate_curve().daily_financing(days)
+    np.testing.assert_allclose(libor['Value'], expected)
+    assert libor.loc['2019-12-26', 'Value'] == pytest.approx(3.60950)
+    assert libor.loc['2020-01-02', 'Value'] == pytest.approx(3.52500)
+
+    # through `align`, every trading day keeps its return and its accrual
+    prices = pd.Series(np.linspace(100, 110, len(days)), index=days)
+    via_value = LeveragedETFSimulator.align(prices, libor['Value'])
+    via_curve = LeveragedETFSimulator.align(prices, load_rate_curve())
+    assert via_value[0].equals(via_curve[0])
+    np.testing.assert_allclose(via_value[1], via_curve[1])
+    np.testing.assert_allclose(via_value[2], via_curve[2])
+    assert len(via_value[0]) == len(days) - 1
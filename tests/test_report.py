@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation.report import Chart, ChartRenderer, decimate, render_charts, scenario_charts
+
+DAYS = pd.bdate_range('1990-01-01', periods=9000)
+
+
+def nav(seed=0):
+    return pd.Series(100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.01, len(DAYS)))), index=DAYS)
+
+
+@pytest.mark.parametrize('buckets', [1, 7, 1000])
+def test_decimate_keeps_ends_and_extremes_within_budget(buckets):
+    series = nav()
+    series.iloc[4321] = 1e6  # a one-day spike
+    series.iloc[77] = 1e-3
+    series.iloc[100] = np.nan
+
+    kept = decimate(series, buckets)
+    assert len(kept) <= 2 * buckets + 2
+    assert kept.index.is_monotonic_increasing
+    assert kept.index[0] == series.index[0] and kept.index[-1] == series.index[-1]
+    assert DAYS[4321] in kept.index and DAYS[77] in kept.index
+    pd.testing.assert_series_equal(kept, series.loc[kept.index])
+
+    # the min and max of every bucket survive
+    clean = series.dropna()
+    bucket = np.arange(len(clean)) * buckets // len(clean)
+    for b in range(buckets):
+        part = clean[bucket == b]
+        assert part.idxmin() in kept.index and part.idxmax() in kept.index
+
+
+def test_short_series_are_not_decimated():
+    series = nav()[:50]
+    assert decimate(series, 25).equals(series)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_render_charts_writes_files(tmp_path, monkeypatch, workers):
+    monkeypatch.setenv('MPLBACKEND', 'Agg')
+    vix = pd.Series(np.random.default_rng(1).uniform(10, 40, len(DAYS)), index=DAYS)
+    charts = scenario_charts('TQQQ', nav(0), benchmarks={'QQQ': nav(1)}, overlay=('VIX', vix))
+    charts.append(Chart('TQQQ returns', 'scatter', {'TQQQ': nav(0).pct_change()}))
+    out_dir = str(tmp_path / 'charts')
+
+    paths = render_charts(charts, out_dir, fmt='png', workers=workers, width=4, height=3, dpi=50)
+    assert paths == [os.path.join(out_dir, chart.name + '.png') for chart in charts]
+    for path in paths:
+        with open(path, 'rb') as f:
+            assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+
+    svg, = render_charts(charts[:1], out_dir, fmt='svg')
+    with open(svg) as f:
+        assert '<svg' in f.read()
+
+
+def test_unknown_chart_kind(tmp_path):
+    with pytest.raises(ValueError):
+        ChartRenderer(2, 2, 10).render(Chart('bad', 'pie', {'a': nav()}), str(tmp_path / 'bad.png'))
@@ -0,0 +1,171 @@
+import pytest
+
+from exchange.request_manager import (DEFAULT_BURST, IBError, RateWindow, RequestManager, TokenBucket,
+                                      WARNING_CODES)
+
+
+class FakeClock:
+    """ Monotonic clock advanced by hand """
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def manager(clock):
+    return RequestManager(first_id=7, pacer=TokenBucket(clock=clock), timeout=10, clock=clock)
+
+
+def test_ids_are_allocated_in_order(manager):
+    requests = [manager.open('historical_data') for _ in range(3)]
+    assert [r.req_id for r in requests] == [7, 8, 9]
+    assert len(manager) == 3
+    assert all(r.req_id in manager for r in requests)
+
+
+def test_responses_reach_their_request(manager):
+    first, second = manager.open('contract_details'), manager.open('contract_details')
+    assert manager.add(second.req_id, 'b1')
+    assert manager.add(first.req_id, 'a1')
+    assert manager.add(second.req_id, 'b2')
+    assert not manager.add(99, 'unknown')
+
+    assert manager.finish(second.req_id)
+    assert second.done and not first.done
+    assert second.wait(0) == ['b1', 'b2']
+    assert second.req_id not in manager
+    # late responses of a completed request are ignored
+    assert not manager.add(second.req_id, 'b3')
+    assert not manager.finish(second.req_id)
+    assert second.items == ['b1', 'b2']
+
+
+def test_failed_request_raises_its_error(manager):
+    request = manager.open('historical_data')
+    done = []
+    request.on_done = done.append
+    error = IBError(request.req_id, 162, 'HMDS query returned no data')
+    assert manager.fail(request.req_id, error)
+    assert not manager.fail(request.req_id, error)
+    assert done == [request]
+    with pytest.raises(IBError) as raised:
+        request.wait(0)
+    assert raised.value.code == 162
+
+
+def test_wait_times_out_while_pending(manager):
+    request = manager.open('historical_data')
+    with pytest.raises(TimeoutError):
+        request.wait(0)
+
+
+def test_oldest_of_kind_skips_completed(manager):
+    first = manager.open('server_time', by_kind=True)
+    second = manager.open('server_time', by_kind=True)
+    manager.open('historical_data')
+    assert manager.oldest('server_time') is first
+    manager.finish(first.req_id)
+    assert manager.oldest('server_time') is second
+    manager.cancel(second.req_id)
+    assert manager.oldest('server_time') is None
+    assert manager.oldest('contract_details') is None
+
+
+def test_expire_fails_overdue_requests(manager, clock):
+    short = manager.open('contract_details', timeout=1)
+    default = manager.open('historical_data')
+    endless = manager.open('market_data', timeout=None)
+    finished = manager.open('contract_details', timeout=1)
+    manager.finish(finished.req_id)
+    assert default.deadline == clock.now + 10 and endless.deadline is None
+
+    assert manager.expire() == []
+    clock.advance(1)
+    assert manager.expire() == [short]
+    with pytest.raises(TimeoutError):
+        short.wait(0)
+
+    assert manager.expire(now=clock.now + 9) == [default]
+    clock.advance(1000)
+    assert manager.expire() == []
+    assert list(manager._in_flight) == [endless.req_id]
+
+
+def test_fail_all_on_disconnection(manager):
+    requests = [manager.open(kind) for kind in ('server_time', 'historical_data', 'market_data')]
+    manager.fail_all(ConnectionError('Connection to IB closed'))
+    assert len(manager) == 0
+    for request in requests:
+        assert isinstance(request.error, ConnectionError)
+
+
+def test_cancel_forgets_without_completing(manager):
+    request = manager.open('market_data', timeout=None)
+    assert manager.cancel(request.req_id)
+    assert not manager.cancel(request.req_id)
+    assert not request.done
+    assert not manager.fail(request.req_id, IBError(request.req_id, 200, 'No security definition'))
+
+
+def test_token_bucket_paces_after_a_small_burst(clock):
+    bucket = TokenBucket(rate=50, clock=clock)
+    delays = [bucket.reserve() for _ in range(DEFAULT_BURST + 3)]
+    assert delays[:DEFAULT_BURST] == [0.0] * DEFAULT_BURST
+    assert delays[DEFAULT_BURST:] == pytest.approx([0.02, 0.04, 0.06])
+    assert bucket.waited == pytest.approx(0.12)
+
+    # a cold bucket sends at most burst + rate messages in its first second
+    bucket = TokenBucket(rate=50, clock=clock)
+    assert sum(bucket.reserve() <= 1.0 for _ in range(100)) == DEFAULT_BURST + 50
+
+    # the bucket refills at `rate` up to `burst`
+    clock.advance(60)
+    bucket = TokenBucket(rate=10, burst=2, clock=clock)
+    assert [bucket.reserve() for _ in range(3)] == pytest.approx([0, 0, 0.1])
+    clock.advance(0.15)  # pays the debt of the third message, half a token left
+    assert bucket.reserve() == pytest.approx(0.05)
+    clock.advance(10)
+    assert [bucket.reserve() for _ in range(3)] == pytest.approx([0, 0, 0.1])
+
+
+def test_rate_window_limits_every_window(clock):
+    window = RateWindow(3, 10.0, clock=clock)
+    assert [window.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert window.reserve() == 10.0
+    clock.advance(4)
+    assert window.reserve() == 6.0
+    clock.advance(20)
+    assert window.reserve() == 0.0
+    assert window.waited == 16.0
+
+
+def test_wrapper_routes_errors_to_requests():
+    pytest.importorskip('ibapi')
+    from exchange.ib_api_connection import IBAPIWrapper
+
+    wrapper = IBAPIWrapper()
+    wrapper.init_error()
+    wrapper.init_requests()
+    request = wrapper.requests.open('market_data', timeout=None)
+
+    wrapper.error(request.req_id, min(WARNING_CODES), 'Market data farm connection is OK')
+    assert not request.done and not wrapper.is_error()
+
+    wrapper.error(request.req_id, 354, 'Requested market data is not subscribed')
+    assert request.error.code == 354 and request.error.req_id == request.req_id
+    assert not wrapper.is_error()
+
+    # errors of no request in flight go to the error queue
+    wrapper.error(-1, 1100, 'Connectivity between IB and TWS has been lost')
+    assert '1100' in wrapper.get_error(0)
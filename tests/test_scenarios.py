@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation.scenarios import FINANCING, BlockBootstrap, GarchSimulation, ScenarioGenerator, StationaryBootstrap
+
+N_HIST = 500
+ROWS = np.arange(N_HIST, dtype=np.float64)
+# every column identifies its row, so drawn days can be traced back to the history
+HISTORY = pd.DataFrame({'a': ROWS, 'b': -ROWS, FINANCING: ROWS / 1e6},
+                       index=pd.bdate_range('2000-01-03', periods=N_HIST))
+
+
+def rows_drawn(paths):
+    a = paths['a']
+    assert np.isin(a, ROWS).all()
+    # the columns of one day come from the same historical row
+    np.testing.assert_array_equal(paths['b'], -a)
+    np.testing.assert_array_equal(paths[FINANCING], a / 1e6)
+    return a.astype(np.int64)
+
+
+@pytest.mark.parametrize('generator', [BlockBootstrap, StationaryBootstrap])
+def test_paths_are_reproducible_with_a_seed(generator):
+    chunks = list(generator(HISTORY, seed=42).chunks(250, 60, chunk_size=100))
+    again = list(generator(HISTORY, seed=42).chunks(250, 60, chunk_size=100))
+    assert [len(chunk['a']) for chunk in chunks] == [100, 100, 50]
+    for chunk, same in zip(chunks, again):
+        for column in HISTORY.columns:
+            np.testing.assert_array_equal(chunk[column], same[column])
+    # any chunk can be generated on its own
+    np.testing.assert_array_equal(generator(HISTORY, seed=42).chunk(2, 50, 60)['a'], chunks[2]['a'])
+
+    other = next(generator(HISTORY, seed=43).chunks(100, 60, chunk_size=100))
+    assert not np.array_equal(other['a'], chunks[0]['a'])
+
+
+def test_block_bootstrap_draws_whole_blocks():
+    days = rows_drawn(BlockBootstrap(HISTORY, block_size=10, seed=0).chunk(0, 200, 95))
+    assert days.shape == (200, 95)
+    steps = np.diff(days, axis=1)
+    inside = np.arange(1, 95) % 10 != 0
+    assert (steps[:, inside] == 1).all()
+    # blocks never run past the end of the history
+    assert days.max() < N_HIST
+
+
+def test_stationary_bootstrap_block_lengths():
+    days = rows_drawn(StationaryBootstrap(HISTORY, mean_block_size=20, seed=0).chunk(0, 400, 250))
+    continues = np.diff(days, axis=1) % N_HIST == 1  # wraps around the end of the history
+    # geometric lengths: a block goes on with probability 1 - 1 / mean_block_size (plus a start landing next door)
+    assert continues.mean() == pytest.approx(1 - 1 / 20, abs=0.005)
+
+    single_days = rows_drawn(StationaryBootstrap(HISTORY, mean_block_size=1, seed=0).chunk(0, 400, 250))
+    assert (np.diff(single_days, axis=1) % N_HIST == 1).mean() < 0.01
+
+
+def test_generators_must_pick_days():
+    with pytest.raises(TypeError):
+        ScenarioGenerator(HISTORY)
+
+
+def test_garch_resamples_the_financing_rows():
+    pytest.importorskip('scipy')
+    rng = np.random.default_rng(0)
+    history = pd.DataFrame({'a': rng.standard_t(5, 2000) * 0.01, FINANCING: np.arange(2000) / 1e6})
+    garch = GarchSimulation(history, seed=1)
+    paths = garch.chunk(0, 50, 100)
+    assert np.isin(paths[FINANCING], history[FINANCING]).all()
+    np.testing.assert_array_equal(GarchSimulation(history, seed=1).chunk(0, 50, 100)['a'], paths['a'])
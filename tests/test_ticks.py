@@ -0,0 +1,112 @@
+import threading
+
+import numpy as np
+import pytest
+
+from exchange.ticks import PRICE, SIZE, TickBatch, TickConsumer, TickRing, load_ticks, save_ticks
+
+
+def push_range(ring, lo, hi):
+    return [ring.push(i % 7, i % 3, float(i), PRICE if i % 2 else SIZE) for i in range(lo, hi)]
+
+
+def test_capacity_is_rounded_up_to_a_power_of_two():
+    assert TickRing(1000).capacity == 1024
+    assert TickRing(1024).capacity == 1024
+    assert TickRing(1).capacity == 1
+
+
+def test_full_ring_drops_and_counts_new_ticks():
+    ring = TickRing(8)
+    assert push_range(ring, 0, 12) == [True] * 8 + [False] * 4
+    assert (len(ring), ring.dropped, ring.high_water) == (8, 4, 8)
+
+    batch = ring.drain()
+    np.testing.assert_array_equal(batch.value, np.arange(8.0))  # the oldest ticks are kept
+    assert len(ring) == 0
+    assert ring.push(0, 0, 99.0)
+
+
+def test_drain_preserves_order_across_the_wrap_around():
+    ring = TickRing(8)
+    push_range(ring, 0, 6)
+    np.testing.assert_array_equal(ring.drain(max_ticks=4).value, np.arange(4.0))
+    push_range(ring, 6, 12)  # slots 6, 7 then 0..3
+    batch = ring.drain()
+    np.testing.assert_array_equal(batch.value, np.arange(4.0, 12.0))
+    np.testing.assert_array_equal(batch.req_id, np.arange(4, 12) % 7)
+    np.testing.assert_array_equal(batch.kind, np.where(np.arange(4, 12) % 2, PRICE, SIZE))
+    assert (np.diff(batch.timestamp) >= 0).all()
+    assert len(ring.drain()) == 0
+
+
+def test_half_full_ring_wakes_the_consumer():
+    ring = TickRing(8)
+    push_range(ring, 0, 3)
+    assert not ring.wake.is_set()
+    ring.push(0, 0, 1.0)
+    assert ring.wake.is_set()
+
+
+def test_consumer_thread_receives_every_tick_in_order():
+    ring = TickRing(1 << 10)
+    consumer = TickConsumer(ring, interval=0.001, max_batch=100).start()
+    n = 50_000
+
+    def produce():
+        for i in range(n):
+            ring.push(1, 4, float(i))
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    producer.join()
+    consumer.stop()
+
+    received = consumer.take()
+    stats = consumer.stats()
+    assert stats['received'] == n
+    assert len(received) + stats['dropped'] == n
+    assert stats['consumed'] == len(received)
+    # dropped ticks leave gaps, but the kept ones stay in order
+    assert (np.diff(received.value) > 0).all()
+
+
+def test_failing_sink_is_counted_and_ingestion_goes_on():
+    ring = TickRing(16)
+    calls = []
+
+    def sink(batch):
+        calls.append(len(batch))
+        raise RuntimeError('sink down')
+
+    consumer = TickConsumer(ring, sink, max_batch=4)
+    push_range(ring, 0, 10)
+    assert consumer.flush() == 10
+    assert calls == [4, 4, 2]
+    assert consumer.stats()['sink_errors'] == 3
+
+
+@pytest.mark.parametrize('suffix', ['.npz', '.csv'])
+def test_save_and_load_round_trip(tmp_path, suffix):
+    ring = TickRing(64)
+    push_range(ring, 0, 40)
+    batch = ring.drain()
+    path = str(tmp_path / f'ticks{suffix}')
+    if suffix == '.npz':
+        save_ticks(path, batch)
+    else:
+        np.savetxt(path, np.column_stack(batch), delimiter=',', header=','.join(TickBatch._fields), comments='',
+                   fmt=['%d', '%d', '%d', '%.17g', '%d'])
+
+    loaded = load_ticks(path)
+    for name in TickBatch._fields:
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(batch, name))
+        assert getattr(loaded, name).dtype == getattr(batch, name).dtype
+
+
+def test_load_csv_fills_missing_columns(tmp_path):
+    path = tmp_path / 'ticks.csv'
+    path.write_text('timestamp,tick_type,value\n0,4,100.5\n')
+    loaded = load_ticks(str(path))
+    assert (loaded.req_id[0], loaded.kind[0], loaded.value[0]) == (0, PRICE, 100.5)
+    assert len(TickBatch.concatenate([loaded, loaded])) == 2
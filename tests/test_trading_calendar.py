@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation.trading_calendar import TradingCalendar
+
+DAYS = pd.to_datetime(['2021-01-04', '2021-01-05', '2021-01-06', '2021-01-08', '2021-01-11'])
+
+
+def test_positions_of_missing_dates_are_minus_one():
+    calendar = TradingCalendar(DAYS[::-1].append(DAYS[:2]))  # any order, duplicates dropped
+    assert len(calendar) == 5 and calendar.index.equals(pd.DatetimeIndex(DAYS))
+    dates = pd.to_datetime(['2021-01-01', '2021-01-05', '2021-01-07', '2021-01-11', '2021-01-12'])
+    np.testing.assert_array_equal(calendar.positions(dates), [-1, 1, -1, 4, -1])
+    assert list(calendar.positions(pd.DatetimeIndex([]))) == []
+
+
+def test_take_leaves_nan_where_the_series_has_no_value():
+    calendar = TradingCalendar(DAYS)
+    series = pd.Series([1.0, 3.0, 9.0], index=pd.to_datetime(['2021-01-05', '2021-01-07', '2021-01-11']))
+    np.testing.assert_array_equal(calendar.take(series), [np.nan, 1.0, np.nan, np.nan, 9.0])
+
+
+@pytest.mark.parametrize('how', ['inner', 'outer'])
+def test_align_matches_pandas(how):
+    a = pd.Series([1.0, 2.0, 3.0, 4.0], index=DAYS[:4])
+    b = pd.Series([10.0, 20.0, 30.0], index=DAYS[[1, 3, 4]] + pd.Timedelta(hours=16))
+    aligned = TradingCalendar.align(how=how, a=a, b=b)
+
+    b.index = b.index.normalize()
+    expected = pd.concat({'a': a, 'b': b}, axis=1, join=how).sort_index()
+    assert aligned.names == ['a', 'b']
+    assert aligned.dates.equals(pd.DatetimeIndex(expected.index))
+    np.testing.assert_array_equal(aligned['b'], expected['b'])
+    np.testing.assert_array_equal(aligned.frame().to_numpy(), expected.to_numpy())
+    np.testing.assert_allclose(aligned.pct_change(), expected.pct_change(fill_method=None).T.to_numpy())
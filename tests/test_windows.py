@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulation.core import DAYS_PER_YEAR
+from simulation.windows import window_drawdowns, rolling_windows
+
+
+def brute_drawdown(nav, start, end):
+    window = nav[start:end + 1]
+    return (window / np.maximum.accumulate(window) - 1).min() * 100
+
+
+@pytest.fixture(params=['continuous', 'ties'])
+def nav(request):
+    rng = np.random.default_rng(5)
+    nav = np.cumprod(1 + rng.normal(0.0005, 0.02, 2000))
+    return np.round(nav, 1) if request.param == 'ties' else nav
+
+
+def test_window_drawdowns_match_brute_force(nav):
+    rng = np.random.default_rng(1)
+    start = rng.integers(0, len(nav), 3000)
+    end = np.minimum(start + rng.integers(0, len(nav), 3000), len(nav) - 1)
+    start[:5], end[:5] = [0, 0, 10, len(nav) - 1, 7], [len(nav) - 1, 0, 11, len(nav) - 1, 1000]
+
+    expected = [brute_drawdown(nav, s, e) for s, e in zip(start, end)]
+    np.testing.assert_allclose(window_drawdowns(nav, start, end), expected, atol=1e-12)
+
+
+@pytest.mark.parametrize('horizon', [None, 1, 2.5])
+def test_rolling_windows_match_brute_force(nav, horizon):
+    dates = pd.bdate_range('1990-01-01', periods=len(nav))
+    windows = rolling_windows(pd.Series(nav, index=dates), horizon=horizon)
+
+    rows = []
+    for start, start_date in enumerate(dates):
+        if horizon is None:
+            end = len(dates) - 1
+        else:
+            end_date = start_date + pd.Timedelta(days=round(horizon * DAYS_PER_YEAR))
+            if end_date > dates[-1]:
+                continue
+            end = np.flatnonzero(dates <= end_date)[-1]
+        if end <= start:
+            continue
+        years = (dates[end] - start_date).days / DAYS_PER_YEAR
+        growth = nav[end] / nav[start]
+        rows.append((start_date, dates[end], (growth - 1) * 100, (growth ** (1 / years) - 1) * 100,
+                     brute_drawdown(nav, start, end)))
+    expected = pd.DataFrame(rows, columns=['start_date', 'end_date', 'total_return', 'cagr', 'max_drawdown'])
+
+    assert windows.index.equals(pd.DatetimeIndex(expected['start_date'], name='start_date'))
+    assert pd.DatetimeIndex(windows['end_date']).equals(pd.DatetimeIndex(expected['end_date']))
+    for column in ('total_return', 'cagr', 'max_drawdown'):
+        np.testing.assert_allclose(windows[column], expected[column], rtol=1e-10, atol=1e-10)